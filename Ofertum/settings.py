@@ -3,6 +3,7 @@ Django settings for ofertum project.
 Generated by 'django-admin startproject' using Django 5.2.5.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,6 +32,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Primero para medir la latencia de todo lo demás (ver INSTRUMENTATION_SAMPLE_RATE)
+    'catalog.middleware.InstrumentacionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,10 +68,34 @@ WSGI_APPLICATION = 'Ofertum.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Otra base para pruebas de carga: SQLITE_PATH=/tmp/bench.sqlite3
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Cache compartido entre los workers de la máquina (archivos: no necesita
+# servicios externos). Delante de él cada proceso tiene un LRU en memoria
+# para los datos del catálogo (catalog/services/cache_tiers.py). El backend
+# es el de Django sin listar el directorio en cada escritura (catalog/cache_backends.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'catalog.cache_backends.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', '/tmp/ofertum-cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 20000, 'CULL_EVERY': 200},
+    }
+}
+# Las pruebas usan el mismo backend en un directorio temporal por corrida
+TEST_RUNNER = 'catalog.test_runner.CatalogTestRunner'
+CATALOG_LOCAL_CACHE_TTL = 30      # segundos en el LRU de cada proceso
+CATALOG_LOCAL_CACHE_SIZE = 256    # entradas por familia
+
+# Fracción de requests medidos (consultas, tiempo de BD/plantillas, latencia):
+# header Server-Timing y /api/stats/views/. 0 = sin medir.
+INSTRUMENTATION_SAMPLE_RATE = 0.05
+# Server-Timing en las respuestas medidas de todos los usuarios (si no, solo staff)
+INSTRUMENTATION_SERVER_TIMING = False
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -109,3 +136,44 @@ LOGIN_REDIRECT_URL = 'catalog:product_list'
 LOGOUT_REDIRECT_URL = 'catalog:product_list'
 LOGIN_URL = 'catalog:login'
 
+
+# API del equipo aliado (/partner-products/). La vista sirve una copia local
+# que se renueva en segundo plano cuando tiene más de PARTNER_CATALOG_TTL
+# segundos; `python manage.py sincronizar_aliados` la renueva desde cron.
+PARTNER_API_URL = os.environ.get('PARTNER_API_URL', 'http://13.218.169.6/api/productos/')
+PARTNER_API_TIMEOUT = 10          # segundos por petición
+PARTNER_CATALOG_TTL = 5 * 60      # antigüedad máxima antes de renovar
+PARTNER_CATALOG_RETRY = 60        # espera mínima tras un intento fallido
+PARTNER_API_RETRIES = 2           # reintentos ante timeout/conexión/429/5xx
+PARTNER_API_BACKOFF = 0.5         # base de la espera exponencial (con jitter)
+PARTNER_API_BACKOFF_MAX = 5.0
+PARTNER_CIRCUIT_THRESHOLD = 5     # fallos seguidos que abren el circuito
+PARTNER_CIRCUIT_RESET = 30        # segundos con el circuito abierto
+
+# Búsqueda unificada (/api/search/): plazo en segundos por fuente
+UNIFIED_SEARCH_DEADLINES = {'local': 2.0, 'aliado': 1.0}
+UNIFIED_SEARCH_WORKERS = 8
+# Consultas en curso por fuente (las vencidas siguen en su hilo hasta terminar)
+UNIFIED_SEARCH_MAX_IN_FLIGHT = 3
+
+# Exportaciones en segundo plano (/products/export/jobs/). Con EXPORT_WORKERS = 0
+# el servidor web no procesa la cola: queda para `manage.py procesar_exportaciones`.
+EXPORT_WORKERS = 2                # hilos por proceso
+EXPORT_MAX_RUNNING = 4            # exportaciones simultáneas entre todos los procesos
+EXPORT_REUSE_SECONDS = 10 * 60    # reutilizar un resultado igual de hace menos de esto
+EXPORT_JOB_TIMEOUT = 30 * 60      # en curso por más tiempo = worker caído
+EXPORT_RETENTION = 24 * 60 * 60   # antigüedad a partir de la cual se borran los archivos
+EXPORT_PURGE_INTERVAL = 10 * 60   # cada cuánto cada proceso borra los viejos al tomar trabajos
+EXPORT_MAX_PENDING_ANONYMOUS = 50 # pendientes sin usuario entre todos (más = 429)
+EXPORT_MAX_PENDING_PER_USER = 5   # pendientes de cada usuario con sesión
+
+# PDF de detalle con al menos estas filas: se dibuja por bloques en un pool de
+# procesos (0 procesos = uno por CPU; con menos de 2 no hay paralelismo)
+REPORT_PDF_PARALLEL_MIN_ROWS = 5000
+REPORT_PDF_PROCESSES = 0
+REPORT_PDF_PAGES_PER_CHUNK = 25
+
+# Cache del listado: tarjetas por producto (se invalidan con sus señales) y
+# páginas completas para anónimos (por versión del catálogo). 0 = sin cache de páginas.
+CATALOG_CARD_CACHE_TIMEOUT = 60 * 60
+CATALOG_PAGE_CACHE_TIMEOUT = 5 * 60
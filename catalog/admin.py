@@ -1,6 +1,7 @@
 from django.contrib import admin
 from .models import Producto, Oferta
-from .models import Proposal, Review
+from .models import Proposal, Review, ProductoAliado, ExportJob
+from .services.search import search_products
 
 
 class OfertaInline(admin.TabularInline):
@@ -21,7 +22,17 @@ class ProductoAdmin(admin.ModelAdmin):
     ordering = ("nombre",)
     inlines = [OfertaInline]
 
-    @admin.display(description="Precio vigente")
+    def get_queryset(self, request):
+        # Anota la oferta activa para que precio_actual no consulte por fila
+        return super().get_queryset(request).with_pricing()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Usa el índice de texto en lugar de LIKE '%q%' sobre search_fields
+        if not search_term:
+            return queryset, False
+        return search_products(queryset, search_term, fields=self.search_fields), False
+
+    @admin.display(description="Precio vigente", ordering="db_precio_actual")
     def precio_actual(self, obj: Producto):
         return obj.obtener_precio_actual()
 
@@ -34,6 +45,7 @@ class OfertaAdmin(admin.ModelAdmin):
     )
     search_fields = ("producto__nombre",)
     list_filter = ("activo",)
+    list_select_related = ("producto",)
 
     @admin.display(description="Tienda")
     def tienda_producto(self, obj: Oferta):
@@ -92,3 +104,21 @@ class ReviewAdmin(admin.ModelAdmin):
     search_fields = ("producto__nombre", "usuario__username", "comentario")
     list_filter = ("rating",)
 
+
+@admin.register(ProductoAliado)
+class ProductoAliadoAdmin(admin.ModelAdmin):
+    # Copia de la API aliada: se reemplaza en cada sincronización
+    list_display = ("id_externo", "nombre", "categoria", "tienda", "precio", "actualizado")
+    search_fields = ("nombre", "descripcion", "id_externo")
+    list_filter = ("categoria", "tienda")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "formato", "status", "filas", "usuario", "creado", "terminado")
+    list_filter = ("status", "formato")
+    readonly_fields = ("clave", "filtros", "archivo", "filas", "error", "creado", "iniciado", "terminado")
+    list_select_related = ("usuario",)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # Registra los receivers que mantienen Producto.precio_vigente
+        from . import signals  # noqa: F401
+        # Antes de abrir conexiones, para que todas cuenten consultas (ver services/instrumentation.py)
+        from .services.instrumentation import instalar
+        instalar()
@@ -0,0 +1,27 @@
+# catalog/cache_backends.py
+"""Backends de cache del proyecto.
+
+FileBasedCache de Django lista todo el directorio en cada `set()` para ver si
+pasó MAX_ENTRIES. Con miles de entradas (tarjetas del listado, versiones por
+producto) cada escritura cuesta O(entradas) y una página con N tarjetas
+nuevas, O(N · entradas). Aquí el recuento se hace una vez cada
+OPTIONS["CULL_EVERY"] escrituras por proceso; entre recuentos el directorio
+puede pasar MAX_ENTRIES en a lo sumo CULL_EVERY entradas por worker.
+"""
+import itertools
+
+from django.core.cache.backends import filebased
+
+DEFAULT_CULL_EVERY = 200
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get("OPTIONS", {})
+        self._cull_every = max(1, int(options.get("CULL_EVERY", DEFAULT_CULL_EVERY)))
+        self._writes = itertools.count()  # next() es atómico entre hilos
+
+    def _cull(self):
+        if next(self._writes) % self._cull_every == 0:
+            super()._cull()
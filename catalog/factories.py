@@ -0,0 +1,81 @@
+# catalog/factories.py
+"""Fábricas (factory_boy + Faker) de datos del catálogo para las pruebas.
+
+`ProductoFactory.create()` guarda por el ORM y dispara las señales como un
+alta normal. Para catálogos grandes usar services/synthetic.py
+(`manage.py generar_catalogo`), que inserta por lotes.
+"""
+from decimal import Decimal
+
+import factory
+from django.contrib.auth import get_user_model
+from factory.django import DjangoModelFactory
+
+from catalog.models import Oferta, Producto, Proposal, Review
+from catalog.services.synthetic import CATEGORIAS, TIENDAS
+
+
+class UsuarioFactory(DjangoModelFactory):
+    class Meta:
+        model = get_user_model()
+        django_get_or_create = ("username",)
+
+    username = factory.Sequence(lambda n: f"usuario{n}")
+    email = factory.LazyAttribute(lambda u: f"{u.username}@example.com")
+    # Hash fijo: no paga el hasher por usuario (no sirven para iniciar sesión)
+    password = "!"
+
+
+class ProductoFactory(DjangoModelFactory):
+    class Meta:
+        model = Producto
+
+    nombre = factory.Faker("catch_phrase", locale="es_ES")
+    descripcion = factory.Faker("sentence", nb_words=12, locale="es_ES")
+    categoria = factory.Faker("random_element", elements=CATEGORIAS)
+    tienda = factory.Faker("random_element", elements=TIENDAS)
+    link = factory.Faker("url")
+    precio = factory.Faker("pydecimal", right_digits=2, min_value=1000, max_value=2_000_000)
+    precio_vigente = factory.SelfAttribute("precio")
+    disponible = True
+
+
+class OfertaFactory(DjangoModelFactory):
+    """Descuento porcentual; con `fija=True` usa un precio fijo menor al base."""
+
+    class Meta:
+        model = Oferta
+
+    class Params:
+        fija = factory.Trait(
+            descuento_porcentaje=Decimal("0.00"),
+            precio_fijo=factory.LazyAttribute(lambda o: (o.producto.precio * Decimal("0.8")).quantize(Decimal("0.01"))),
+        )
+
+    producto = factory.SubFactory(ProductoFactory)
+    descuento_porcentaje = factory.Faker("pydecimal", left_digits=2, right_digits=2, min_value=5, max_value=60)
+    precio_fijo = None
+    activo = True
+
+
+class ReviewFactory(DjangoModelFactory):
+    class Meta:
+        model = Review
+
+    producto = factory.SubFactory(ProductoFactory)
+    usuario = factory.SubFactory(UsuarioFactory)
+    rating = factory.Faker("random_int", min=1, max=5)
+    comentario = factory.Faker("paragraph", nb_sentences=2, locale="es_ES")
+
+
+class ProposalFactory(DjangoModelFactory):
+    class Meta:
+        model = Proposal
+
+    usuario = factory.SubFactory(UsuarioFactory)
+    nombre = factory.Faker("catch_phrase", locale="es_ES")
+    descripcion = factory.Faker("sentence", nb_words=12, locale="es_ES")
+    categoria = factory.Faker("random_element", elements=CATEGORIAS)
+    tienda = factory.Faker("random_element", elements=TIENDAS)
+    link = factory.Faker("url")
+    precio = factory.Faker("pydecimal", right_digits=2, min_value=1000, max_value=2_000_000)
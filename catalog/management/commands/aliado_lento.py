@@ -0,0 +1,57 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+def _feed(total):
+    return [
+        {
+            "idProducto": i,
+            "nombreProducto": f"Producto aliado {i}",
+            "descripcion": "Generado por aliado_lento",
+            "tipoProducto": ("Electrónica", "Hogar", "Deportes")[i % 3],
+            "marcaProducto": ("Tienda A", "Tienda B")[i % 2],
+            "precioDeProducto": f"{10 + i % 490}.99",
+            "imagenProducto": f"/media/aliado/{i}.jpg",
+        }
+        for i in range(1, total + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Levanta una API aliada falsa que tarda --demora segundos en responder. "
+        "Sirve para medir las vistas con `benchmark_carga` (PARTNER_API_URL=http://127.0.0.1:PUERTO/)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--puerto', type=int, default=8900)
+        parser.add_argument('--demora', type=float, default=5.0, help='Segundos de espera por respuesta.')
+        parser.add_argument('--productos', type=int, default=200, help='Cantidad de productos del feed.')
+
+    def handle(self, *args, **options):
+        demora = options['demora']
+        cuerpo = json.dumps(_feed(options['productos'])).encode()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(demora)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", options['puerto']), Handler)
+        self.stdout.write(f"API aliada lenta en http://127.0.0.1:{options['puerto']}/ (demora {demora}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,66 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.services.instrumentation import percentil
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+
+async def _medir(urls, total, concurrencia, timeout):
+    latencias, errores = [], 0
+    pendientes = iter(range(total))
+
+    async def trabajador(client):
+        nonlocal errores
+        for i in pendientes:
+            url = urls[i % len(urls)]
+            inicio = time.perf_counter()
+            try:
+                response = await client.get(url)
+                ok = response.status_code < 500
+            except httpx.HTTPError:
+                ok = False
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            errores += not ok
+
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(timeout=timeout, limits=limites) as client:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajador(client) for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+    return latencias, errores, duracion
+
+
+class Command(BaseCommand):
+    help = (
+        "Manda --total peticiones con --concurrencia clientes a un servidor ya levantado "
+        "y muestra throughput y latencias (p50/p95/máx)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='URLs a pedir (se reparten en ronda).')
+        parser.add_argument('--total', type=int, default=200)
+        parser.add_argument('--concurrencia', type=int, default=20)
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if httpx is None:
+            raise CommandError("benchmark_carga necesita httpx (pip install httpx).")
+        if options['total'] <= 0 or options['concurrencia'] <= 0:
+            raise CommandError("--total y --concurrencia deben ser mayores que cero.")
+
+        latencias, errores, duracion = asyncio.run(_medir(
+            options['urls'], options['total'], options['concurrencia'], options['timeout'],
+        ))
+        self.stdout.write(f"Peticiones: {len(latencias)} ({errores} con error) en {duracion:.2f}s")
+        self.stdout.write(f"Throughput: {len(latencias) / duracion:.1f} req/s")
+        self.stdout.write(
+            f"Latencia ms: p50={percentil(latencias, 50):.0f} p95={percentil(latencias, 95):.0f} "
+            f"máx={max(latencias):.0f} media={statistics.fmean(latencias):.0f}"
+        )
@@ -0,0 +1,301 @@
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from catalog.models import Oferta, Producto, Proposal, Review
+from catalog.services.facets import get_facet_index
+from catalog.services.instrumentation import medir, percentil
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+PERCENTILES = (50, 95, 99)
+# Productos distintos que se rotan en las URLs de detalle
+PRODUCTOS_MUESTRA = 50
+
+
+def urls_principales(semilla=1):
+    """
+    (nombre, [urls]) de las vistas principales de catalog/urls.py con datos
+    reales del catálogo. Quedan fuera las que escriben, las de staff, las
+    exportaciones y las que llaman a la API aliada.
+    """
+    rnd = random.Random(semilla)
+    pks = list(Producto.objects.filter(disponible=True).order_by('pk').values_list('pk', flat=True)[:5000])
+    if not pks:
+        raise CommandError("El catálogo está vacío: generarlo con `manage.py generar_catalogo`.")
+    muestra = rnd.sample(pks, min(PRODUCTOS_MUESTRA, len(pks)))
+    index = get_facet_index()
+    palabras = [w for w in Producto.objects.get(pk=muestra[0]).nombre.split() if len(w) > 3] or ['a']
+    listado = reverse('catalog:product_list')
+    endpoints = [
+        ('home', [reverse('catalog:home')]),
+        ('product_list', [listado, f'{listado}?sort=price_asc', f'{listado}?page=3']),
+        ('product_list_busqueda', [f'{listado}?q={palabras[0]}']),
+        ('categories', [reverse('catalog:categories')]),
+        ('stores', [reverse('catalog:stores')]),
+        ('product_detail', [reverse('catalog:product_detail', args=[pk]) for pk in muestra]),
+        ('api_products', [f"{reverse('catalog:api_products')}?limit=50"]),
+        ('api_product_detail', [reverse('catalog:api_product_detail', args=[pk]) for pk in muestra]),
+    ]
+    if index.categorias:
+        endpoints.append(('category_detail', [reverse('catalog:category_detail', args=[c.slug]) for c in index.categorias]))
+    if index.tiendas:
+        endpoints.append(('store_detail', [reverse('catalog:store_detail', args=[t.slug]) for t in index.tiendas]))
+    return endpoints
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _resumen(latencias):
+    return {
+        **{f'p{p}': round(percentil(latencias, p), 2) for p in PERCENTILES},
+        'media': round(statistics.fmean(latencias), 2) if latencias else 0.0,
+        'max': round(max(latencias), 2) if latencias else 0.0,
+    }
+
+
+class _Silencioso(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia (p50/p95/p99) y requests por segundo de las vistas principales del "
+        "catálogo con el cliente de pruebas de Django o un servidor WSGI local, y guarda "
+        "el resultado en JSON para comparar entre commits (--comparar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=('cliente', 'wsgi'), default='cliente',
+                            help='cliente: django.test.Client en proceso; wsgi: servidor local + httpx.')
+        parser.add_argument('--concurrencia', type=int, default=4)
+        parser.add_argument('--total', type=int, default=500, help='Requests medidos (se reparten en ronda).')
+        parser.add_argument('--calentamiento', type=int, default=None,
+                            help='Requests sin medir antes de empezar (por defecto una ronda completa).')
+        parser.add_argument('--url', action='append', default=[], metavar='RUTA',
+                            help='Ruta adicional a medir (se puede repetir).')
+        parser.add_argument('--solo', action='append', default=[], metavar='NOMBRE',
+                            help='Medir solo estos endpoints (se puede repetir).')
+        parser.add_argument('--sin-cache-paginas', action='store_true',
+                            help='Desactiva la cache de páginas completas para anónimos.')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--salida', help='Archivo JSON (por defecto benchmarks/<fecha>_<commit>.json).')
+        parser.add_argument('--comparar', metavar='JSON', help='Resultado anterior contra el que comparar.')
+
+    def handle(self, *args, **options):
+        if options['total'] <= 0 or options['concurrencia'] <= 0:
+            raise CommandError("--total y --concurrencia deben ser mayores que cero.")
+        if options['modo'] == 'wsgi' and httpx is None:
+            raise CommandError("--modo wsgi necesita httpx (pip install httpx).")
+        anterior = self._leer(options['comparar']) if options['comparar'] else None
+
+        ajustes = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver', '127.0.0.1'],
+            'INSTRUMENTATION_SAMPLE_RATE': 0,  # las consultas se cuentan aquí
+        }
+        if options['sin_cache_paginas']:
+            ajustes['CATALOG_PAGE_CACHE_TIMEOUT'] = 0
+        with override_settings(**ajustes):
+            endpoints = urls_principales(options['semilla'])
+            endpoints += [(url, [url]) for url in options['url']]
+            if options['solo']:
+                endpoints = [e for e in endpoints if e[0] in options['solo']]
+                if not endpoints:
+                    raise CommandError("--solo no coincide con ningún endpoint.")
+            resultado = self._correr(endpoints, options)
+
+        salida = Path(options['salida'] or Path('benchmarks') / (
+            f"{time.strftime('%Y%m%d_%H%M%S')}_{resultado['commit'] or 'sin-commit'}.json"
+        ))
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        salida.write_text(json.dumps(resultado, ensure_ascii=False, indent=2), encoding='utf-8')
+
+        self._mostrar(resultado, anterior)
+        self.stdout.write(self.style.SUCCESS(f"Resultado en {salida}"))
+
+    def _leer(self, path):
+        try:
+            return json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo leer {path}: {exc}")
+
+    def _correr(self, endpoints, options):
+        plan = [(nombre, url) for nombre, urls in endpoints for url in urls]
+        # Ronda por endpoint (no por URL): cada endpoint recibe la misma cantidad de requests
+        rondas = {nombre: itertools.cycle(urls) for nombre, urls in endpoints}
+        nombres = itertools.cycle([nombre for nombre, _ in endpoints])
+        lock = threading.Lock()
+
+        def siguiente():
+            with lock:
+                nombre = next(nombres)
+                return nombre, next(rondas[nombre])
+
+        servidor = None
+        if options['modo'] == 'wsgi':
+            servidor = ThreadedWSGIServer(('127.0.0.1', 0), _Silencioso)
+            servidor.set_app(get_internal_wsgi_application())
+            threading.Thread(target=servidor.serve_forever, daemon=True).start()
+            base = f"http://127.0.0.1:{servidor.server_port}"
+
+        def sesion():
+            if servidor is None:
+                return Client()
+            return httpx.Client(base_url=base, timeout=60)
+
+        muestras = defaultdict(list)   # nombre -> [(ms, status, queries)]
+        restantes = itertools.count()
+
+        def trabajador(total, medidos):
+            client = sesion()
+            try:
+                while next(restantes) < total:
+                    nombre, url = siguiente()
+                    with medir() as m:
+                        inicio = time.perf_counter()
+                        try:
+                            status = client.get(url).status_code
+                        except Exception:
+                            status = 599
+                        ms = (time.perf_counter() - inicio) * 1000
+                    if medidos:
+                        with lock:
+                            muestras[nombre].append((ms, status, m.queries))
+            finally:
+                if servidor is not None:
+                    client.close()
+                elif threading.current_thread() is not threading.main_thread():
+                    connections.close_all()
+
+        def ronda(total, medidos):
+            nonlocal restantes
+            restantes = itertools.count()
+            if options['concurrencia'] == 1:
+                trabajador(total, medidos)  # en este hilo (y con su conexión a la base)
+                return
+            with ThreadPoolExecutor(options['concurrencia']) as pool:
+                for f in [pool.submit(trabajador, total, medidos) for _ in range(options['concurrencia'])]:
+                    f.result()
+
+        try:
+            calentamiento = options['calentamiento']
+            ronda(len(plan) if calentamiento is None else calentamiento, False)
+            inicio = time.perf_counter()
+            ronda(options['total'], True)
+            duracion = time.perf_counter() - inicio
+        finally:
+            if servidor is not None:
+                servidor.shutdown()
+                servidor.server_close()
+
+        todas = [ms for filas in muestras.values() for ms, _, _ in filas]
+        por_endpoint = {}
+        for nombre, _ in endpoints:
+            filas = muestras.get(nombre, [])
+            por_endpoint[nombre] = {
+                'requests': len(filas),
+                'errores': sum(status >= 500 for _, status, _ in filas),
+                **_resumen([ms for ms, _, _ in filas]),
+                # Solo en modo cliente: en wsgi las consultas corren en los hilos del servidor
+                'queries_media': round(statistics.fmean(q for _, _, q in filas), 1)
+                if filas and servidor is None else None,
+            }
+        return {
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': _commit(),
+            'modo': options['modo'],
+            'concurrencia': options['concurrencia'],
+            'total': len(todas),
+            'duracion_s': round(duracion, 3),
+            'req_s': round(len(todas) / duracion, 1) if duracion else None,
+            'errores': sum(e['errores'] for e in por_endpoint.values()),
+            'cache_paginas': not options['sin_cache_paginas'],
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base': connection.vendor,
+                'debug': settings.DEBUG,
+                'cpus': os.cpu_count(),
+            },
+            'catalogo': {
+                'productos': Producto.objects.count(),
+                'ofertas': Oferta.objects.count(),
+                'reviews': Review.objects.count(),
+                'propuestas': Proposal.objects.count(),
+            },
+            'latencia_ms': _resumen(todas),
+            'endpoints': por_endpoint,
+        }
+
+    def _mostrar(self, resultado, anterior=None):
+        r = resultado
+        self.stdout.write(
+            f"{r['total']} requests ({r['errores']} con error) en {r['duracion_s']:.2f}s, "
+            f"{r['req_s']} req/s, modo {r['modo']}, concurrencia {r['concurrencia']}, "
+            f"{r['catalogo']['productos']} productos"
+        )
+        antes = (anterior or {}).get('endpoints', {})
+        if anterior:
+            distinto = [
+                campo for campo, a, b in (
+                    ('modo', anterior.get('modo'), r['modo']),
+                    ('concurrencia', anterior.get('concurrencia'), r['concurrencia']),
+                    ('productos', anterior.get('catalogo', {}).get('productos'), r['catalogo']['productos']),
+                    ('endpoints', sorted(antes), sorted(r['endpoints'])),
+                ) if a != b
+            ]
+            if distinto:
+                self.stdout.write(self.style.WARNING(
+                    f"La corrida anterior difiere en: {', '.join(distinto)}; la comparación no es directa."
+                ))
+        self.stdout.write(f"{'endpoint':<24}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}")
+        filas = list(r['endpoints'].items()) + [('TOTAL', {**r['latencia_ms'], 'requests': r['total']})]
+        for nombre, e in filas:
+            queries = e.get('queries_media')
+            linea = (
+                f"{nombre[:23]:<24}{e['requests']:>6}{e['p50']:>9.1f}{e['p95']:>9.1f}{e['p99']:>9.1f}"
+                f"{'' if queries is None else queries:>9}"
+            )
+            previo = anterior.get('latencia_ms') if nombre == 'TOTAL' and anterior else antes.get(nombre)
+            if previo and previo.get('p50') and previo.get('p95'):
+                linea += (f"   p50 {self._cambio(previo['p50'], e['p50'])}"
+                          f" p95 {self._cambio(previo['p95'], e['p95'])}")
+            self.stdout.write(linea)
+        if anterior and anterior.get('req_s'):
+            self.stdout.write(
+                f"req/s: {anterior['req_s']} -> {r['req_s']} ({self._cambio(anterior['req_s'], r['req_s'])}) "
+                f"contra {anterior.get('commit') or '?'} del {anterior.get('fecha', '?')}"
+            )
+
+    @staticmethod
+    def _cambio(antes, despues):
+        return f"{(despues - antes) / antes * 100:+.0f}%"
@@ -0,0 +1,75 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.services.exports import EXPORT_COLUMNS
+from catalog.services.reporting import PYPDF_OK, ParallelPDFRenderer, PDFRenderer
+
+
+def _filas_sinteticas(total, semilla=1):
+    rnd = random.Random(semilla)
+    categorias = ["Electrónica", "Hogar", "Deportes", "Ropa", "Juguetes", "Libros"]
+    tiendas = [f"Tienda {i}" for i in range(1, 21)]
+    for i in range(total):
+        yield {
+            "nombre": f"Producto sintético {i:06d}",
+            "categoria": rnd.choice(categorias),
+            "tienda": rnd.choice(tiendas),
+            "precio_vigente": round(rnd.uniform(1, 2000), 2),
+            "rating_avg": round(rnd.uniform(1, 5), 1) if rnd.random() < 0.7 else None,
+            "rating_count": rnd.randint(0, 300),
+        }
+
+
+def _lotes(filas, tam=1000):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tam:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el PDF de detalle secuencial contra el dibujado en paralelo por bloques "
+        "de páginas, sobre un catálogo sintético generado en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--paginas-por-bloque', type=int, default=25)
+
+    def _medir(self, renderer, total):
+        inicio = time.perf_counter()
+        renderer.begin("Benchmark PDF", EXPORT_COLUMNS)
+        for lote in _lotes(_filas_sinteticas(total)):
+            renderer.write_rows(lote)
+        with renderer.finish() as out:
+            tamanio = len(out.read())
+        return time.perf_counter() - inicio, tamanio
+
+    def handle(self, *args, **options):
+        if not PYPDF_OK:
+            raise CommandError("benchmark_pdf necesita pypdf (pip install pypdf).")
+        total, procesos = options['productos'], options['procesos']
+
+        secuencial, tam_sec = self._medir(PDFRenderer(), total)
+        self.stdout.write(f"Secuencial: {secuencial:.2f}s ({tam_sec / 1e6:.1f} MB)")
+
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=get_context("spawn")) as pool:
+            # Arrancar los procesos antes de medir
+            list(pool.map(abs, range(procesos)))
+            renderer = ParallelPDFRenderer(
+                pool, pages_per_chunk=options['paginas_por_bloque'], max_pending=2 * procesos,
+            )
+            paralelo, tam_par = self._medir(renderer, total)
+        self.stdout.write(f"Paralelo ({procesos} procesos): {paralelo:.2f}s ({tam_par / 1e6:.1f} MB)")
+        self.stdout.write(f"Aceleración: {secuencial / paralelo:.2f}x con {os.cpu_count()} CPUs")
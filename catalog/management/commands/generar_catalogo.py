@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import Producto
+from catalog.services.synthetic import CATEGORIAS, DEFAULT_BATCH_SIZE, TIENDAS, generar_catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un catálogo sintético reproducible (productos, ofertas, reseñas, propuestas, "
+        "categorías y tiendas) con inserciones por lotes, para pruebas de carga. "
+        "Usar una base aparte: SQLITE_PATH=/tmp/bench.sqlite3 python manage.py migrate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10_000)
+        parser.add_argument('--categorias', type=int, default=len(CATEGORIAS))
+        parser.add_argument('--tiendas', type=int, default=len(TIENDAS))
+        parser.add_argument('--usuarios', type=int, default=200, help='Autores de reseñas y propuestas.')
+        parser.add_argument('--ofertas', type=float, default=0.3, help='Fracción de productos con oferta.')
+        parser.add_argument('--reviews', type=float, default=3.0, help='Reseñas por producto (media).')
+        parser.add_argument('--propuestas', type=float, default=0.05, help='Propuestas por producto.')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--agregar', action='store_true',
+            help='Permite generar sobre un catálogo que ya tiene productos.',
+        )
+
+    def handle(self, *args, **options):
+        if options['productos'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError("--productos y --batch-size deben ser mayores que cero.")
+        if min(options['categorias'], options['tiendas']) <= 0:
+            raise CommandError("--categorias y --tiendas deben ser mayores que cero.")
+        if options['reviews'] > 0 and options['usuarios'] <= 0:
+            raise CommandError("Las reseñas necesitan --usuarios mayor que cero.")
+        if not options['agregar'] and Producto.objects.exists():
+            raise CommandError(
+                "El catálogo ya tiene productos. Usar una base aparte (SQLITE_PATH) o --agregar."
+            )
+
+        total = options['productos']
+        resumen = generar_catalogo(
+            total,
+            categorias=options['categorias'],
+            tiendas=options['tiendas'],
+            usuarios=options['usuarios'],
+            ofertas=options['ofertas'],
+            reviews_por_producto=options['reviews'],
+            propuestas=options['propuestas'],
+            semilla=options['semilla'],
+            batch_size=options['batch_size'],
+            progreso=lambda n: self.stdout.write(f"  {n}/{total} productos"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen.productos} productos, {resumen.ofertas} ofertas, {resumen.reviews} reseñas, "
+            f"{resumen.propuestas} propuestas ({resumen.categorias} categorías, {resumen.tiendas} tiendas, "
+            f"{resumen.usuarios} usuarios) en {resumen.segundos:.1f}s"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog.services.export_jobs import fail_stale_jobs, process_pending, purge_old_exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa las exportaciones pendientes (/products/export/jobs/), marca como fallidas "
+        "las colgadas y borra las viejas. Pensado para cron, o como worker con --cada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=int, default=0, metavar='SEGUNDOS',
+            help='Revisar la cola cada SEGUNDOS en vez de salir cuando quede vacía.',
+        )
+
+    def _procesar(self):
+        colgadas = fail_stale_jobs()
+        borradas = purge_old_exports()
+        procesadas = process_pending()
+        if procesadas or colgadas or borradas:
+            self.stdout.write(
+                f"{procesadas} exportaciones procesadas, {colgadas} colgadas, {borradas} borradas."
+            )
+
+    def handle(self, *args, **options):
+        cada = options['cada']
+        if cada <= 0:
+            self._procesar()
+            return
+
+        while True:
+            self._procesar()
+            time.sleep(cada)
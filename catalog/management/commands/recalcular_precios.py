@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from catalog.services.pricing import recalcular_precios_vigentes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula Producto.precio_vigente a partir de la oferta activa de cada producto. "
+        "Útil tras cargas masivas (bulk_create/update) que no disparan señales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Cantidad de productos por lote (por defecto 2000).',
+        )
+
+    def handle(self, *args, **options):
+        # Precios calculados por lote (services/pricing.py), solo se guardan los que cambian
+        actualizados = recalcular_precios_vigentes(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} productos actualizados."))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from catalog.models import CatalogoVersion, Producto, Review
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula rating_sum, rating_count y rating_avg de cada producto desde las reseñas. "
+        "Útil si se cargaron reseñas con operaciones masivas que no disparan señales."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Cantidad de productos por lote de bulk_update (por defecto 500).',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        agregados = {
+            row['producto_id']: (row['suma'], row['total'])
+            for row in Review.objects.values('producto_id')
+            .annotate(suma=Sum('rating'), total=Count('id'))
+            .order_by()
+        }
+
+        pendientes = []
+        actualizados = 0
+        productos = Producto.objects.only(*(('id',) + Producto.RATING_FIELDS)).order_by('pk')
+        for producto in productos.iterator(chunk_size=batch_size):
+            suma, total = agregados.get(producto.pk, (0, 0))
+            promedio = (suma / total) if total else None
+            if (producto.rating_sum, producto.rating_count, producto.rating_avg) != (suma, total, promedio):
+                producto.rating_sum, producto.rating_count, producto.rating_avg = suma, total, promedio
+                pendientes.append(producto)
+            if len(pendientes) >= batch_size:
+                Producto.objects.bulk_update(pendientes, Producto.RATING_FIELDS)
+                actualizados += len(pendientes)
+                pendientes = []
+
+        if pendientes:
+            Producto.objects.bulk_update(pendientes, Producto.RATING_FIELDS)
+            actualizados += len(pendientes)
+
+        if actualizados:
+            # bulk_update no dispara señales
+            CatalogoVersion.incrementar()
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} productos actualizados."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from catalog.services.search import get_search_backend, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda de texto de productos (FTS5 en SQLite)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if rebuild_search_index(alias):
+            self.stdout.write(self.style.SUCCESS("Índice de búsqueda reconstruido."))
+        else:
+            backend = get_search_backend(alias)
+            self.stdout.write(f"El backend '{backend.name}' no usa un índice que reconstruir.")
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.services.partner_catalog import PartnerCatalogError, refrescar_catalogo_aliado
+
+
+class Command(BaseCommand):
+    help = (
+        "Descarga el catálogo de la API aliada y actualiza la copia local que sirve "
+        "/partner-products/. Pensado para cron, o como worker con --cada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=int, default=0, metavar='SEGUNDOS',
+            help='Repetir la sincronización cada SEGUNDOS en vez de salir tras la primera.',
+        )
+        parser.add_argument('--url', default=None, help='URL alternativa de la API aliada.')
+
+    def _sincronizar(self, url):
+        try:
+            total = refrescar_catalogo_aliado(url)
+        except PartnerCatalogError as exc:
+            return str(exc)
+        self.stdout.write(self.style.SUCCESS(f"{total} productos aliados sincronizados."))
+        return None
+
+    def handle(self, *args, **options):
+        cada, url = options['cada'], options['url']
+        if cada <= 0:
+            error = self._sincronizar(url)
+            if error:
+                raise CommandError(f"No se pudo sincronizar: {error}")
+            return
+
+        while True:
+            error = self._sincronizar(url)
+            if error:
+                self.stderr.write(f"No se pudo sincronizar: {error}")
+            time.sleep(cada)
@@ -0,0 +1,63 @@
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .services.instrumentation import medir
+
+DEFAULT_SAMPLE_RATE = 0.05
+
+
+class InstrumentacionMiddleware:
+    """
+    Mide una muestra de los requests (INSTRUMENTATION_SAMPLE_RATE, 0..1):
+    consultas y tiempo de BD, tiempo de plantillas y latencia total, por
+    nombre de vista, y acumula las estadísticas que muestra /api/stats/views/.
+    El header Server-Timing solo va a usuarios staff, salvo que
+    INSTRUMENTATION_SERVER_TIMING lo habilite para todos.
+
+    En respuestas por partes la latencia termina cuando empieza el envío.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "INSTRUMENTATION_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)
+        self.server_timing = getattr(settings, "INSTRUMENTATION_SERVER_TIMING", False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _muestrear(self) -> bool:
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._muestrear():
+            return self.get_response(request)
+        with medir() as m:
+            response = self.get_response(request)
+            m.nombre = _nombre_vista(request)
+        if self.server_timing or _es_staff(getattr(request, "user", None)):
+            response["Server-Timing"] = m.server_timing()
+        return response
+
+    async def __acall__(self, request):
+        if not self._muestrear():
+            return await self.get_response(request)
+        with medir() as m:
+            response = await self.get_response(request)
+            m.nombre = _nombre_vista(request)
+        if self.server_timing or (hasattr(request, "auser") and _es_staff(await request.auser())):
+            response["Server-Timing"] = m.server_timing()
+        return response
+
+
+def _nombre_vista(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "(sin vista)"
+
+
+def _es_staff(user) -> bool:
+    return bool(user is not None and user.is_staff)
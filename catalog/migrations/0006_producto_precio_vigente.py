@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:09
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def calcular_precio_oferta(precio_base, descuento_porcentaje=None, precio_fijo=None):
+    # Copia de catalog.models.calcular_precio_oferta al momento de esta migración
+    if precio_fijo is not None:
+        return precio_fijo
+    descuento = (descuento_porcentaje or Decimal('0')) / Decimal('100')
+    return (precio_base * (Decimal('1') - descuento)).quantize(Decimal('0.01'))
+
+
+def rellenar_precio_vigente(apps, schema_editor):
+    Producto = apps.get_model('catalog', 'Producto')
+    Oferta = apps.get_model('catalog', 'Oferta')
+
+    # Oferta activa más reciente (mayor id) por producto
+    activas = {}
+    for oferta in Oferta.objects.filter(activo=True).order_by('id'):
+        activas[oferta.producto_id] = oferta
+
+    productos = list(Producto.objects.all())
+    for p in productos:
+        oferta = activas.get(p.pk)
+        if oferta is None:
+            p.precio_vigente = p.precio
+        else:
+            p.precio_vigente = calcular_precio_oferta(p.precio, oferta.descuento_porcentaje, oferta.precio_fijo)
+    Producto.objects.bulk_update(productos, ['precio_vigente'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_alter_producto_categoria_alter_producto_tienda_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precio_vigente',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Precio vigente'),
+        ),
+        migrations.RunPython(rellenar_precio_vigente, migrations.RunPython.noop),
+    ]
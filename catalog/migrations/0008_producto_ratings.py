@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:18
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def rellenar_ratings(apps, schema_editor):
+    Producto = apps.get_model('catalog', 'Producto')
+    Review = apps.get_model('catalog', 'Review')
+
+    agregados = (
+        Review.objects.values('producto_id')
+        .annotate(suma=Sum('rating'), total=Count('id'))
+        .order_by()
+    )
+    productos = []
+    for row in agregados:
+        p = Producto(pk=row['producto_id'])
+        p.rating_sum = row['suma']
+        p.rating_count = row['total']
+        p.rating_avg = row['suma'] / row['total']
+        productos.append(p)
+    Producto.objects.bulk_update(productos, ['rating_sum', 'rating_count', 'rating_avg'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_catalogoversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='rating_avg',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='Puntuación media'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Número de reseñas'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de puntuaciones'),
+        ),
+        migrations.RunPython(rellenar_ratings, migrations.RunPython.noop),
+    ]
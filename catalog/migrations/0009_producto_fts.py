@@ -0,0 +1,66 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+# SQL del índice tal como quedó en esta migración (no importar de
+# catalog.services.search: si cambia allí, esta migración no debe cambiar)
+FTS_TABLE = "catalog_producto_fts"
+
+SQLITE_FTS_TABLE_SQL = """CREATE VIRTUAL TABLE IF NOT EXISTS catalog_producto_fts USING fts5(
+    nombre, descripcion, categoria, tienda,
+    content='catalog_producto', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)"""
+
+SQLITE_FTS_TRIGGERS_SQL = [
+    """CREATE TRIGGER IF NOT EXISTS catalog_producto_fts_ai AFTER INSERT ON catalog_producto BEGIN
+        INSERT INTO catalog_producto_fts(rowid, nombre, descripcion, categoria, tienda) VALUES (new.id, new.nombre, new.descripcion, new.categoria, new.tienda);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS catalog_producto_fts_ad AFTER DELETE ON catalog_producto BEGIN
+        INSERT INTO catalog_producto_fts(catalog_producto_fts, rowid, nombre, descripcion, categoria, tienda) VALUES ('delete', old.id, old.nombre, old.descripcion, old.categoria, old.tienda);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS catalog_producto_fts_au AFTER UPDATE OF nombre, descripcion, categoria, tienda ON catalog_producto BEGIN
+        INSERT INTO catalog_producto_fts(catalog_producto_fts, rowid, nombre, descripcion, categoria, tienda) VALUES ('delete', old.id, old.nombre, old.descripcion, old.categoria, old.tienda);
+        INSERT INTO catalog_producto_fts(rowid, nombre, descripcion, categoria, tienda) VALUES (new.id, new.nombre, new.descripcion, new.categoria, new.tienda);
+    END""",
+]
+
+SQLITE_FTS_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS catalog_producto_fts_ai",
+    "DROP TRIGGER IF EXISTS catalog_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS catalog_producto_fts_au",
+    "DROP TABLE IF EXISTS catalog_producto_fts",
+]
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # Búsqueda por tsvector sin tildes (ver catalog/services/search.py)
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    elif vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute(SQLITE_FTS_TABLE_SQL)
+                for sql in SQLITE_FTS_TRIGGERS_SQL:
+                    schema_editor.execute(sql)
+                schema_editor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        except OperationalError:
+            # SQLite compilado sin FTS5: la búsqueda sigue usando LIKE
+            pass
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_FTS_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_producto_ratings'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
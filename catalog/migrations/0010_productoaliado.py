@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:23
+
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_producto_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoAliado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_externo', models.CharField(max_length=64, unique=True, verbose_name='ID en la API aliada')),
+                ('nombre', models.CharField(max_length=200, verbose_name='Nombre')),
+                ('descripcion', models.TextField(blank=True, verbose_name='Descripción')),
+                ('categoria', models.CharField(blank=True, db_index=True, max_length=100, verbose_name='Categoría')),
+                ('tienda', models.CharField(blank=True, db_index=True, max_length=150, verbose_name='Tienda')),
+                ('precio', models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Precio')),
+                ('imagen', models.URLField(blank=True, max_length=500, verbose_name='Imagen')),
+                ('link', models.URLField(blank=True, max_length=500, verbose_name='Enlace del producto')),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Actualizado')),
+            ],
+            options={
+                'verbose_name': 'Producto aliado',
+                'verbose_name_plural': 'Productos aliados',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SincronizacionAliado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completada', models.DateTimeField(blank=True, null=True, verbose_name='Última sincronización correcta')),
+                ('intentada', models.DateTimeField(blank=True, null=True, verbose_name='Último intento')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Productos')),
+                ('error', models.TextField(blank=True, verbose_name='Último error')),
+            ],
+            options={
+                'verbose_name': 'Sincronización del catálogo aliado',
+                'verbose_name_plural': 'Sincronización del catálogo aliado',
+            },
+        ),
+    ]
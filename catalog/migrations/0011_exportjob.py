@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:46
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_productoaliado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('formato', models.CharField(max_length=10, verbose_name='Formato')),
+                ('filtros', models.JSONField(blank=True, default=dict, verbose_name='Filtros')),
+                ('clave', models.CharField(db_index=True, max_length=64, verbose_name='Clave de reutilización')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('running', 'En proceso'), ('done', 'Terminada'), ('failed', 'Fallida')], default='pending', max_length=20, verbose_name='Estado')),
+                ('archivo', models.FileField(blank=True, upload_to='exports/', verbose_name='Archivo')),
+                ('filas', models.PositiveIntegerField(blank=True, null=True, verbose_name='Filas')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Creado')),
+                ('iniciado', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('terminado', models.DateTimeField(blank=True, null=True, verbose_name='Terminado')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Exportación',
+                'verbose_name_plural': 'Exportaciones',
+                'ordering': ['-creado'],
+                'indexes': [models.Index(fields=['status', 'creado'], name='catalog_exp_status_f63eeb_idx')],
+            },
+        ),
+    ]
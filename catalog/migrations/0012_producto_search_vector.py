@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Solo PostgreSQL: tsvector guardado e indexado para la búsqueda (`q`), en
+# vez de armarlo fila por fila en cada consulta. unaccent() no es IMMUTABLE
+# (depende del search_path), así que la columna generada usa un envoltorio
+# que fija el diccionario. Pesos: nombre A, categoría B, tienda C, descripción D.
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """CREATE OR REPLACE FUNCTION catalog_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$""",
+    """ALTER TABLE catalog_producto ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple'::regconfig, catalog_unaccent(coalesce(nombre, ''))), 'A') ||
+    setweight(to_tsvector('simple'::regconfig, catalog_unaccent(coalesce(categoria, ''))), 'B') ||
+    setweight(to_tsvector('simple'::regconfig, catalog_unaccent(coalesce(tienda, ''))), 'C') ||
+    setweight(to_tsvector('simple'::regconfig, catalog_unaccent(coalesce(descripcion, ''))), 'D')
+) STORED""",
+    "CREATE INDEX catalog_producto_search_gin ON catalog_producto USING GIN (search_vector)",
+]
+
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS catalog_producto_search_gin",
+    "ALTER TABLE catalog_producto DROP COLUMN IF EXISTS search_vector",
+    "DROP FUNCTION IF EXISTS catalog_unaccent(text)",
+]
+
+
+def crear_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_SQL:
+            schema_editor.execute(sql)
+
+
+def eliminar_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_exportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_vector, eliminar_vector),
+    ]
@@ -1,12 +1,84 @@
+import os
+import uuid
 from decimal import Decimal
 
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import (
+    BigIntegerField, Case, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value, When,
+)
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import Exact, GreaterThan
 from django.utils import timezone
 from django.utils.text import slugify
 from django.urls import reverse
 
 
+def calcular_precio_oferta(precio_base, descuento_porcentaje=None, precio_fijo=None):
+    """Precio resultante de aplicar una oferta sobre `precio_base`.
+
+    Si la oferta define `precio_fijo` se usa tal cual; si no, se aplica el
+    porcentaje de descuento redondeado a centavos.
+    """
+    if precio_fijo is not None:
+        return precio_fijo
+    descuento = (descuento_porcentaje or Decimal('0')) / Decimal('100')
+    return (precio_base * (Decimal('1') - descuento)).quantize(Decimal('0.01'))
+
+
+def centesimas(expresion):
+    """Monto con dos decimales como entero (centésimas), calculado en SQL."""
+    return Cast(Round(expresion * Value(Decimal('100'))), BigIntegerField())
+
+
+def precio_oferta_sql(precio, descuento_porcentaje):
+    """calcular_precio_oferta() con descuento porcentual, como expresión SQL.
+
+    Se calcula en centavos enteros y redondea al par (ROUND_HALF_EVEN), igual
+    que quantize(); Round() de SQL redondea las mitades hacia arriba y en
+    SQLite opera en float, así que 0.05 al 50% daría 0.03 en vez de 0.02.
+    """
+    numerador = centesimas(precio) * (Value(10000) - centesimas(descuento_porcentaje))
+    cociente = numerador / Value(10000)
+    resto = numerador - cociente * Value(10000)
+    sube = Case(
+        When(GreaterThan(resto, 5000), then=Value(1)),
+        When(Exact(resto, 5000), then=cociente - cociente / Value(2) * Value(2)),  # 1 si es impar
+        default=Value(0),
+    )
+    return ExpressionWrapper(
+        (cociente + sube) * Value(Decimal('0.01')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class ProductoQuerySet(models.QuerySet):
+    def with_pricing(self):
+        """Anota la oferta activa y el precio actual en la misma consulta.
+
+        - db_oferta_id / db_oferta_descuento / db_oferta_precio_fijo: datos de la
+          oferta activa más reciente (NULL si no hay).
+        - db_precio_actual: precio con la oferta aplicada, calculado en SQL con
+          el mismo redondeo que calcular_precio_oferta().
+
+        `obtener_oferta_activa()` y `obtener_precio_actual()` usan estas
+        anotaciones cuando existen y no vuelven a consultar la base.
+        """
+        activas = Oferta.objects.filter(producto=OuterRef('pk'), activo=True).order_by('-id')
+        return self.annotate(
+            db_oferta_id=Subquery(activas.values('id')[:1]),
+            db_oferta_descuento=Subquery(activas.values('descuento_porcentaje')[:1]),
+            db_oferta_precio_fijo=Subquery(activas.values('precio_fijo')[:1]),
+        ).annotate(
+            db_precio_actual=Case(
+                When(db_oferta_id__isnull=True, then=F('precio')),
+                When(db_oferta_precio_fijo__isnull=False, then=F('db_oferta_precio_fijo')),
+                default=precio_oferta_sql(F('precio'), F('db_oferta_descuento')),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+
+
 class Producto(models.Model):
     """Modelo que representa un producto del catálogo."""
     nombre = models.CharField('Nombre', max_length=200)
@@ -21,8 +93,22 @@ class Producto(models.Model):
         'Precio', max_digits=10, decimal_places=2,
         validators=[MinValueValidator(Decimal('0.00'))]
     )
+    # Precio con la oferta activa aplicada, desnormalizado para filtrar y
+    # ordenar en SQL. Se recalcula al guardar el producto y al escribir ofertas.
+    precio_vigente = models.DecimalField(
+        'Precio vigente', max_digits=10, decimal_places=2,
+        null=True, blank=True, editable=False, db_index=True,
+    )
     creado = models.DateTimeField('Fecha de creación', auto_now_add=True)
     disponible = models.BooleanField('Disponible', default=True)
+    # Agregados de reseñas mantenidos al guardar/eliminar cada Review
+    rating_sum = models.PositiveIntegerField('Suma de puntuaciones', default=0, editable=False)
+    rating_count = models.PositiveIntegerField('Número de reseñas', default=0, editable=False, db_index=True)
+    rating_avg = models.FloatField('Puntuación media', null=True, blank=True, editable=False, db_index=True)
+
+    objects = ProductoQuerySet.as_manager()
+
+    RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_avg')
 
     class Meta:
         verbose_name = 'Producto'
@@ -32,6 +118,21 @@ class Producto(models.Model):
     def __str__(self):
         return self.nombre
 
+    def save(self, *args, **kwargs):
+        # Un producto nuevo aún no tiene ofertas: su precio vigente es el base.
+        self.precio_vigente = self._precio_actual_desde_bd() if self.pk else self.precio
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None and not self._state.adding:
+            # Los agregados de reseñas solo los escriben las señales de Review:
+            # una instancia cargada antes de una reseña nueva no debe pisarlos.
+            update_fields = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.RATING_FIELDS
+            ]
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'precio_vigente'}
+        super().save(*args, **kwargs)
+
     # ---- Helpers útiles para routing/plantillas ----
     @property
     def categoria_slug(self) -> str:
@@ -50,25 +151,79 @@ class Producto(models.Model):
         """Devuelve la oferta activa más reciente para este producto, o None.
 
         Ya que las ofertas no usan fechas, se toma la oferta marcada `activo=True`
-        más reciente (por id) si existe.
+        más reciente (por id) si existe. Si el producto viene de
+        `Producto.objects.with_pricing()` se arma desde las anotaciones sin consultar.
         """
+        if hasattr(self, 'db_oferta_id'):
+            if self.db_oferta_id is None:
+                return None
+            return Oferta(
+                pk=self.db_oferta_id,
+                producto=self,
+                descuento_porcentaje=self.db_oferta_descuento,
+                precio_fijo=self.db_oferta_precio_fijo,
+                activo=True,
+            )
+        return self._oferta_activa_desde_bd()
+
+    def _oferta_activa_desde_bd(self):
         ofertas = self.ofertas.filter(activo=True)
         return ofertas.order_by('-id').first()
 
+    def _precio_actual_desde_bd(self):
+        # Ignora las anotaciones de with_pricing(), que pueden estar desactualizadas
+        oferta = self._oferta_activa_desde_bd()
+        if not oferta:
+            return self.precio
+        return calcular_precio_oferta(self.precio, oferta.descuento_porcentaje, oferta.precio_fijo)
+
     def obtener_precio_actual(self):
         """Retorna el precio vigente del producto considerando la oferta activa si existe."""
         oferta = self.obtener_oferta_activa()
         if not oferta:
             return self.precio
+        return calcular_precio_oferta(self.precio, oferta.descuento_porcentaje, oferta.precio_fijo)
 
-        # Si la oferta define un precio fijo, lo usamos.
-        if oferta.precio_fijo is not None:
-            return oferta.precio_fijo
+    @property
+    def avg_rating(self):
+        """Puntuación media de las reseñas, o None si no tiene."""
+        return self.rating_avg
+
+    @classmethod
+    def aplicar_delta_rating(cls, producto_id, delta_sum, delta_count):
+        """Suma `delta_sum`/`delta_count` a los agregados con un UPDATE atómico.
 
-        # Aplicar porcentaje de descuento sobre el precio base.
-        descuento = (oferta.descuento_porcentaje or Decimal('0')) / Decimal('100')
-        precio_descuento = (self.precio * (Decimal('1') - descuento)).quantize(Decimal('0.01'))
-        return precio_descuento
+        En un UPDATE las F() leen los valores previos de la fila, así que la
+        media se calcula con los mismos deltas en la misma sentencia.
+        """
+        nueva_suma = F('rating_sum') + delta_sum
+        nuevo_total = F('rating_count') + delta_count
+        cls.objects.filter(pk=producto_id).update(
+            rating_sum=nueva_suma,
+            rating_count=nuevo_total,
+            rating_avg=Case(
+                # el total previo + delta_count == 0 -> sin reseñas
+                When(rating_count=-delta_count, then=Value(None)),
+                default=Cast(nueva_suma, FloatField()) / Cast(nuevo_total, FloatField()),
+                output_field=FloatField(),
+            ),
+        )
+
+    def actualizar_ratings(self):
+        """Recalcula los agregados desde la tabla de reseñas."""
+        agg = self.reviews.aggregate(suma=models.Sum('rating'), total=models.Count('id'))
+        self.rating_sum = agg['suma'] or 0
+        self.rating_count = agg['total']
+        self.rating_avg = (self.rating_sum / self.rating_count) if self.rating_count else None
+        Producto.objects.filter(pk=self.pk).update(
+            rating_sum=self.rating_sum, rating_count=self.rating_count, rating_avg=self.rating_avg,
+        )
+
+    def actualizar_precio_vigente(self):
+        """Recalcula y persiste `precio_vigente` sin disparar `save()`."""
+        self.precio_vigente = self._precio_actual_desde_bd()
+        Producto.objects.filter(pk=self.pk).update(precio_vigente=self.precio_vigente)
+        return self.precio_vigente
 
 
 class Oferta(models.Model):
@@ -112,9 +267,7 @@ class Oferta(models.Model):
         """Calcula el precio de la oferta (ya sea precio_fijo o aplicado sobre el precio del producto)."""
         if self.precio_fijo is not None:
             return self.precio_fijo
-        descuento = (self.descuento_porcentaje or Decimal('0')) / Decimal('100')
-        precio = (self.producto.precio * (Decimal('1') - descuento)).quantize(Decimal('0.01'))
-        return precio
+        return calcular_precio_oferta(self.producto.precio, self.descuento_porcentaje)
 
 
 from django.conf import settings
@@ -189,21 +342,146 @@ class Review(models.Model):
         return f"{self.producto.nombre} - {self.usuario} ({self.rating})"
 
 
-    
-    # ---------- Helper properties on Producto (attached dynamically) ----------
+class CatalogoVersion(models.Model):
+    """Contador global que cambia con cada escritura del catálogo.
+
+    Una sola fila (pk=1). Las señales de Producto, Oferta y Review la
+    incrementan y las vistas la usan como ETag/Last-Modified para responder
+    304 sin volver a consultar ni renderizar.
+    """
+    version = models.PositiveBigIntegerField('Versión', default=0)
+    actualizado = models.DateTimeField('Actualizado', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Versión del catálogo'
+        verbose_name_plural = 'Versión del catálogo'
+
+    def __str__(self):
+        return f"v{self.version} ({self.actualizado:%Y-%m-%d %H:%M:%S})"
+
+    @property
+    def token(self) -> str:
+        """Identificador para claves de cache/ETag.
+
+        Incluye la fecha además del contador para no repetir valores si la
+        tabla se reinicia (flush, restauraciones, tests).
+        """
+        return f"{self.version}.{int(self.actualizado.timestamp() * 1_000_000)}"
+
+    @classmethod
+    def actual(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj
+
+    @classmethod
+    def incrementar(cls):
+        # UPDATE atómico: varios workers pueden escribir a la vez
+        actualizadas = cls.objects.filter(pk=1).update(
+            version=F('version') + 1, actualizado=timezone.now(),
+        )
+        if not actualizadas:
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+
+class ProductoAliado(models.Model):
+    """Copia local del catálogo de la API aliada.
+
+    La llena `catalog.services.partner_catalog` (en segundo plano o con
+    `manage.py sincronizar_aliados`); la vista /partner-products/ filtra y
+    pagina sobre esta tabla sin esperar a la API externa.
+    """
+    id_externo = models.CharField('ID en la API aliada', max_length=64, unique=True)
+    nombre = models.CharField('Nombre', max_length=200)
+    descripcion = models.TextField('Descripción', blank=True)
+    categoria = models.CharField('Categoría', max_length=100, blank=True, db_index=True)
+    tienda = models.CharField('Tienda', max_length=150, blank=True, db_index=True)
+    precio = models.DecimalField('Precio', max_digits=12, decimal_places=2, default=Decimal('0.00'), db_index=True)
+    imagen = models.URLField('Imagen', max_length=500, blank=True)
+    link = models.URLField('Enlace del producto', max_length=500, blank=True)
+    actualizado = models.DateTimeField('Actualizado', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Producto aliado'
+        verbose_name_plural = 'Productos aliados'
+        ordering = ['nombre']
+
+    def __str__(self):
+        return f"{self.nombre} ({self.tienda})"
+
+
+class SincronizacionAliado(models.Model):
+    """Estado de la copia local del catálogo aliado (una sola fila, pk=1)."""
+    completada = models.DateTimeField('Última sincronización correcta', null=True, blank=True)
+    intentada = models.DateTimeField('Último intento', null=True, blank=True)
+    total = models.PositiveIntegerField('Productos', default=0)
+    error = models.TextField('Último error', blank=True)
+
+    class Meta:
+        verbose_name = 'Sincronización del catálogo aliado'
+        verbose_name_plural = 'Sincronización del catálogo aliado'
+
+    def __str__(self):
+        return f"{self.total} productos ({self.completada or 'nunca'})"
+
+    @classmethod
+    def actual(cls):
+        obj, _ = cls.objects.get_or_create(pk=1)
+        return obj
 
+    @classmethod
+    async def aactual(cls):
+        obj, _ = await cls.objects.aget_or_create(pk=1)
+        return obj
 
-def producto_avg_rating(self):
-    qs = self.reviews.all()
-    if not qs.exists():
-        return None
-    return qs.aggregate(avg=models.Avg('rating'))['avg']
 
+class ExportJob(models.Model):
+    """Exportación del listado de productos generada en segundo plano.
 
-def producto_rating_count(self):
-    return self.reviews.count()
+    La cola es esta misma tabla: los workers (services/export_jobs.py)
+    toman el pendiente más antiguo con un UPDATE condicional sobre `status`
+    y guardan el archivo en el storage por defecto. `clave` identifica
+    formato + filtros + versión del catálogo para reutilizar resultados.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
 
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendiente'),
+        (STATUS_RUNNING, 'En proceso'),
+        (STATUS_DONE, 'Terminada'),
+        (STATUS_FAILED, 'Fallida'),
+    ]
 
-# attach helper properties to Producto for templates convenience
-Producto.avg_rating = property(producto_avg_rating)
-Producto.rating_count = property(producto_rating_count)
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    formato = models.CharField('Formato', max_length=10)
+    filtros = models.JSONField('Filtros', default=dict, blank=True)
+    clave = models.CharField('Clave de reutilización', max_length=64, db_index=True)
+    status = models.CharField('Estado', max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name='export_jobs',
+        verbose_name='Usuario',
+    )
+    archivo = models.FileField('Archivo', upload_to='exports/', blank=True)
+    filas = models.PositiveIntegerField('Filas', null=True, blank=True)
+    error = models.TextField('Error', blank=True)
+    creado = models.DateTimeField('Creado', default=timezone.now)
+    iniciado = models.DateTimeField('Iniciado', null=True, blank=True)
+    terminado = models.DateTimeField('Terminado', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Exportación'
+        verbose_name_plural = 'Exportaciones'
+        ordering = ['-creado']
+        indexes = [models.Index(fields=['status', 'creado'])]
+
+    def __str__(self):
+        return f"{self.formato} {self.get_status_display()} ({self.creado:%Y-%m-%d %H:%M})"
+
+    @property
+    def nombre_archivo(self) -> str:
+        return os.path.basename(self.archivo.name) if self.archivo else ""
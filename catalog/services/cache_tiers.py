@@ -0,0 +1,217 @@
+# catalog/services/cache_tiers.py
+"""Cache en dos niveles para datos del catálogo.
+
+1. Local: un LRU con TTL corto en la memoria de cada proceso (sin
+   serializar ni tocar disco).
+2. Compartido: el cache `default` de Django (archivos en CACHE_DIR, ver
+   settings), visible para todos los workers de la máquina.
+
+Cada familia de claves (`familia("facets")`, ...) tiene su TTL y sus
+contadores de aciertos/fallos por nivel (`cache_stats`, expuestos en
+/api/cache/stats/). Las claves llevan la versión de lo que cachean (versión
+del catálogo, fecha de la última sincronización aliada), así que no se
+invalidan: al cambiar los datos cambia la clave.
+
+Un fallo en ambos niveles se recalcula una sola vez (single-flight): dentro
+del proceso con un lock por clave y entre procesos con `cache.add` de una
+marca; los demás esperan el resultado en el cache compartido hasta
+`lock_timeout` segundos y, si no llega, lo calculan ellos.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_LOCAL_TTL = 30
+DEFAULT_LOCAL_SIZE = 256
+DEFAULT_LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """LRU con vencimiento por entrada; seguro entre hilos."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """El valor, o _MISSING si no está o venció."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@dataclass
+class CacheStats:
+    local_hits: int = 0
+    shared_hits: int = 0
+    misses: int = 0           # no estaba en ningún nivel
+    computes: int = 0         # recálculos hechos por este proceso
+    waits: int = 0            # fallos que esperaron el cálculo de otro proceso
+    compute_ms_total: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **deltas) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.local_hits + self.shared_hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "computes": self.computes,
+                "waits": self.waits,
+                "hit_ratio": round((self.local_hits + self.shared_hits) / total, 3) if total else None,
+                "compute_avg_ms": round(self.compute_ms_total / self.computes, 1) if self.computes else None,
+            }
+
+
+class CacheFamily:
+    def __init__(self, name: str, shared_timeout: Optional[int] = 3600, local_ttl: Optional[float] = None,
+                 local_maxsize: Optional[int] = None, lock_timeout: float = DEFAULT_LOCK_TIMEOUT,
+                 alias: str = "default"):
+        self.name = name
+        self.shared_timeout = shared_timeout
+        self.lock_timeout = lock_timeout
+        self.alias = alias
+        self.local = LocalLRU(
+            local_maxsize or getattr(settings, "CATALOG_LOCAL_CACHE_SIZE", DEFAULT_LOCAL_SIZE),
+            local_ttl if local_ttl is not None else getattr(settings, "CATALOG_LOCAL_CACHE_TTL", DEFAULT_LOCAL_TTL),
+        )
+        self.stats = CacheStats()
+        self._flights: Dict[str, threading.Lock] = {}
+        self._flights_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, key: str) -> str:
+        return f"catalog:{self.name}:{key}"
+
+    def get_or_set(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Valor de `key` desde el nivel local, el compartido o `compute()`."""
+        full = self._key(key)
+        value = self.local.get(full)
+        if value is not _MISSING:
+            self.stats.add(local_hits=1)
+            return value
+        value = self.shared.get(full, _MISSING)
+        if value is not _MISSING:
+            self.stats.add(shared_hits=1)
+            self.local.set(full, value)
+            return value
+
+        self.stats.add(misses=1)
+        with self._flight(full):
+            try:
+                # Otro hilo del proceso pudo haberlo calculado mientras esperábamos
+                value = self.local.get(full)
+                if value is _MISSING:
+                    value = self._compute_shared(full, compute)
+                    self.local.set(full, value)
+            finally:
+                with self._flights_lock:
+                    self._flights.pop(full, None)
+        return value
+
+    def delete(self, key: str) -> None:
+        full = self._key(key)
+        self.local.delete(full)
+        self.shared.delete(full)
+
+    def _flight(self, full: str) -> threading.Lock:
+        with self._flights_lock:
+            lock = self._flights.get(full)
+            if lock is None:
+                lock = self._flights[full] = threading.Lock()
+        return lock
+
+    def _compute_shared(self, full: str, compute: Callable[[], Any]) -> Any:
+        lock_key = f"{full}:calculando"
+        acquired = self.shared.add(lock_key, 1, self.lock_timeout)
+        if not acquired:
+            # Otro proceso lo está calculando: esperar su resultado
+            self.stats.add(waits=1)
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                value = self.shared.get(full, _MISSING)
+                if value is not _MISSING:
+                    return value
+            # Se cayó o tarda demasiado: calcularlo aquí
+        try:
+            start = time.perf_counter()
+            value = compute()
+            self.stats.add(computes=1, compute_ms_total=(time.perf_counter() - start) * 1000)
+            self.shared.set(full, value, self.shared_timeout)
+            return value
+        finally:
+            if acquired:
+                self.shared.delete(lock_key)
+
+
+_families: Dict[str, CacheFamily] = {}
+_families_lock = threading.Lock()
+
+
+def familia(name: str, **kwargs) -> CacheFamily:
+    """La familia `name` del proceso (se crea con `kwargs` la primera vez)."""
+    with _families_lock:
+        family = _families.get(name)
+        if family is None:
+            family = _families[name] = CacheFamily(name, **kwargs)
+        return family
+
+
+def limpiar_local() -> None:
+    """Vacía el nivel local de todas las familias de este proceso (el compartido no se toca)."""
+    with _families_lock:
+        families = list(_families.values())
+    for family in families:
+        family.local.clear()
+
+
+def cache_stats() -> Dict[str, dict]:
+    """Contadores por familia de este proceso."""
+    with _families_lock:
+        families = list(_families.values())
+    return {f.name: {**f.stats.snapshot(), "local_entries": len(f.local)} for f in families}
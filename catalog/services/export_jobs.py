@@ -0,0 +1,248 @@
+# catalog/services/export_jobs.py
+"""Cola de exportaciones en segundo plano, sobre la base de datos.
+
+- `submit_export` crea un ExportJob pendiente (o devuelve uno reutilizable:
+  mismo formato, filtros y versión del catálogo, en curso o terminado hace
+  menos de EXPORT_REUSE_SECONDS) y despierta el pool local.
+- El pool son EXPORT_WORKERS hilos por proceso. Cada uno toma el pendiente
+  más antiguo con un UPDATE condicional (como el turno de partner_catalog),
+  así que varios procesos pueden compartir la cola sin broker. Entre todos
+  no corren más de EXPORT_MAX_RUNNING a la vez (límite aproximado: se
+  comprueba antes de tomar el trabajo).
+- Antes de contar los trabajos en curso (al tomar uno o al buscar uno
+  reutilizable) se marcan como fallidos los colgados: un worker que murió no
+  ocupa un lugar de EXPORT_MAX_RUNNING para siempre. Los archivos viejos se
+  borran desde el mismo lugar, a lo sumo una vez cada EXPORT_PURGE_INTERVAL
+  segundos por proceso.
+- Los pendientes anónimos no pasan de EXPORT_MAX_PENDING_ANONYMOUS entre
+  todos (la API no exige sesión) y los de cada usuario de
+  EXPORT_MAX_PENDING_PER_USER: `submit_export` lanza ExportQueueFull (429 en
+  la vista). Un flood anónimo no bloquea a los usuarios con sesión.
+- `manage.py procesar_exportaciones` procesa la cola desde fuera del
+  servidor web y hace la misma limpieza.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from catalog.models import CatalogoVersion, ExportJob
+from catalog.services.exports import build_export, export_options, export_title, renderer_for
+from catalog.services.listing import list_filters
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_RUNNING = 4
+DEFAULT_REUSE = 10 * 60
+DEFAULT_JOB_TIMEOUT = 30 * 60
+DEFAULT_RETENTION = 24 * 60 * 60
+DEFAULT_PURGE_INTERVAL = 10 * 60
+DEFAULT_MAX_PENDING_ANONYMOUS = 50
+DEFAULT_MAX_PENDING_PER_USER = 5
+
+
+class ExportQueueFull(Exception):
+    """Hay demasiadas exportaciones pendientes para quien pide otra."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def export_key(fmt: str, filters: Mapping, catalog_token: str) -> str:
+    raw = json.dumps([fmt, sorted(filters.items()), catalog_token], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def submit_export(fmt: str, params: Mapping, user=None) -> Tuple[ExportJob, bool]:
+    """
+    Encola la exportación de `params` (filtros de /products/) en `fmt`.
+    Devuelve (trabajo, reutilizado). Lanza ExportError si el formato no existe
+    y ExportQueueFull si hay que crear uno y ya se llegó al límite de pendientes.
+    """
+    fmt = (fmt or "").lower()
+    renderer_for(fmt)  # valida el formato
+    # Los filtros del listado más el modo (detalle/resumen): definen el contenido
+    filters = {**list_filters(params), **export_options(params)}
+    key = export_key(fmt, filters, CatalogoVersion.actual().token)
+
+    fail_stale_jobs()  # un trabajo colgado no se reutiliza
+    recent = timezone.now() - timedelta(seconds=_setting("EXPORT_REUSE_SECONDS", DEFAULT_REUSE))
+    existing = (
+        ExportJob.objects.filter(clave=key)
+        .filter(
+            Q(status__in=(ExportJob.STATUS_PENDING, ExportJob.STATUS_RUNNING))
+            | Q(status=ExportJob.STATUS_DONE, terminado__gte=recent)
+        )
+        .order_by("-creado")
+        .first()
+    )
+    if existing is not None:
+        return existing, True
+
+    owner = user if user is not None and user.is_authenticated else None
+    _check_pending_limit(owner)
+    job = ExportJob.objects.create(formato=fmt, filtros=filters, clave=key, usuario=owner)
+    # El worker no ve la fila hasta que la transacción del request termine
+    transaction.on_commit(wake_workers)
+    return job, False
+
+
+def _check_pending_limit(owner) -> None:
+    """Límite aproximado (dos requests a la vez pueden pasarlo por uno)."""
+    pending = ExportJob.objects.filter(status=ExportJob.STATUS_PENDING)
+    if owner is None:
+        pending = pending.filter(usuario__isnull=True)
+        limit = _setting("EXPORT_MAX_PENDING_ANONYMOUS", DEFAULT_MAX_PENDING_ANONYMOUS)
+    else:
+        pending = pending.filter(usuario=owner)
+        limit = _setting("EXPORT_MAX_PENDING_PER_USER", DEFAULT_MAX_PENDING_PER_USER)
+    if pending.count() >= limit:
+        raise ExportQueueFull(f"Ya hay {limit} exportaciones pendientes; vuelva a intentarlo en unos minutos.")
+
+
+def _claim_next() -> Optional[ExportJob]:
+    """Toma el pendiente más antiguo; None si no hay o se llegó al límite."""
+    _cleanup()
+    running = ExportJob.objects.filter(status=ExportJob.STATUS_RUNNING).count()
+    if running >= _setting("EXPORT_MAX_RUNNING", DEFAULT_MAX_RUNNING):
+        return None
+    pending = (
+        ExportJob.objects.filter(status=ExportJob.STATUS_PENDING)
+        .order_by("creado")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in pending:
+        # Si otro worker lo tomó primero el UPDATE no afecta filas
+        claimed = ExportJob.objects.filter(pk=pk, status=ExportJob.STATUS_PENDING).update(
+            status=ExportJob.STATUS_RUNNING, iniciado=timezone.now(),
+        )
+        if claimed:
+            return ExportJob.objects.get(pk=pk)
+    return None
+
+
+def run_job(job: ExportJob) -> ExportJob:
+    """Genera el archivo del trabajo (ya tomado) y guarda el resultado."""
+    timestamp = timezone.localtime(job.creado).strftime("%Y%m%d_%H%M%S")
+    title = export_title(job.filtros, timestamp)
+    try:
+        ext = renderer_for(job.formato).extension
+        # El renderer escribe a un temporal que pasa a disco al crecer
+        out, rows = build_export(job.formato, job.filtros, title)
+        with out:
+            job.archivo.save(f"productos_{timestamp}.{ext}", File(out), save=False)
+    except Exception as exc:
+        logger.exception("Falló la exportación %s", job.pk)
+        job.status = ExportJob.STATUS_FAILED
+        job.error = str(exc)
+    else:
+        job.status = ExportJob.STATUS_DONE
+        job.filas = rows
+        job.error = ""
+    job.terminado = timezone.now()
+    job.save(update_fields=["status", "archivo", "filas", "error", "terminado"])
+    return job
+
+
+def process_pending(limit: Optional[int] = None) -> int:
+    """Procesa pendientes hasta vaciar la cola (o `limit`). Devuelve cuántos corrió."""
+    done = 0
+    while limit is None or done < limit:
+        job = _claim_next()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
+
+
+def fail_stale_jobs() -> int:
+    """Marca como fallidos los trabajos en curso desde hace más de EXPORT_JOB_TIMEOUT."""
+    limit = timezone.now() - timedelta(seconds=_setting("EXPORT_JOB_TIMEOUT", DEFAULT_JOB_TIMEOUT))
+    return ExportJob.objects.filter(status=ExportJob.STATUS_RUNNING, iniciado__lt=limit).update(
+        status=ExportJob.STATUS_FAILED, terminado=timezone.now(),
+        error="La exportación no terminó a tiempo (¿se reinició el worker?)",
+    )
+
+
+def purge_old_exports() -> int:
+    """Borra trabajos terminados o fallidos (y sus archivos) más viejos que EXPORT_RETENTION."""
+    limit = timezone.now() - timedelta(seconds=_setting("EXPORT_RETENTION", DEFAULT_RETENTION))
+    old = ExportJob.objects.filter(
+        status__in=(ExportJob.STATUS_DONE, ExportJob.STATUS_FAILED), creado__lt=limit,
+    )
+    total = 0
+    for job in old.iterator():
+        if job.archivo:
+            job.archivo.delete(save=False)
+        job.delete()
+        total += 1
+    return total
+
+
+_last_purge = None  # time.monotonic() de la última purga en este proceso
+_purge_lock = threading.Lock()
+
+
+def _cleanup() -> None:
+    """Colgados en cada llamada (un UPDATE); purga de viejos cada EXPORT_PURGE_INTERVAL."""
+    global _last_purge
+    fail_stale_jobs()
+    interval = _setting("EXPORT_PURGE_INTERVAL", DEFAULT_PURGE_INTERVAL)
+    with _purge_lock:
+        now = time.monotonic()
+        if _last_purge is not None and now - _last_purge < interval:
+            return
+        _last_purge = now
+    try:
+        purge_old_exports()
+    except Exception:
+        logger.exception("No se pudieron borrar las exportaciones viejas")
+
+
+# --- Pool local ---
+
+_executor: Optional[ThreadPoolExecutor] = None
+_active = 0
+_lock = threading.Lock()
+
+
+def _worker_loop():
+    global _active
+    try:
+        process_pending()
+    except Exception:
+        logger.exception("Error inesperado en el worker de exportaciones")
+    finally:
+        # Los hilos del pool se reutilizan: no dejar conexiones abiertas
+        connections.close_all()
+        with _lock:
+            _active -= 1
+
+
+def wake_workers():
+    """Arranca un worker local si hay lugar. Con EXPORT_WORKERS=0 no hace nada."""
+    global _executor, _active
+    workers = _setting("EXPORT_WORKERS", DEFAULT_WORKERS)
+    if workers <= 0:
+        return
+    with _lock:
+        if _active >= workers:
+            # Los que ya corren siguen hasta vaciar la cola
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="exportaciones")
+        _active += 1
+    _executor.submit(_worker_loop)
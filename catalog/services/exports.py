@@ -0,0 +1,191 @@
+# catalog/services/exports.py
+"""Exportación del listado de productos (/products/export/).
+
+Las filas salen de la base por lotes (EXPORT_CHUNK_SIZE), con los mismos
+filtros y orden que product_list, y se pasan a un renderer de
+services/reporting.py elegido por DefaultReportFactory. La usan la vista
+síncrona y los trabajos en segundo plano (services/export_jobs.py).
+
+Con `mode=summary` en vez de una fila por producto sale una por categoría
+(o tienda, con `group=store`), agregada con GROUP BY en la base. Los PDF de
+detalle con más de REPORT_PDF_PARALLEL_MIN_ROWS filas se dibujan en
+paralelo (ParallelPDFRenderer). `parquet` y `arrow` no usan renderers: los
+arma services/columnar.py con columnas tipadas.
+"""
+import os
+from typing import BinaryIO, Iterable, Iterator, List, Mapping, Tuple
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min, Sum
+
+from catalog.models import Producto
+from catalog.services.columnar import COLUMNAR_FORMATS, ColumnarExport
+from catalog.services.listing import filter_products, order_products
+from catalog.services.reporting import (
+    PYPDF_OK, DefaultReportFactory, ParallelPDFRenderer, PDFRenderer, ReportColumn, get_pdf_executor,
+)
+
+EXPORT_FIELDS = ("nombre", "categoria", "tienda", "precio_vigente", "rating_avg", "rating_count")
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _money(value) -> str:
+    return f"{float(value):.2f}" if value is not None else ""
+
+
+def _rating(value) -> str:
+    return f"{float(value):.1f}" if value is not None else ""
+
+
+# Anchos en puntos para el PDF (carta, 40pt de margen: 532pt útiles)
+EXPORT_COLUMNS = [
+    ReportColumn("Nombre", "nombre", width=200),
+    ReportColumn("Categoría", "categoria", width=90),
+    ReportColumn("Tienda", "tienda", width=90),
+    ReportColumn("Precio vigente", "precio_vigente", fmt=_money, number_format="#,##0.00",
+                 width=72, align="right"),
+    ReportColumn("Rating prom.", "rating_avg", fmt=_rating, number_format="0.0", width=50, align="right"),
+    ReportColumn("N° reseñas", "rating_count", fmt=lambda v: str(v or 0), width=30, align="right"),
+]
+EXPORT_HEADERS = [c.header for c in EXPORT_COLUMNS]
+
+# group -> (campo agrupado, encabezado)
+SUMMARY_GROUPS = {"category": ("categoria", "Categoría"), "store": ("tienda", "Tienda")}
+
+DEFAULT_PDF_PARALLEL_MIN_ROWS = 5000
+DEFAULT_PDF_PAGES_PER_CHUNK = 25
+
+
+def summary_columns(group: str) -> List[ReportColumn]:
+    field, header = SUMMARY_GROUPS[group]
+    return [
+        ReportColumn(header, field, fmt=lambda v: v or "(sin dato)", width=172),
+        ReportColumn("Productos", "productos", width=60, align="right"),
+        ReportColumn("Precio mín.", "precio_min", fmt=_money, number_format="#,##0.00", width=70, align="right"),
+        ReportColumn("Precio prom.", "precio_prom", fmt=_money, number_format="#,##0.00", width=70, align="right"),
+        ReportColumn("Precio máx.", "precio_max", fmt=_money, number_format="#,##0.00", width=70, align="right"),
+        ReportColumn("Rating prom.", "rating_prom", fmt=_rating, number_format="0.0", width=50, align="right"),
+        ReportColumn("Reseñas", "resenas", fmt=lambda v: str(v or 0), width=40, align="right"),
+    ]
+
+
+class ExportError(Exception):
+    """El formato pedido no existe."""
+
+
+def export_options(params: Mapping) -> dict:
+    """Opciones de la exportación que cambian su contenido (además de los filtros)."""
+    if (params.get("mode") or "").strip() != "summary":
+        return {}
+    group = (params.get("group") or "").strip()
+    return {"mode": "summary", "group": group if group in SUMMARY_GROUPS else "category"}
+
+
+def _filtered(params: Mapping):
+    return filter_products(Producto.objects.filter(disponible=True), params)
+
+
+def _batched(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_batches(params: Mapping, size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """
+    Lotes de filas (dicts con EXPORT_FIELDS) del listado filtrado por
+    `params` (request.GET o dict), leídos con values_list por cursor.
+    """
+    qs, sort = _filtered(params)
+    rows = order_products(qs, sort).values_list(*EXPORT_FIELDS).iterator(chunk_size=size)
+    return _batched((dict(zip(EXPORT_FIELDS, row)) for row in rows), size)
+
+
+def summary_batches(params: Mapping, group: str, size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """Una fila por categoría/tienda con conteo, precios y rating agregados en SQL."""
+    field, _header = SUMMARY_GROUPS[group]
+    qs, _sort = _filtered(params)
+    rows = (
+        qs.order_by()
+        .values(field)
+        .annotate(
+            productos=Count("id"),
+            precio_min=Min("precio_vigente"),
+            precio_prom=Avg("precio_vigente"),
+            precio_max=Max("precio_vigente"),
+            rating_prom=Avg("rating_avg"),
+            resenas=Sum("rating_count"),
+        )
+        .order_by(field)
+    )
+    return _batched(rows.iterator(chunk_size=size), size)
+
+
+def export_plan(params: Mapping) -> Tuple[List[ReportColumn], Iterator[List[dict]]]:
+    """Columnas y lotes de filas según el modo (detalle o resumen)."""
+    options = export_options(params)
+    if options.get("mode") == "summary":
+        return summary_columns(options["group"]), summary_batches(params, options["group"])
+    return EXPORT_COLUMNS, export_batches(params)
+
+
+def export_title(params: Mapping, timestamp: str) -> str:
+    options = export_options(params)
+    if options.get("mode") == "summary":
+        return f"Resumen por {SUMMARY_GROUPS[options['group']][1].lower()} ({timestamp})"
+    return f"Reporte de productos ({timestamp})"
+
+
+def renderer_for(fmt: str):
+    fmt = (fmt or "").lower()
+    if fmt in COLUMNAR_FORMATS:
+        return COLUMNAR_FORMATS[fmt]()
+    if not DefaultReportFactory.supports(fmt):
+        raise ExportError(f"Formato no soportado: {fmt}")
+    return DefaultReportFactory.for_format(fmt)
+
+
+def _pdf_processes() -> int:
+    return getattr(settings, "REPORT_PDF_PROCESSES", 0) or os.cpu_count() or 1
+
+
+def _renderer_for_export(fmt: str, params: Mapping):
+    """Como renderer_for, pero elige el PDF en paralelo si el detalle es grande."""
+    renderer = renderer_for(fmt)
+    if (
+        not isinstance(renderer, PDFRenderer)
+        or not PYPDF_OK
+        or export_options(params)
+        or _pdf_processes() < 2
+    ):
+        return renderer
+    min_rows = getattr(settings, "REPORT_PDF_PARALLEL_MIN_ROWS", DEFAULT_PDF_PARALLEL_MIN_ROWS)
+    qs, _sort = _filtered(params)
+    if qs.count() < min_rows:
+        return renderer
+    return ParallelPDFRenderer(
+        get_pdf_executor(_pdf_processes()),
+        pages_per_chunk=getattr(settings, "REPORT_PDF_PAGES_PER_CHUNK", DEFAULT_PDF_PAGES_PER_CHUNK),
+        max_pending=2 * _pdf_processes(),
+    )
+
+
+def build_export(fmt: str, params: Mapping, title: str) -> Tuple[BinaryIO, int]:
+    """
+    Genera la exportación completa con el renderer de `fmt`. Devuelve el
+    archivo (en la posición 0) y la cantidad de filas. Lanza ExportError o
+    ReportUnavailable.
+    """
+    renderer = _renderer_for_export(fmt, params)
+    if isinstance(renderer, ColumnarExport):
+        return renderer.build(params, title), renderer.rows_written
+    columns, batches = export_plan(params)
+    renderer.begin(title, columns)
+    for batch in batches:
+        renderer.write_rows(batch)
+    return renderer.finish(), renderer.rows_written
@@ -0,0 +1,73 @@
+# catalog/services/facets.py
+"""Índice de facetas (categorías y tiendas) del catálogo.
+
+Se construye con dos GROUP BY y se guarda en cache (familia "facets" de
+services/cache_tiers.py) con la versión del catálogo en la clave: cualquier
+escritura de Producto/Oferta/Review cambia la versión, así que no hace falta
+invalidar a mano.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db.models import Count, Q
+from django.utils.text import slugify
+
+from catalog.models import CatalogoVersion, Producto
+from catalog.services.cache_tiers import familia
+
+FACETS_CACHE_TIMEOUT = 60 * 60
+
+_cache = familia("facets", shared_timeout=FACETS_CACHE_TIMEOUT)
+
+
+@dataclass(frozen=True)
+class Faceta:
+    name: str
+    slug: str
+    count: int  # productos disponibles
+
+
+@dataclass
+class FacetIndex:
+    categorias: List[Faceta] = field(default_factory=list)
+    tiendas: List[Faceta] = field(default_factory=list)
+    # slug -> nombre, incluye valores sin productos disponibles
+    categoria_por_slug: Dict[str, str] = field(default_factory=dict)
+    tienda_por_slug: Dict[str, str] = field(default_factory=dict)
+
+
+def _facetas(campo):
+    rows = (
+        Producto.objects.exclude(**{f"{campo}__isnull": True})
+        .exclude(**{f"{campo}__exact": ""})
+        .values(campo)
+        .annotate(total=Count("id", filter=Q(disponible=True)))
+        .order_by(campo)
+    )
+    facetas = []
+    por_slug = {}
+    for row in rows:
+        nombre = row[campo]
+        slug = slugify(nombre)
+        por_slug.setdefault(slug, nombre)
+        if row["total"]:
+            facetas.append(Faceta(name=nombre, slug=slug, count=row["total"]))
+    return facetas, por_slug
+
+
+def build_facet_index() -> FacetIndex:
+    categorias, categoria_por_slug = _facetas("categoria")
+    tiendas, tienda_por_slug = _facetas("tienda")
+    return FacetIndex(
+        categorias=categorias,
+        tiendas=tiendas,
+        categoria_por_slug=categoria_por_slug,
+        tienda_por_slug=tienda_por_slug,
+    )
+
+
+def get_facet_index(version: Optional[CatalogoVersion] = None) -> FacetIndex:
+    """Devuelve el índice de la versión dada (o la actual) desde cache."""
+    if version is None:
+        version = CatalogoVersion.actual()
+    return _cache.get_or_set(version.token, build_facet_index)
@@ -0,0 +1,181 @@
+# catalog/services/instrumentation.py
+"""Consultas, tiempo de BD, de plantillas y latencia por vista.
+
+`medir(nombre)` es un context manager que registra lo que pasa dentro del
+bloque (también en los hilos de sync_to_async: la medición viaja en un
+ContextVar) y lo suma a las estadísticas de `nombre`.
+InstrumentacionMiddleware (catalog/middleware.py) lo usa para una fracción
+de los requests (INSTRUMENTATION_SAMPLE_RATE) y agrega el header
+Server-Timing a las respuestas para staff (o a todas con
+INSTRUMENTATION_SERVER_TIMING).
+
+Las consultas se cuentan con un execute_wrapper que se instala en cada
+conexión al abrirla (`instalar`, desde CatalogConfig.ready), así que no
+hace falta DEBUG. El tiempo de plantillas lo suma `medir_plantilla()`,
+que envuelve el render de las vistas (views.render); las consultas
+perezosas que corren al dibujar cuentan en ambos tiempos. Fuera de un
+bloque medido el costo es leer el ContextVar.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, Optional
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Latencias recientes por vista para los percentiles
+MUESTRAS_POR_VISTA = 200
+
+
+@dataclass
+class Medicion:
+    nombre: Optional[str] = None  # vista o bloque al que se suman las estadísticas
+    queries: int = 0
+    db_ms: float = 0.0
+    template_ms: float = 0.0
+    total_ms: float = 0.0
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries", '
+            f"tpl;dur={self.template_ms:.1f}, total;dur={self.total_ms:.1f}"
+        )
+
+
+_actual: ContextVar[Optional[Medicion]] = ContextVar("catalog_medicion", default=None)
+
+
+def percentil(valores, p):
+    """Percentil `p` (0..100) por el rango más cercano; 0.0 sin valores."""
+    if not valores:
+        return 0.0
+    orden = sorted(valores)
+    return orden[min(len(orden) - 1, int(round(p / 100 * (len(orden) - 1))))]
+
+
+@dataclass
+class EstadisticasVista:
+    requests: int = 0
+    queries: int = 0
+    queries_max: int = 0
+    db_ms: float = 0.0
+    template_ms: float = 0.0
+    total_ms: float = 0.0
+    latencias: Deque[float] = field(default_factory=lambda: deque(maxlen=MUESTRAS_POR_VISTA))
+
+    def agregar(self, m: Medicion) -> None:
+        self.requests += 1
+        self.queries += m.queries
+        self.queries_max = max(self.queries_max, m.queries)
+        self.db_ms += m.db_ms
+        self.template_ms += m.template_ms
+        self.total_ms += m.total_ms
+        self.latencias.append(m.total_ms)
+
+    def snapshot(self) -> dict:
+        n = self.requests
+        return {
+            "requests": n,
+            "queries_avg": round(self.queries / n, 1),
+            "queries_max": self.queries_max,
+            "db_ms_avg": round(self.db_ms / n, 1),
+            "template_ms_avg": round(self.template_ms / n, 1),
+            "total_ms_avg": round(self.total_ms / n, 1),
+            "total_ms_p50": round(percentil(self.latencias, 50), 1),
+            "total_ms_p95": round(percentil(self.latencias, 95), 1),
+        }
+
+
+_stats: Dict[str, EstadisticasVista] = {}
+_stats_lock = threading.Lock()
+
+
+def registrar(nombre: str, m: Medicion) -> None:
+    with _stats_lock:
+        _stats.setdefault(nombre, EstadisticasVista()).agregar(m)
+
+
+def estadisticas() -> Dict[str, dict]:
+    """Estadísticas por vista de este proceso, de la más lenta a la más rápida."""
+    with _stats_lock:
+        snapshots = {nombre: s.snapshot() for nombre, s in _stats.items()}
+    return dict(sorted(snapshots.items(), key=lambda kv: -kv[1]["total_ms_avg"]))
+
+
+def reiniciar() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+@contextmanager
+def medir(nombre: Optional[str] = None) -> Iterator[Medicion]:
+    """
+    Mide el bloque. Con `nombre` suma el resultado a las estadísticas; si el
+    nombre recién se conoce al final (la vista), asignar `medicion.nombre`.
+    """
+    m = Medicion(nombre=nombre)
+    token = _actual.set(m)
+    inicio = time.perf_counter()
+    try:
+        yield m
+    finally:
+        m.total_ms = (time.perf_counter() - inicio) * 1000
+        _actual.reset(token)
+        if m.nombre:
+            registrar(m.nombre, m)
+
+
+@contextmanager
+def medir_plantilla() -> Iterator[None]:
+    """Suma la duración del bloque al tiempo de plantillas de la medición en curso."""
+    m = _actual.get()
+    if m is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        m.template_ms += (time.perf_counter() - inicio) * 1000
+
+
+# --- Ganchos ---
+
+def _contar_consulta(execute, sql, params, many, context):
+    m = _actual.get()
+    if m is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        m.queries += 1
+        m.db_ms += (time.perf_counter() - inicio) * 1000
+
+
+def _instalar_en(connection) -> None:
+    if _contar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_contar_consulta)
+
+
+def _conexion_creada(sender, connection, **kwargs):
+    _instalar_en(connection)
+
+
+_instalado = False
+
+
+def instalar() -> None:
+    """Engancha el conteo de consultas en todas las conexiones (una vez por proceso)."""
+    global _instalado
+    if _instalado:
+        return
+    _instalado = True
+    # Conexiones nuevas (cada hilo abre la suya) y las ya abiertas en este hilo
+    connection_created.connect(_conexion_creada, dispatch_uid="catalog_instrumentacion")
+    for connection in connections.all(initialized_only=True):
+        _instalar_en(connection)
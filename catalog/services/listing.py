@@ -0,0 +1,106 @@
+# catalog/services/listing.py
+"""Filtros y orden del listado de productos (/products/).
+
+Los comparten product_list, la exportación síncrona y los trabajos de
+exportación en segundo plano, que reciben los filtros como dict en vez de
+un request.
+"""
+from decimal import Decimal, InvalidOperation
+from typing import Mapping, Optional, Tuple
+
+from catalog.services.pagination import KeysetField, keyset_ordering
+from catalog.services.search import search_products
+
+# Parámetros del querystring que definen el resultado del listado
+LIST_FILTER_PARAMS = ("q", "category", "store", "min", "max", "rating", "sort")
+
+# Claves de orden por valor de `sort`; terminan en pk para que el orden sea
+# total y sirva tanto para OFFSET como para paginación por cursor.
+PRODUCT_SORT_KEYS = {
+    "name": (KeysetField("nombre"), KeysetField("id")),
+    "price_asc": (KeysetField("precio_vigente"), KeysetField("nombre"), KeysetField("id")),
+    "price_desc": (
+        KeysetField("precio_vigente", descending=True),
+        KeysetField("nombre", descending=True),
+        KeysetField("id", descending=True),
+    ),
+    # rating None al final; más reseñas primero si empata
+    "rating": (
+        KeysetField("rating_avg", descending=True),
+        KeysetField("rating_count", descending=True),
+        KeysetField("nombre"),
+        KeysetField("id"),
+    ),
+    # requiere la anotación search_rank (solo con ?q=)
+    "relevance": (KeysetField("search_rank", descending=True), KeysetField("nombre"), KeysetField("id")),
+}
+
+
+def product_sort_keys(sort):
+    return PRODUCT_SORT_KEYS.get(sort, PRODUCT_SORT_KEYS["name"])
+
+
+def order_products(qs, sort):
+    """
+    Ordena en la base de datos según `sort` = name | price_asc | price_desc | rating | relevance.
+    """
+    return qs.order_by(*keyset_ordering(product_sort_keys(sort)))
+
+
+def filter_price_range(qs, min_dec=None, max_dec=None):
+    """Filtra por rango sobre `precio_vigente` (precio con oferta aplicada)."""
+    if min_dec is not None:
+        qs = qs.filter(precio_vigente__gte=min_dec)
+    if max_dec is not None:
+        qs = qs.filter(precio_vigente__lte=max_dec)
+    return qs
+
+
+def _param(params: Mapping, name: str) -> str:
+    return (params.get(name) or "").strip()
+
+
+def list_filters(params: Mapping) -> dict:
+    """Solo los parámetros del listado con valor (para claves y trabajos)."""
+    return {name: _param(params, name) for name in LIST_FILTER_PARAMS if _param(params, name)}
+
+
+def filter_products(qs, params: Mapping) -> Tuple[object, str]:
+    """
+    Aplica q, category, store, rating, min y max de `params` a `qs`.
+    Devuelve (queryset, sort efectivo): sin q no hay orden por relevancia.
+    """
+    q = _param(params, "q")
+    sort = _param(params, "sort") or "name"
+
+    if q:
+        qs = search_products(qs, q, ranked=(sort == "relevance"))
+    elif sort == "relevance":
+        sort = "name"  # sin búsqueda no hay relevancia
+
+    category = _param(params, "category")
+    if category:
+        qs = qs.filter(categoria__iexact=category)
+    store = _param(params, "store")
+    if store:
+        qs = qs.filter(tienda__iexact=store)
+
+    # Rating mínimo (desnormalizado en Producto)
+    min_rating = _param(params, "rating")
+    try:
+        if min_rating:
+            qs = qs.filter(rating_avg__gte=float(min_rating))
+    except ValueError:
+        pass
+
+    # Rango de precio vigente
+    min_dec: Optional[Decimal] = None
+    max_dec: Optional[Decimal] = None
+    try:
+        if _param(params, "min"):
+            min_dec = Decimal(_param(params, "min").replace(",", "."))
+        if _param(params, "max"):
+            max_dec = Decimal(_param(params, "max").replace(",", "."))
+    except InvalidOperation:
+        min_dec = max_dec = None
+    return filter_price_range(qs, min_dec, max_dec), sort
@@ -0,0 +1,101 @@
+# catalog/services/page_cache.py
+"""Cache de tarjetas del listado y de páginas completas para anónimos.
+
+- Tarjetas: product_list.html guarda cada tarjeta con {% cache %}; la clave
+  lleva el id del producto, su versión (`versiones_productos`), el precio
+  vigente y el número de reseñas. Las señales de Producto, Oferta y Review
+  borran la versión del producto afectado (`invalidar_productos`), así que
+  solo se vuelven a dibujar sus tarjetas.
+- Páginas: las vistas con `cache_pagina_anonima` (views.py) guardan el HTML
+  completo para visitantes anónimos, con clave por versión del catálogo,
+  idioma, ruta y querystring normalizado (`clave_pagina`). Cualquier
+  escritura del catálogo cambia la versión y con ella la clave.
+
+El HTML guardado no lleva el token CSRF de quien lo generó: se reemplaza
+por una marca y al servirlo se pone el del visitante (`restaurar_csrf`).
+"""
+import hashlib
+import re
+import uuid
+from typing import Dict, Iterable, Mapping
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+
+from catalog.services.listing import LIST_FILTER_PARAMS
+
+DEFAULT_CARD_TIMEOUT = 60 * 60
+DEFAULT_PAGE_TIMEOUT = 5 * 60
+
+# Parámetros que cambian el HTML del listado y su valor por defecto
+PAGE_PARAMS = LIST_FILTER_PARAMS + ("page", "cursor")
+PAGE_PARAM_DEFAULTS = {"sort": "name", "page": "1"}
+
+_CSRF_MARCA = b"__csrf_token__"
+_CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def card_timeout() -> int:
+    return getattr(settings, "CATALOG_CARD_CACHE_TIMEOUT", DEFAULT_CARD_TIMEOUT)
+
+
+def page_timeout() -> int:
+    """0 desactiva la cache de páginas."""
+    return getattr(settings, "CATALOG_PAGE_CACHE_TIMEOUT", DEFAULT_PAGE_TIMEOUT)
+
+
+# --- Versiones por producto ---
+
+def _clave_version(pk) -> str:
+    return f"catalog:producto:{pk}:v"
+
+
+def versiones_productos(pks: Iterable[int]) -> Dict[int, str]:
+    """Versión de cache de cada producto (se crea si no existe)."""
+    claves = {_clave_version(pk): pk for pk in pks}
+    if not claves:
+        return {}
+    encontradas = cache.get_many(list(claves))
+    nuevas = {clave: uuid.uuid4().hex for clave in claves if clave not in encontradas}
+    if nuevas:
+        cache.set_many(nuevas, None)  # sin vencimiento: solo cambian al invalidar
+        encontradas.update(nuevas)
+    return {claves[clave]: version for clave, version in encontradas.items()}
+
+
+def invalidar_productos(*pks) -> None:
+    """Las tarjetas de estos productos se vuelven a dibujar en el próximo request."""
+    claves = [_clave_version(pk) for pk in pks if pk is not None]
+    if claves:
+        cache.delete_many(claves)
+
+
+# --- Páginas completas ---
+
+def normalizar_querystring(params: Mapping) -> str:
+    """Solo los parámetros que cambian la página, ordenados y sin los valores por defecto."""
+    items = []
+    for name in sorted(PAGE_PARAMS):
+        value = (params.get(name) or "").strip()
+        if value and value != PAGE_PARAM_DEFAULTS.get(name):
+            items.append((name, value))
+    return urlencode(items)
+
+
+def clave_pagina(nombre: str, catalog_token: str, idioma: str, path: str, params: Mapping) -> str:
+    raw = f"{path}?{normalizar_querystring(params)}"
+    digest = hashlib.md5(raw.encode("utf-8")).hexdigest()
+    return f"catalog:page:{nombre}:{catalog_token}:{idioma}:{digest}"
+
+
+def quitar_csrf(content: bytes) -> bytes:
+    return _CSRF_INPUT.sub(rb"\1" + _CSRF_MARCA + rb"\2", content)
+
+
+def restaurar_csrf(content: bytes, request) -> bytes:
+    if _CSRF_MARCA not in content:
+        return content
+    # get_token además pide a CsrfViewMiddleware que envíe la cookie
+    return content.replace(_CSRF_MARCA, get_token(request).encode("ascii"))
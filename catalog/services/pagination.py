@@ -0,0 +1,147 @@
+# catalog/services/pagination.py
+"""Paginación por cursor (keyset) sobre querysets ordenados.
+
+En vez de OFFSET, el cursor guarda los valores de orden de la última fila
+entregada y la siguiente página se pide con un WHERE sobre esos valores, así
+que el costo no crece con la profundidad de la página.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no se puede decodificar o no corresponde al orden."""
+
+
+@dataclass(frozen=True)
+class KeysetField:
+    name: str
+    descending: bool = False
+
+    def order_expression(self):
+        # NULL siempre al final, en ambos sentidos
+        expr = F(self.name)
+        return expr.desc(nulls_last=True) if self.descending else expr.asc(nulls_last=True)
+
+
+@dataclass
+class KeysetPage:
+    object_list: List[Any]
+    next_cursor: Optional[str] = None
+    has_next: bool = False
+    fields: Sequence[KeysetField] = field(default_factory=tuple)
+
+
+def _to_json(value):
+    if isinstance(value, Decimal):
+        return {"d": str(value)}
+    return value
+
+
+def _from_json(value):
+    if isinstance(value, dict) and "d" in value:
+        return Decimal(value["d"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Serializa los valores de orden en un token opaco apto para URLs."""
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, expected_len: Optional[int] = None) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error, UnicodeError) as exc:
+        raise InvalidCursor("Cursor inválido") from exc
+    if not isinstance(values, list) or (expected_len is not None and len(values) != expected_len):
+        raise InvalidCursor("Cursor inválido")
+    try:
+        return [_from_json(v) for v in values]
+    except ArithmeticError as exc:
+        raise InvalidCursor("Cursor inválido") from exc
+
+
+def cursor_for(obj, fields: Sequence[KeysetField]) -> str:
+    return encode_cursor([getattr(obj, f.name) for f in fields])
+
+
+def keyset_ordering(fields: Sequence[KeysetField]) -> list:
+    return [f.order_expression() for f in fields]
+
+
+def _after(fields: Sequence[KeysetField], values: Sequence[Any]) -> Q:
+    """Condición "fila posterior a `values`" según el orden de `fields`.
+
+    Para (a, b, c) es: a > va OR (a = va AND b > vb) OR (a = va AND b = vb AND c > vc),
+    teniendo en cuenta que los NULL van al final.
+    """
+    condition = Q(pk__in=[])
+    prefix = Q()
+    for f, value in zip(fields, values):
+        if value is None:
+            # Después de un NULL solo hay otros NULL: no hay término estricto
+            strictly_after = Q(pk__in=[])
+            equal = Q(**{f"{f.name}__isnull": True})
+        else:
+            lookup = "lt" if f.descending else "gt"
+            strictly_after = Q(**{f"{f.name}__{lookup}": value}) | Q(**{f"{f.name}__isnull": True})
+            equal = Q(**{f.name: value})
+        condition |= prefix & strictly_after
+        prefix &= equal
+    return condition
+
+
+def keyset_page(qs, fields: Sequence[KeysetField], cursor: Optional[str], per_page: int) -> KeysetPage:
+    """
+    Devuelve `per_page` filas de `qs` ordenado por `fields` posteriores a `cursor`.
+    El último campo debe ser único (normalmente `pk`) para que el orden sea total.
+    """
+    rows = list(_keyset_queryset(qs, fields, cursor)[:per_page + 1])
+    return _keyset_result(rows, fields, per_page)
+
+
+async def akeyset_page(qs, fields: Sequence[KeysetField], cursor: Optional[str], per_page: int) -> KeysetPage:
+    """Versión async de keyset_page (ORM async, para vistas async)."""
+    rows = [obj async for obj in _keyset_queryset(qs, fields, cursor)[:per_page + 1]]
+    return _keyset_result(rows, fields, per_page)
+
+
+def _campo(qs, name):
+    try:
+        return qs.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return qs.query.annotations[name].output_field
+
+
+def _typed_values(qs, fields: Sequence[KeysetField], values: Sequence[Any]) -> list:
+    """Convierte cada valor del cursor al tipo de su campo (o anotación) en `qs`."""
+    try:
+        return [None if v is None else _campo(qs, f.name).to_python(v) for f, v in zip(fields, values)]
+    except (ValidationError, ValueError, TypeError) as exc:
+        # Cursor bien formado pero con valores que no corresponden al orden
+        raise InvalidCursor("Cursor inválido") from exc
+
+
+def _keyset_queryset(qs, fields, cursor):
+    qs = qs.order_by(*keyset_ordering(fields))
+    if cursor:
+        values = _typed_values(qs, fields, decode_cursor(cursor, len(fields)))
+        qs = qs.filter(_after(fields, values))
+    return qs
+
+
+def _keyset_result(rows, fields, per_page) -> KeysetPage:
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = cursor_for(rows[-1], fields) if has_next else None
+    return KeysetPage(object_list=rows, next_cursor=next_cursor, has_next=has_next, fields=fields)
@@ -0,0 +1,293 @@
+# catalog/services/partner_catalog.py
+"""Copia local del catálogo de la API aliada.
+
+La vista /partner-products/ ya no llama a la API en cada visita: filtra y
+pagina sobre la tabla ProductoAliado. La copia se renueva con
+stale-while-revalidate:
+
+- fresca (menos de PARTNER_CATALOG_TTL segundos): se usa tal cual;
+- vencida: se sirve igual y se lanza una descarga en segundo plano;
+- inexistente (primer uso): se descarga en línea una sola vez.
+
+Solo un proceso descarga a la vez: el "turno" se toma con un UPDATE
+condicional sobre SincronizacionAliado.intentada, y un intento fallido no
+se repite antes de PARTNER_CATALOG_RETRY segundos. `manage.py
+sincronizar_aliados` hace la misma descarga desde cron o como worker.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from catalog.models import ProductoAliado, SincronizacionAliado
+from catalog.services.partner_client import CircuitOpenError, PartnerAPIError, get_partner_client
+from catalog.services.partner_schema import ESQUEMA_POR_DEFECTO, EsquemaAliado, esquema_desde_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTNER_API_URL = "http://13.218.169.6/api/productos/"
+DEFAULT_TTL = 5 * 60
+DEFAULT_RETRY = 60
+# Si se descartan más filas que esta fracción, el feed se rechaza entero
+MAX_FRACCION_INVALIDAS = 0.5
+
+CAMPOS_ACTUALIZABLES = ("nombre", "descripcion", "categoria", "tienda", "precio", "imagen", "link", "actualizado")
+
+
+def partner_api_url() -> str:
+    return getattr(settings, "PARTNER_API_URL", DEFAULT_PARTNER_API_URL)
+
+
+def _segundos(nombre, defecto) -> int:
+    return getattr(settings, nombre, defecto)
+
+
+class PartnerCatalogError(Exception):
+    """La API aliada no respondió o respondió algo que no se pudo leer."""
+
+
+def mensaje_de_error(exc: Exception) -> str:
+    """Mensaje para el usuario según el tipo de fallo."""
+    causa = exc
+    while causa.__cause__ is not None and not isinstance(causa, CircuitOpenError):
+        causa = causa.__cause__
+    if isinstance(causa, CircuitOpenError):
+        return "La API externa no está disponible en este momento. Por favor, intenta más tarde."
+    if isinstance(causa, requests.exceptions.Timeout):
+        return "La API externa tardó demasiado en responder. Por favor, intenta más tarde."
+    if isinstance(causa, requests.exceptions.ConnectionError):
+        return "No se pudo conectar con la API externa. Verifica tu conexión a internet."
+    if isinstance(causa, requests.exceptions.RequestException):
+        return f"Error al conectar con la API externa: {causa}"
+    if isinstance(causa, DatabaseError):
+        return f"No se pudo guardar el catálogo aliado: {causa}"
+    return f"Error al procesar los datos: {causa}"
+
+
+def esquema_aliado() -> EsquemaAliado:
+    """Esquema del feed: settings.PARTNER_API_SCHEMA (dict) o el por defecto."""
+    config = getattr(settings, "PARTNER_API_SCHEMA", None)
+    return esquema_desde_config(config) if config else ESQUEMA_POR_DEFECTO
+
+
+def _filas_del_feed(data, url: str) -> List[dict]:
+    if isinstance(data, dict) and 'results' in data:
+        productos = data['results']
+    elif isinstance(data, list):
+        productos = data
+    else:
+        # Clave renombrada, {} u otro formato: no vaciar la copia local por esto
+        raise PartnerCatalogError("La respuesta de la API aliada no tiene un formato reconocido")
+    if not isinstance(productos, list):
+        raise PartnerCatalogError("La respuesta de la API aliada no tiene un formato reconocido")
+
+    resultado = esquema_aliado().normalizar(productos, base_url=url)
+    if resultado.errores:
+        logger.warning(
+            "Catálogo aliado: %d filas con errores (%s)",
+            len({e.indice for e in resultado.errores}),
+            "; ".join(str(e) for e in resultado.errores[:5]),
+        )
+    descartadas = len(productos) - len(resultado.filas)
+    if productos and descartadas > len(productos) * MAX_FRACCION_INVALIDAS:
+        raise PartnerCatalogError(
+            f"{descartadas} de {len(productos)} filas del catálogo aliado no son válidas"
+        )
+    # Si un ID se repite, gana la última fila
+    return list({fila["id_externo"]: fila for fila in resultado.filas}.values())
+
+
+def descargar_catalogo(url: Optional[str] = None) -> List[dict]:
+    """Descarga y normaliza el catálogo completo. Lanza PartnerCatalogError."""
+    url = url or partner_api_url()
+    try:
+        # Si falla, la copia local es la "última respuesta buena"
+        data = get_partner_client().get_json(url).data
+    except PartnerAPIError as exc:
+        raise PartnerCatalogError(str(exc)) from exc
+    return _filas_del_feed(data, url)
+
+
+async def adescargar_catalogo(url: Optional[str] = None) -> List[dict]:
+    url = url or partner_api_url()
+    try:
+        data = (await get_partner_client().aget_json(url)).data
+    except PartnerAPIError as exc:
+        raise PartnerCatalogError(str(exc)) from exc
+    return _filas_del_feed(data, url)
+
+
+def _guardar_catalogo(filas: List[dict]) -> int:
+    if not filas and SincronizacionAliado.objects.filter(pk=1, total__gt=0).exists():
+        # Un feed vacío tras uno con productos es más probable un fallo que un catálogo vacío
+        raise PartnerCatalogError("La API aliada devolvió un catálogo vacío; se conserva la copia anterior")
+    ahora = timezone.now()
+    productos = [ProductoAliado(actualizado=ahora, **fila) for fila in filas]
+    with transaction.atomic():
+        ProductoAliado.objects.bulk_create(
+            productos,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["id_externo"],
+            update_fields=list(CAMPOS_ACTUALIZABLES),
+        )
+        # Todo lo que sigue en el feed quedó con actualizado=ahora
+        ProductoAliado.objects.filter(actualizado__lt=ahora).delete()
+        # Liberar el turno: solo los fallos esperan PARTNER_CATALOG_RETRY
+        SincronizacionAliado.objects.filter(pk=1).update(
+            completada=ahora, intentada=None, total=len(productos), error="",
+        )
+    return len(productos)
+
+
+def refrescar_catalogo_aliado(url: Optional[str] = None) -> int:
+    """
+    Descarga el catálogo y reemplaza la copia local en una transacción.
+    Devuelve la cantidad de productos; si la descarga falla o el feed no
+    sirve (formato desconocido, casi todas las filas inválidas, vacío cuando
+    antes había productos), guarda el mensaje en SincronizacionAliado.error,
+    deja la copia anterior y relanza. Un error de la base al guardar se
+    trata igual y se relanza como PartnerCatalogError.
+    """
+    SincronizacionAliado.actual()
+    try:
+        return _guardar_catalogo(descargar_catalogo(url))
+    except PartnerCatalogError as exc:
+        SincronizacionAliado.objects.filter(pk=1).update(error=mensaje_de_error(exc))
+        raise
+    except DatabaseError as exc:
+        mensaje = mensaje_de_error(exc)
+        SincronizacionAliado.objects.filter(pk=1).update(error=mensaje)
+        raise PartnerCatalogError(mensaje) from exc
+
+
+async def arefrescar_catalogo_aliado(url: Optional[str] = None) -> int:
+    """Versión async: la descarga no bloquea el event loop."""
+    await SincronizacionAliado.aactual()
+    try:
+        filas = await adescargar_catalogo(url)
+        # bulk_create + transacción: en un hilo
+        return await sync_to_async(_guardar_catalogo)(filas)
+    except PartnerCatalogError as exc:
+        await SincronizacionAliado.objects.filter(pk=1).aupdate(error=mensaje_de_error(exc))
+        raise
+    except DatabaseError as exc:
+        mensaje = mensaje_de_error(exc)
+        await SincronizacionAliado.objects.filter(pk=1).aupdate(error=mensaje)
+        raise PartnerCatalogError(mensaje) from exc
+
+
+def _turno_libre(ahora: datetime):
+    limite = ahora - timedelta(seconds=_segundos("PARTNER_CATALOG_RETRY", DEFAULT_RETRY))
+    return SincronizacionAliado.objects.filter(pk=1).filter(Q(intentada__isnull=True) | Q(intentada__lt=limite))
+
+
+def _tomar_turno(ahora: datetime) -> bool:
+    """True si este proceso queda a cargo de la próxima descarga."""
+    SincronizacionAliado.actual()
+    return bool(_turno_libre(ahora).update(intentada=ahora))
+
+
+async def _atomar_turno(ahora: datetime) -> bool:
+    await SincronizacionAliado.aactual()
+    return bool(await _turno_libre(ahora).aupdate(intentada=ahora))
+
+
+def _refrescar_en_hilo():
+    try:
+        refrescar_catalogo_aliado()
+    except PartnerCatalogError as exc:
+        logger.warning("No se pudo refrescar el catálogo aliado: %s", exc)
+    except Exception:
+        logger.exception("Error inesperado refrescando el catálogo aliado")
+    finally:
+        # El hilo abre sus propias conexiones: cerrarlas al terminar
+        connections.close_all()
+
+
+def _en_segundo_plano(funcion):
+    threading.Thread(target=funcion, name="partner-catalog-refresh", daemon=True).start()
+
+
+@dataclass
+class EstadoCatalogoAliado:
+    completada: Optional[datetime]
+    total: int = 0
+    fresco: bool = False
+    refrescando: bool = False
+    error: str = ""
+
+    @property
+    def disponible(self) -> bool:
+        return self.completada is not None
+
+
+def _vencida(estado: SincronizacionAliado, ahora: datetime) -> bool:
+    return ahora - estado.completada >= timedelta(seconds=_segundos("PARTNER_CATALOG_TTL", DEFAULT_TTL))
+
+
+def _resumen(estado: SincronizacionAliado, ahora: datetime, refrescando: bool) -> EstadoCatalogoAliado:
+    return EstadoCatalogoAliado(
+        completada=estado.completada,
+        total=estado.total,
+        fresco=estado.completada is not None and not _vencida(estado, ahora),
+        refrescando=refrescando,
+        error=estado.error,
+    )
+
+
+def obtener_catalogo_aliado() -> EstadoCatalogoAliado:
+    """
+    Estado de la copia local, renovándola si hace falta (ver docstring del
+    módulo). Nunca espera a la API salvo en el primer uso.
+    """
+    ahora = timezone.now()
+    estado = SincronizacionAliado.actual()
+    refrescando = False
+
+    if estado.completada is None:
+        if _tomar_turno(ahora):
+            try:
+                refrescar_catalogo_aliado()
+            except PartnerCatalogError:
+                pass
+            estado.refresh_from_db()
+        else:
+            # Otro proceso ya está descargando
+            refrescando = not estado.error
+    elif _vencida(estado, ahora):
+        if _tomar_turno(ahora):
+            _en_segundo_plano(_refrescar_en_hilo)
+            refrescando = True
+    return _resumen(estado, ahora, refrescando)
+
+
+async def aobtener_catalogo_aliado() -> EstadoCatalogoAliado:
+    """Versión async de obtener_catalogo_aliado (para vistas async)."""
+    ahora = timezone.now()
+    estado = await SincronizacionAliado.aactual()
+    refrescando = False
+
+    if estado.completada is None:
+        if await _atomar_turno(ahora):
+            try:
+                await arefrescar_catalogo_aliado()
+            except PartnerCatalogError:
+                pass
+            await estado.arefresh_from_db()
+        else:
+            refrescando = not estado.error
+    elif _vencida(estado, ahora):
+        if await _atomar_turno(ahora):
+            # Un hilo y no una tarea: sobrevive al event loop del request
+            _en_segundo_plano(_refrescar_en_hilo)
+            refrescando = True
+    return _resumen(estado, ahora, refrescando)
@@ -0,0 +1,380 @@
+# catalog/services/partner_client.py
+"""Cliente HTTP para la API aliada.
+
+- Una `requests.Session` compartida por proceso (keep-alive, pool de
+  conexiones) en vez de un `requests.get` suelto por llamada.
+- Reintentos acotados ante timeouts, errores de conexión, 429 y 5xx, con
+  espera exponencial con jitter completo.
+- Circuit breaker: tras PARTNER_CIRCUIT_THRESHOLD fallos seguidos deja de
+  llamar a la API durante PARTNER_CIRCUIT_RESET segundos y falla al
+  instante. Pasado ese tiempo deja pasar una llamada de prueba. Un 4xx no
+  cuenta como fallo: la API respondió (el error es del pedido). La última
+  respuesta buena no se guarda aquí: es la copia local de partner_catalog.
+- Contadores de latencia y errores en `client.stats`.
+- `aget_json` hace lo mismo sin bloquear el event loop (httpx) para las
+  vistas async; comparte circuito y contadores.
+  Usa un `httpx.AsyncClient` por event loop (sus conexiones no pueden
+  pasar de un loop a otro), creado en la primera llamada y cerrado en
+  `close()` o al apagarse su loop (asyncio.run y async_to_sync llaman a
+  `shutdown_asyncgens()` antes de cerrarlo).
+
+El estado (circuito, contadores) es por proceso.
+"""
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - sin httpx, aget_json usa un hilo
+    httpx = None
+
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class PartnerAPIError(Exception):
+    """La llamada a la API aliada falló (después de los reintentos)."""
+
+
+class CircuitOpenError(PartnerAPIError):
+    """El circuito está abierto: no se llamó a la API."""
+
+
+class _ClientError(requests.exceptions.HTTPError):
+    """4xx no reintentable: la API respondió, el error es del pedido."""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """True si se puede llamar; en semiabierto deja pasar una sola prueba."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+@dataclass
+class PartnerClientStats:
+    requests: int = 0          # intentos HTTP realizados
+    successes: int = 0
+    failures: int = 0          # llamadas que fallaron tras los reintentos
+    retries: int = 0
+    short_circuited: int = 0   # llamadas rechazadas con el circuito abierto
+    latency_total_ms: float = 0.0
+    latency_max_ms: float = 0.0
+    last_latency_ms: Optional[float] = None
+    last_error: str = ""
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_latency(self, ms: float):
+        with self._lock:
+            self.requests += 1
+            self.latency_total_ms += ms
+            self.latency_max_ms = max(self.latency_max_ms, ms)
+            self.last_latency_ms = ms
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "short_circuited": self.short_circuited,
+                "latency_avg_ms": round(self.latency_total_ms / self.requests, 1) if self.requests else None,
+                "latency_max_ms": round(self.latency_max_ms, 1),
+                "last_latency_ms": None if self.last_latency_ms is None else round(self.last_latency_ms, 1),
+                "last_error": self.last_error,
+            }
+
+
+@dataclass
+class PartnerResponse:
+    data: Any
+    fetched_at: float = 0.0      # time.time() de la respuesta
+
+
+class PartnerClient:
+    def __init__(self, timeout: float = 10, max_retries: int = 2, backoff: float = 0.5,
+                 backoff_max: float = 5.0, breaker: Optional[CircuitBreaker] = None,
+                 pool_size: int = 10, sleep: Callable[[float], None] = time.sleep,
+                 asleep: Callable[[float], Any] = asyncio.sleep):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = PartnerClientStats()
+        self._sleep = sleep
+        self._asleep = asleep
+        self.pool_size = pool_size
+        self._aclients: Dict[asyncio.AbstractEventLoop, "httpx.AsyncClient"] = {}
+        self._aclient_guards: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._aclients_lock = threading.Lock()
+
+        self.session = requests.Session()
+        # Los reintentos los hace get_json (con jitter y contadores), no urllib3
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/json"})
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # Jitter completo: uniforme entre 0 y el tope exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _fetch(self, url: str) -> Any:
+        last_exc = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats.incr("retries")
+                self._sleep(self._backoff_delay(attempt - 1))
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as exc:
+                self.stats.record_latency((time.perf_counter() - start) * 1000)
+                last_exc = exc
+                continue
+            self.stats.record_latency((time.perf_counter() - start) * 1000)
+            if response.status_code in RETRY_STATUS:
+                last_exc = requests.exceptions.HTTPError(
+                    f"{response.status_code} Server Error for url: {url}", response=response,
+                )
+                response.close()
+                continue
+            # Otros 4xx o JSON inválido: reintentar no cambia nada
+            if 400 <= response.status_code < 500:
+                response.close()
+                raise _ClientError(f"{response.status_code} Client Error for url: {url}", response=response)
+            response.raise_for_status()
+            return response.json()
+        raise last_exc
+
+    def _aclient(self) -> "httpx.AsyncClient":
+        loop = asyncio.get_running_loop()
+        with self._aclients_lock:
+            # Loops cerrados sin shutdown_asyncgens() (si no, el guardián ya
+            # cerró su cliente): no se puede esperar el aclose() en un loop
+            # cerrado; los sockets se cierran al recolectar el cliente.
+            for viejo in [l for l in self._aclients if l.is_closed()]:
+                del self._aclients[viejo]
+                self._aclient_guards.pop(viejo, None)
+            client = self._aclients.get(loop)
+            if client is None:
+                client = self._aclients[loop] = httpx.AsyncClient(
+                    timeout=self.timeout,
+                    headers=dict(self.session.headers),
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                )
+                guard = self._aclient_guards[loop] = self._close_on_shutdown(loop, client)
+                # Avanza hasta el yield sin esperar nada: desde el primer paso
+                # el loop lo registra y shutdown_asyncgens() lo cierra
+                try:
+                    guard.asend(None).send(None)
+                except StopIteration:
+                    pass
+            return client
+
+    async def _close_on_shutdown(self, loop, client):
+        """Generador guardián: al cerrarlo el loop, cierra `client` en ese loop."""
+        try:
+            yield
+        finally:
+            with self._aclients_lock:
+                if self._aclients.get(loop) is client:
+                    del self._aclients[loop]
+                    self._aclient_guards.pop(loop, None)
+            await client.aclose()
+
+    async def _afetch(self, url: str) -> Any:
+        # Igual que _fetch; los errores de httpx se traducen a los de requests
+        # para que el resto del código maneje un solo tipo de excepción.
+        client = self._aclient()
+        last_exc = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats.incr("retries")
+                await self._asleep(self._backoff_delay(attempt - 1))
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+            except httpx.TimeoutException as exc:
+                self.stats.record_latency((time.perf_counter() - start) * 1000)
+                last_exc = requests.exceptions.Timeout(str(exc))
+                continue
+            except httpx.TransportError as exc:
+                self.stats.record_latency((time.perf_counter() - start) * 1000)
+                last_exc = requests.exceptions.ConnectionError(str(exc))
+                continue
+            self.stats.record_latency((time.perf_counter() - start) * 1000)
+            if response.status_code in RETRY_STATUS:
+                last_exc = requests.exceptions.HTTPError(f"{response.status_code} Server Error for url: {url}")
+                continue
+            if 400 <= response.status_code < 500:
+                raise _ClientError(f"{response.status_code} Client Error for url: {url}")
+            if response.status_code >= 400:
+                raise requests.exceptions.HTTPError(f"{response.status_code} Server Error for url: {url}")
+            return response.json()
+        raise last_exc
+
+    def _short_circuit(self):
+        self.stats.incr("short_circuited")
+        return CircuitOpenError("Circuito abierto para la API aliada")
+
+    def _failed(self, exc):
+        if isinstance(exc, _ClientError):
+            # La API está en pie: no abre el circuito y cierra el semiabierto
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        self.stats.record_failure(str(exc))
+        error = PartnerAPIError(str(exc))
+        error.__cause__ = exc
+        return error
+
+    def _succeeded(self, data):
+        self.breaker.record_success()
+        self.stats.incr("successes")
+        return PartnerResponse(data=data, fetched_at=time.time())
+
+    def get_json(self, url: str) -> PartnerResponse:
+        """
+        GET `url` y devuelve el JSON. Lanza CircuitOpenError si el circuito
+        está abierto y PartnerAPIError si falla tras los reintentos.
+        """
+        if not self.breaker.allow_request():
+            raise self._short_circuit()
+        try:
+            data = self._fetch(url)
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            raise self._failed(exc)
+        except BaseException:
+            # Otro error (o una interrupción) también es un fallo: si no, la
+            # llamada de prueba del circuito semiabierto lo dejaría trabado
+            self.breaker.record_failure()
+            raise
+        return self._succeeded(data)
+
+    async def aget_json(self, url: str) -> PartnerResponse:
+        """Versión async de get_json (httpx); sin httpx corre get_json en un hilo."""
+        if httpx is None:
+            return await sync_to_async(self.get_json, thread_sensitive=False)(url)
+        if not self.breaker.allow_request():
+            raise self._short_circuit()
+        try:
+            data = await self._afetch(url)
+        except (requests.exceptions.RequestException, ValueError) as exc:
+            raise self._failed(exc)
+        except BaseException:
+            # Incluye CancelledError: la prueba del semiabierto no queda pendiente
+            self.breaker.record_failure()
+            raise
+        return self._succeeded(data)
+
+    def close(self):
+        self.session.close()
+        with self._aclients_lock:
+            aclients, self._aclients = self._aclients, {}
+            # Sin referencias, asyncio los cierra en su loop si sigue abierto (el
+            # segundo aclose() no hace nada) y los descarta si ya se cerró
+            self._aclient_guards = {}
+        for loop, client in aclients.items():
+            if loop.is_closed():
+                continue
+            if loop.is_running():
+                # Puede ser otro hilo (o este mismo, desde código sync del loop)
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            else:
+                loop.run_until_complete(client.aclose())
+
+
+_client: Optional[PartnerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_partner_client() -> PartnerClient:
+    """Cliente compartido del proceso, configurado desde settings."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PartnerClient(
+                timeout=getattr(settings, "PARTNER_API_TIMEOUT", 10),
+                max_retries=getattr(settings, "PARTNER_API_RETRIES", 2),
+                backoff=getattr(settings, "PARTNER_API_BACKOFF", 0.5),
+                backoff_max=getattr(settings, "PARTNER_API_BACKOFF_MAX", 5.0),
+                breaker=CircuitBreaker(
+                    failure_threshold=getattr(settings, "PARTNER_CIRCUIT_THRESHOLD", 5),
+                    reset_timeout=getattr(settings, "PARTNER_CIRCUIT_RESET", 30),
+                ),
+            )
+        return _client
+
+
+def reset_partner_client():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+@receiver(setting_changed)
+def _partner_settings_changed(setting, **kwargs):
+    if setting.startswith("PARTNER_"):
+        reset_partner_client()
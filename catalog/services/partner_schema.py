@@ -0,0 +1,316 @@
+# catalog/services/partner_schema.py
+"""Mapeo declarativo de los feeds aliados a los campos de ProductoAliado.
+
+Cada campo destino declara sus posibles nombres en el feed (en orden de
+preferencia), un tipo y un valor por defecto. Con las claves de la
+respuesta (una sola pasada) se decide qué nombre usa ese feed para cada campo
+(`nombreProducto` vs `nombre` vs `name`) y se arma un extractor con un
+lector por campo que hace un solo acceso por fila; solo si una fila no
+trae la clave detectada se vuelve a buscar entre las alternativas.
+
+Los errores de conversión se acumulan por fila en vez de cortar toda la
+descarga: si el campo es requerido la fila se descarta, si no se usa el
+valor por defecto. Lo mismo con los límites de la columna de
+ProductoAliado (`max_length`, `max_digits`), para que un valor fuera de
+rango no haga fallar el bulk_create de todo el feed: un texto largo se
+recorta (y se informa), una URL o un monto fuera de rango usan el defecto.
+Un aliado nuevo con otros nombres de campo se agrega con un dict de
+configuración (ver `esquema_desde_config`).
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from django.core.exceptions import FieldDoesNotExist
+
+from catalog.models import ProductoAliado
+
+_FALTA = object()
+CENTAVOS = Decimal("0.01")
+
+
+class ErrorConversion(ValueError):
+    pass
+
+
+# Cada tipo es una fábrica: recibe la URL del feed al compilar y devuelve
+# el conversor de un valor, con lo que dependa del feed ya resuelto.
+
+def _texto(base_url):
+    def convertir(valor):
+        return valor.strip() if type(valor) is str else str(valor).strip()
+    return convertir
+
+
+def _id(base_url):
+    def convertir(valor):
+        texto = valor.strip() if type(valor) is str else str(valor).strip()
+        if not texto:
+            raise ErrorConversion("vacío")
+        return texto
+    return convertir
+
+
+def _decimal(base_url):
+    def convertir(valor):
+        if type(valor) is bool:
+            raise ErrorConversion(f"no es un número: {valor!r}")
+        try:
+            # int/str directo; float por su repr para no arrastrar binario
+            numero = Decimal(repr(valor) if type(valor) is float else valor).quantize(CENTAVOS)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ErrorConversion(f"no es un número: {valor!r}") from None
+        if not numero.is_finite():
+            raise ErrorConversion(f"no es un número: {valor!r}")
+        return numero
+    return convertir
+
+
+def _url(base_url):
+    partes = urlsplit(base_url)
+    origen = f"{partes.scheme}://{partes.netloc}" if partes.netloc else ""
+
+    def convertir(valor):
+        texto = valor.strip() if type(valor) is str else str(valor).strip()
+        if not texto or texto.startswith(("http://", "https://")):
+            return texto
+        # Rutas relativas (/media/...) se resuelven contra el host del feed;
+        # el caso común "/ruta" no necesita urljoin
+        if origen and texto.startswith("/") and not texto.startswith("//"):
+            return origen + texto
+        return urljoin(base_url, texto)
+    return convertir
+
+
+CONVERSORES: Dict[str, Callable[[str], Callable[[Any], Any]]] = {
+    "texto": _texto,
+    "id": _id,
+    "decimal": _decimal,
+    "url": _url,
+}
+
+
+@dataclass(frozen=True)
+class CampoAliado:
+    destino: str
+    origenes: Tuple[str, ...]
+    tipo: str = "texto"
+    defecto: Any = ""
+    requerido: bool = False
+    max_length: Optional[int] = None   # textos, ids y URL
+    max_digits: Optional[int] = None   # montos (con dos decimales)
+
+    def buscar(self, fila: Mapping) -> Any:
+        """Primer origen presente en `fila` (camino lento, sin detección)."""
+        for origen in self.origenes:
+            valor = fila.get(origen, _FALTA)
+            if valor is not _FALTA:
+                return valor
+        return _FALTA
+
+
+@dataclass(frozen=True)
+class ErrorFila:
+    indice: int
+    campo: str
+    mensaje: str
+
+    def __str__(self):
+        return f"fila {self.indice}, {self.campo}: {self.mensaje}"
+
+
+@dataclass
+class ResultadoNormalizacion:
+    filas: List[dict] = field(default_factory=list)
+    errores: List[ErrorFila] = field(default_factory=list)
+
+
+def _lector(campo: CampoAliado, clave: Optional[str]) -> Callable[[Mapping], Any]:
+    """Lee el campo de una fila por la clave detectada; si falta, por las alternativas."""
+    if clave is None:
+        # Ninguna fila del feed trae este campo
+        return lambda fila: _FALTA
+    buscar = campo.buscar
+
+    def leer(fila):
+        valor = fila.get(clave, _FALTA)
+        return buscar(fila) if valor is _FALTA else valor
+    return leer
+
+
+class ValorRecortado(ErrorConversion):
+    """El valor pasó el límite de la columna; `valor` es la versión recortada."""
+
+    def __init__(self, mensaje, valor):
+        super().__init__(mensaje)
+        self.valor = valor
+
+
+def _con_limites(campo: CampoAliado, convertir: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Envuelve el conversor con los límites de la columna destino."""
+    if campo.max_digits is not None:
+        tope = Decimal(10) ** (campo.max_digits - 2)
+
+        def convertir_monto(valor):
+            numero = convertir(valor)
+            if abs(numero) >= tope:
+                raise ErrorConversion(f"más de {campo.max_digits} dígitos: {numero}")
+            return numero
+        return convertir_monto
+    if campo.max_length is not None:
+        largo, recortable = campo.max_length, campo.tipo == "texto"
+
+        def convertir_texto(valor):
+            texto = convertir(valor)
+            if len(texto) <= largo:
+                return texto
+            mensaje = f"más de {largo} caracteres"
+            if recortable:
+                raise ValorRecortado(mensaje, texto[:largo])
+            raise ErrorConversion(mensaje)  # una URL o un id recortados no sirven
+        return convertir_texto
+    return convertir
+
+
+def _armar_extraer(plan):
+    """
+    Arma `extraer` para un plan concreto: por campo, (destino, lector,
+    conversor, requerido, defecto) ya resueltos, sin búsquedas por fila.
+    """
+    pasos = tuple(
+        (campo.destino, _lector(campo, clave), _con_limites(campo, convertir), campo.requerido, campo.defecto)
+        for campo, clave, convertir in plan
+    )
+
+    def extraer(fila, indice, errores):
+        salida = {}
+        for destino, leer, convertir, requerido, defecto in pasos:
+            valor = leer(fila)
+            if valor is _FALTA or valor is None or valor == "":
+                if requerido:
+                    errores.append(ErrorFila(indice, destino, "falta el campo"))
+                    return None
+                salida[destino] = defecto
+                continue
+            try:
+                salida[destino] = convertir(valor)
+            except ValorRecortado as exc:
+                errores.append(ErrorFila(indice, destino, str(exc)))
+                if requerido:
+                    return None
+                salida[destino] = exc.valor
+            except ErrorConversion as exc:
+                errores.append(ErrorFila(indice, destino, str(exc)))
+                if requerido:
+                    return None
+                salida[destino] = defecto
+        return salida
+    return extraer
+
+
+class Extractor:
+    """Plan ya resuelto para un feed concreto: (campo, clave detectada, conversor)."""
+
+    def __init__(self, esquema: "EsquemaAliado", plan: Sequence[Tuple[CampoAliado, Optional[str], Callable]]):
+        self.esquema = esquema
+        self.plan = tuple(plan)
+        self._extraer = _armar_extraer(self.plan)
+
+    @property
+    def claves(self) -> Dict[str, Optional[str]]:
+        """Campo destino -> clave del feed elegida (None si no apareció)."""
+        return {campo.destino: clave for campo, clave, _ in self.plan}
+
+    def extraer(self, fila: Mapping, indice: int, errores: List[ErrorFila]) -> Optional[dict]:
+        """
+        Convierte una fila. Los errores van a `errores`: en un campo requerido
+        descartan la fila (devuelve None); en los demás se usa el defecto.
+        """
+        return self._extraer(fila, indice, errores)
+
+    def normalizar(self, filas: Iterable[Any]) -> ResultadoNormalizacion:
+        resultado = ResultadoNormalizacion()
+        extraer, errores = self._extraer, resultado.errores
+        for indice, fila in enumerate(filas):
+            if not isinstance(fila, dict):
+                resultado.errores.append(ErrorFila(indice, "*", "no es un objeto"))
+                continue
+            salida = extraer(fila, indice, errores)
+            if salida is not None:
+                resultado.filas.append(salida)
+        return resultado
+
+
+@dataclass(frozen=True)
+class EsquemaAliado:
+    campos: Tuple[CampoAliado, ...]
+
+    def compilar(self, claves: Iterable[str], base_url: str = "") -> Extractor:
+        """Elige para cada campo el primer origen presente en `claves` (las del feed)."""
+        claves = set(claves)
+        plan = []
+        for campo in self.campos:
+            clave = next((o for o in campo.origenes if o in claves), None)
+            plan.append((campo, clave, CONVERSORES[campo.tipo](base_url)))
+        return Extractor(self, plan)
+
+    def normalizar(self, filas: Sequence[Any], base_url: str = "") -> ResultadoNormalizacion:
+        claves = set().union(*(f for f in filas if isinstance(f, dict)))
+        return self.compilar(claves, base_url).normalizar(filas)
+
+
+def _limites_del_modelo(destino: str) -> Dict[str, Optional[int]]:
+    """max_length / max_digits de la columna de ProductoAliado con ese nombre."""
+    try:
+        campo = ProductoAliado._meta.get_field(destino)
+    except FieldDoesNotExist:
+        return {}
+    return {
+        "max_length": getattr(campo, "max_length", None),
+        "max_digits": getattr(campo, "max_digits", None),
+    }
+
+
+def esquema_desde_config(config: Mapping[str, Mapping[str, Any]]) -> EsquemaAliado:
+    """
+    Arma un esquema desde un dict del estilo::
+
+        {"nombre": {"origenes": ["title", "name"], "defecto": "Sin nombre"},
+         "precio": {"origenes": ["price"], "tipo": "decimal"}}
+
+    Los límites (`max_length`, `max_digits`) se toman de la columna de
+    ProductoAliado con el mismo nombre, salvo que el dict los indique.
+    """
+    campos = []
+    for destino, opciones in config.items():
+        tipo = opciones.get("tipo", "texto")
+        if tipo not in CONVERSORES:
+            raise ValueError(f"Tipo desconocido para {destino}: {tipo}")
+        limites = _limites_del_modelo(destino)
+        campos.append(CampoAliado(
+            destino=destino,
+            origenes=tuple(opciones["origenes"]),
+            tipo=tipo,
+            defecto=opciones.get("defecto", ""),
+            requerido=opciones.get("requerido", False),
+            max_length=opciones.get("max_length", limites.get("max_length")),
+            max_digits=opciones.get("max_digits", limites.get("max_digits")),
+        ))
+    return EsquemaAliado(tuple(campos))
+
+
+# Nombres que usa (o usó) la API aliada, y los genéricos en español/inglés
+ESQUEMA_POR_DEFECTO = esquema_desde_config({
+    "id_externo": {"origenes": ["idProducto", "id"], "tipo": "id", "requerido": True},
+    "nombre": {"origenes": ["nombreProducto", "nombre", "name"], "defecto": "Sin nombre"},
+    "descripcion": {"origenes": ["descripcion", "description"]},
+    "categoria": {"origenes": ["tipoProducto", "categoria", "category"]},
+    "tienda": {"origenes": ["marcaProducto", "tienda", "store"]},
+    "precio": {
+        "origenes": ["precioDeProducto", "precio", "price", "precio_base", "precio_actual"],
+        "tipo": "decimal", "defecto": Decimal("0.00"),
+    },
+    "imagen": {"origenes": ["imagenProducto", "imagen", "image", "imagen_url"], "tipo": "url"},
+    "link": {"origenes": ["link", "url"], "tipo": "url"},
+})
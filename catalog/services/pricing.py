@@ -0,0 +1,196 @@
+# catalog/services/pricing.py
+"""Cálculo de precios vigentes por lotes.
+
+`calcular_precio_oferta` (models.py) resuelve un producto a la vez con
+Decimal y quantize. Para recalcular miles de productos (cargas masivas,
+`manage.py recalcular_precios`) aquí se hace lo mismo sobre arreglos de
+NumPy en centavos enteros, sin pasar por float:
+
+    vigente = precio_fijo                              si la oferta lo define
+            = precio * (10000 - descuento_pb) / 10000  redondeado a centavos
+
+con `descuento_pb` el porcentaje en centésimas (25.50% -> 2550). El
+redondeo es al par más cercano (ROUND_HALF_EVEN), el del contexto Decimal
+por defecto que usa quantize(Decimal('0.01')). Los montos deben tener a lo
+sumo dos decimales, como los DecimalField del modelo.
+
+Sin NumPy se usa calcular_precio_oferta fila por fila (mismo resultado).
+La columna `precio_vigente` que usan el listado, el filtro por rango de
+precio, la API y las exportaciones se mantiene al escribir ofertas
+(señales) o con `recalcular_precios_vigentes` tras cargas masivas.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from django.db.models import Count, F, Max, Min, Q, Value
+from django.db.models.functions import Coalesce
+
+from catalog.models import CatalogoVersion, Producto, calcular_precio_oferta, centesimas
+from catalog.services.cache_tiers import familia
+
+try:
+    import numpy as np
+    NUMPY_OK = True
+except Exception:
+    NUMPY_OK = False
+
+DEFAULT_BATCH_SIZE = 2000
+PRICING_CACHE_TIMEOUT = 60 * 60
+
+_cache = familia("pricing", shared_timeout=PRICING_CACHE_TIMEOUT)
+
+
+def _enteros(valores: Sequence[Optional[Decimal]]):
+    """Decimal con dos decimales -> (int64 en centésimas, máscara de nulos)."""
+    nulos = np.fromiter((v is None for v in valores), dtype=bool, count=len(valores))
+    enteros = np.fromiter(
+        (0 if v is None else int(v.scaleb(2)) for v in valores), dtype=np.int64, count=len(valores),
+    )
+    return enteros, nulos
+
+
+def precios_vigentes_centavos(precio, descuento_pb, precio_fijo, sin_fijo):
+    """
+    Núcleo vectorizado: arreglos int64 de precio base (centavos), descuento
+    (centésimas de punto porcentual) y precio fijo (centavos), más la máscara
+    de filas sin precio fijo. Devuelve el precio vigente en centavos.
+    """
+    # precio <= 10^10 centavos y factor <= 10^4: el producto entra en int64
+    numerador = precio * (10000 - descuento_pb)
+    cociente, resto = np.divmod(numerador, 10000)
+    # Mitad exacta: sube solo si el cociente es impar (al par)
+    sube = (resto > 5000) | ((resto == 5000) & (cociente % 2 == 1))
+    con_descuento = cociente + sube
+    return np.where(sin_fijo, con_descuento, precio_fijo)
+
+
+def precios_vigentes(
+    precios: Sequence[Decimal],
+    descuentos: Sequence[Optional[Decimal]],
+    precios_fijos: Sequence[Optional[Decimal]],
+) -> List[Decimal]:
+    """
+    Precio vigente de cada fila, igual que calcular_precio_oferta(precio,
+    descuento, precio_fijo). Sin oferta: descuento y precio fijo en None.
+    """
+    if not NUMPY_OK:
+        return [calcular_precio_oferta(p, d, f) for p, d, f in zip(precios, descuentos, precios_fijos)]
+    if not precios:
+        return []
+    precio, _ = _enteros(precios)
+    descuento_pb, _ = _enteros(descuentos)  # None -> 0, como en calcular_precio_oferta
+    precio_fijo, sin_fijo = _enteros(precios_fijos)
+    centavos = precios_vigentes_centavos(precio, descuento_pb, precio_fijo, sin_fijo)
+    return [Decimal(int(c)).scaleb(-2) for c in centavos.tolist()]
+
+
+def recalcular_precios_vigentes(qs=None, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Recalcula `precio_vigente` de `qs` (por defecto todo el catálogo) a partir
+    de la oferta activa de cada producto, por lotes, y guarda solo los que
+    cambiaron. Devuelve cuántos actualizó.
+
+    La base entrega los montos ya en centésimas (enteros), así que cada lote
+    pasa a NumPy sin convertir Decimal por fila; solo se arman Decimal para
+    los productos que cambian.
+    """
+    qs = Producto.objects.all() if qs is None else qs
+    if not NUMPY_OK:
+        return _recalcular_fila_por_fila(qs, batch_size)
+    filas = (
+        qs.with_pricing()
+        .annotate(
+            c_precio=centesimas(F("precio")),
+            c_vigente=Coalesce(centesimas(F("precio_vigente")), Value(-1)),
+            c_descuento=Coalesce(centesimas(F("db_oferta_descuento")), Value(0)),
+            c_fijo=Coalesce(centesimas(F("db_oferta_precio_fijo")), Value(-1)),
+        )
+        .order_by("pk")
+        .values_list("pk", "c_precio", "c_vigente", "c_descuento", "c_fijo")
+        .iterator(chunk_size=batch_size)
+    )
+    actualizados = 0
+
+    def guardar(lote):
+        nonlocal actualizados
+        pk, precio, vigente, descuento_pb, precio_fijo = np.array(lote, dtype=np.int64).T
+        nuevo = precios_vigentes_centavos(precio, descuento_pb, precio_fijo, precio_fijo < 0)
+        cambia = nuevo != vigente
+        cambiados = [
+            Producto(pk=p, precio_vigente=Decimal(c).scaleb(-2))
+            for p, c in zip(pk[cambia].tolist(), nuevo[cambia].tolist())
+        ]
+        if cambiados:
+            Producto.objects.bulk_update(cambiados, ["precio_vigente"])
+            actualizados += len(cambiados)
+
+    for lote in _lotes(filas, batch_size):
+        guardar(lote)
+
+    if actualizados:
+        # bulk_update no dispara señales
+        CatalogoVersion.incrementar()
+    return actualizados
+
+
+def _recalcular_fila_por_fila(qs, batch_size: int) -> int:
+    actualizados = 0
+    for lote in _lotes(qs.with_pricing().order_by("pk").iterator(chunk_size=batch_size), batch_size):
+        cambiados = []
+        for producto in lote:
+            vigente = producto.obtener_precio_actual()
+            if producto.precio_vigente != vigente:
+                producto.precio_vigente = vigente
+                cambiados.append(producto)
+        if cambiados:
+            Producto.objects.bulk_update(cambiados, ["precio_vigente"])
+            actualizados += len(cambiados)
+    if actualizados:
+        CatalogoVersion.incrementar()
+    return actualizados
+
+
+def _lotes(filas: Iterable, size: int) -> Iterator[list]:
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+@dataclass(frozen=True)
+class RangoPrecios:
+    productos: int
+    con_oferta: int        # precio vigente menor que el base
+    minimo: Optional[Decimal]
+    maximo: Optional[Decimal]
+
+
+def _construir_resumen() -> Dict[str, RangoPrecios]:
+    rows = (
+        Producto.objects.filter(disponible=True)
+        .exclude(categoria="")
+        .values("categoria")
+        .annotate(
+            productos=Count("id"),
+            con_oferta=Count("id", filter=Q(precio_vigente__lt=F("precio"))),
+            minimo=Min("precio_vigente"),
+            maximo=Max("precio_vigente"),
+        )
+        .order_by()
+    )
+    return {
+        row["categoria"]: RangoPrecios(row["productos"], row["con_oferta"], row["minimo"], row["maximo"])
+        for row in rows
+    }
+
+
+def resumen_precios(version: Optional[CatalogoVersion] = None) -> Dict[str, RangoPrecios]:
+    """Precio vigente mínimo/máximo y productos en oferta por categoría, desde cache."""
+    if version is None:
+        version = CatalogoVersion.actual()
+    return _cache.get_or_set(version.token, _construir_resumen)
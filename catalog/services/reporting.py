@@ -1,7 +1,23 @@
 # catalog/services/reporting.py
-from dataclasses import dataclass
-from typing import Iterable, List, Protocol
-import io, csv
+"""Renderers de reportes (CSV, PDF, Excel).
+
+Interfaz incremental: `begin(title, columns)` escribe el encabezado,
+`write_rows(rows)` agrega un lote de filas (dicts) y `finish()` devuelve el
+archivo terminado (file-like binario en la posición 0). El archivo es un
+SpooledTemporaryFile: queda en memoria mientras es chico y pasa a disco al
+crecer, así que exportar todo el catálogo no arma el resultado en memoria.
+`render()` sigue disponible para reportes chicos y devuelve bytes.
+
+CSVRenderer además puede generar el archivo por partes (`stream`) para
+enviarlo en una StreamingHttpResponse. ParallelPDFRenderer reparte las
+páginas en bloques que se dibujan en un pool de procesos y se unen con pypdf.
+"""
+import abc
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Type
+import io, csv, multiprocessing, os, tempfile, threading
+from concurrent.futures import Executor, ProcessPoolExecutor
 
 try:
     from reportlab.lib.pagesizes import LETTER
@@ -10,6 +26,12 @@ try:
 except Exception:
     REPORTLAB_OK = False
 
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_OK = True
+except Exception:
+    PYPDF_OK = False
+
 try:
     import openpyxl
     from openpyxl.utils import get_column_letter
@@ -17,101 +39,340 @@ try:
 except Exception:
     OPENPYXL_OK = False
 
+# A partir de este tamaño el archivo temporal pasa de memoria a disco
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class ReportUnavailable(RuntimeError):
+    """Falta la librería que necesita el formato (reportlab, openpyxl)."""
+
 
 @dataclass
 class ReportColumn:
     header: str
     accessor: str  # clave en cada fila de datos
+    fmt: Optional[Callable[[Any], str]] = None  # valor -> texto (CSV/PDF)
+    number_format: Optional[str] = None         # formato de celda en Excel
+    width: float = 150                          # ancho en puntos (PDF)
+    align: str = "left"                         # "left" | "right" (PDF)
+
+    def text(self, row: dict) -> str:
+        value = row.get(self.accessor, "")
+        if self.fmt is not None:
+            return self.fmt(value)
+        return "" if value is None else str(value)
 
 
 class ReportRenderer(Protocol):
+    content_type: str
+    extension: str
+
+    def begin(self, title: str, columns: List[ReportColumn]) -> None: ...
+    def write_rows(self, rows: Iterable[dict]) -> None: ...
+    def finish(self) -> BinaryIO: ...
     def render(self, title: str, columns: List[ReportColumn], rows: Iterable[dict]) -> bytes: ...
 
 
-class CSVRenderer:
-    content_type = "text/csv"
-    extension = "csv"
+def _spool() -> BinaryIO:
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+
+
+class BaseRenderer(abc.ABC):
+    """Base de los renderers: las subclases implementan begin, write_rows y finish."""
+    content_type = "application/octet-stream"
+    extension = "bin"
+
+    def __init__(self):
+        self.rows_written = 0
+
+    @abc.abstractmethod
+    def begin(self, title, columns) -> None: ...
+
+    @abc.abstractmethod
+    def write_rows(self, rows) -> None: ...
+
+    @abc.abstractmethod
+    def finish(self) -> BinaryIO: ...
 
     def render(self, title, columns, rows) -> bytes:
-        buf = io.StringIO(newline="")
-        writer = csv.writer(buf)
-        writer.writerow([c.header for c in columns])
+        self.begin(title, columns)
+        self.write_rows(rows)
+        with self.finish() as out:
+            return out.read()
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    content_type = "text/csv; charset=utf-8"
+    extension = "csv"
+
+    def _lines(self, columns, rows) -> Iterator[str]:
+        writer = csv.writer(_Echo())
         for r in rows:
-            writer.writerow([r.get(c.accessor, "") for c in columns])
-        return buf.getvalue().encode("utf-8")
+            self.rows_written += 1
+            yield writer.writerow([c.text(r) for c in columns])
+
+    def begin(self, title, columns):
+        self._columns = columns
+        self._out = _spool()
+        self._text = io.TextIOWrapper(self._out, encoding="utf-8", newline="", write_through=True)
+        self._text.write(csv.writer(_Echo()).writerow([c.header for c in columns]))
 
+    def write_rows(self, rows):
+        self._text.writelines(self._lines(self._columns, rows))
 
-class PDFRenderer:
+    def finish(self):
+        # Soltar el wrapper sin cerrar el archivo de abajo
+        self._text.detach()
+        self._out.seek(0)
+        return self._out
+
+    def stream(self, title, columns, batches: Iterable[Iterable[dict]]) -> Iterator[str]:
+        """El CSV por partes: el encabezado y luego un texto por lote (memoria constante)."""
+        yield csv.writer(_Echo()).writerow([c.header for c in columns])
+        for batch in batches:
+            yield "".join(self._lines(columns, batch))
+
+
+class PDFRenderer(BaseRenderer):
     content_type = "application/pdf"
     extension = "pdf"
 
-    def render(self, title, columns, rows) -> bytes:
+    MARGIN = 40
+    LINE_HEIGHT = 14
+    FONT_SIZE = 10
+    BOTTOM = 60
+    TITLE_TOP = 80  # primera fila de la página con título
+    PAGE_TOP = 50   # primera fila de las demás páginas
+
+    def _max_chars(self, col):
+        # Helvetica 10pt: ~5pt por carácter en promedio
+        return max(4, int(col.width / (self.FONT_SIZE * 0.5)) - 1)
+
+    @classmethod
+    def rows_per_page(cls, with_title: bool) -> int:
+        """Filas que entran en una página (la del título tiene menos)."""
+        _width, height = LETTER
+        y = height - (cls.TITLE_TOP if with_title else cls.PAGE_TOP) - cls.LINE_HEIGHT
+        return int((y - cls.BOTTOM) // cls.LINE_HEIGHT) + 1
+
+    def _draw_header(self):
+        c, x = self._canvas, self.MARGIN
+        c.setFont("Helvetica-Bold", self.FONT_SIZE)
+        for col in self._columns:
+            self._draw(col, x, col.header)
+            x += col.width
+        c.setFont("Helvetica", self.FONT_SIZE)
+        self._y -= self.LINE_HEIGHT
+
+    def _draw(self, col, x, txt):
+        txt = txt[:self._max_chars(col)]
+        if col.align == "right":
+            self._canvas.drawRightString(x + col.width - 6, self._y, txt)
+        else:
+            self._canvas.drawString(x, self._y, txt)
+
+    def begin(self, title, columns):
+        """Con `title=None` no hay título: la primera página es como las demás."""
+        if not REPORTLAB_OK:
+            raise ReportUnavailable("Para exportar a PDF instala reportlab: pip install reportlab")
+        self._columns = columns
+        self._out = _spool()
+        self._canvas = canvas.Canvas(self._out, pagesize=LETTER)
+        _width, self._height = LETTER
+
+        if title is None:
+            self._y = self._height - self.PAGE_TOP
+        else:
+            self._canvas.setFont("Helvetica-Bold", 14)
+            self._canvas.drawString(self.MARGIN, self._height - 50, title)
+            self._y = self._height - self.TITLE_TOP
+        self._draw_header()
+
+    def write_text_rows(self, rows: Iterable[Sequence[str]]):
+        """Filas ya convertidas a texto, una celda por columna."""
+        for texts in rows:
+            if self._y < self.BOTTOM:  # salto de página, con encabezados otra vez
+                self._canvas.showPage()
+                self._y = self._height - self.PAGE_TOP
+                self._draw_header()
+            x = self.MARGIN
+            for col, txt in zip(self._columns, texts):
+                self._draw(col, x, txt)
+                x += col.width
+            self._y -= self.LINE_HEIGHT
+            self.rows_written += 1
+
+    def write_rows(self, rows):
+        columns = self._columns
+        self.write_text_rows([c.text(r) for c in columns] for r in rows)
+
+    def finish(self):
+        self._canvas.showPage()
+        self._canvas.save()
+        self._out.seek(0)
+        return self._out
+
+
+def _render_pdf_chunk(title: Optional[str], columns: List[ReportColumn], rows: List[tuple]) -> bytes:
+    """Dibuja un bloque de páginas (corre en otro proceso)."""
+    renderer = PDFRenderer()
+    renderer.begin(title, columns)
+    renderer.write_text_rows(rows)
+    with renderer.finish() as out:
+        return out.read()
+
+
+class ParallelPDFRenderer(PDFRenderer):
+    """
+    Mismo PDF que PDFRenderer, dibujado por bloques de `pages_per_chunk`
+    páginas en `executor` (un ProcessPoolExecutor: ReportLab es Python puro
+    y no suelta el GIL). Las filas se pasan a texto en este proceso, así que
+    los `fmt` de las columnas no necesitan ser serializables. Como mucho
+    hay `max_pending` bloques en vuelo, para acotar la memoria.
+    """
+
+    def __init__(self, executor: Executor, pages_per_chunk: int = 20, max_pending: int = 8):
+        super().__init__()
+        self._executor = executor
+        self.pages_per_chunk = max(1, pages_per_chunk)
+        self.max_pending = max(1, max_pending)
+
+    def begin(self, title, columns):
         if not REPORTLAB_OK:
-            raise RuntimeError("ReportLab no está instalado para PDF.")
-        buf = io.BytesIO()
-        c = canvas.Canvas(buf, pagesize=LETTER)
-        width, height = LETTER
-
-        y = height - 36
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(36, y, title)
-        y -= 24
-
-        c.setFont("Helvetica-Bold", 10)
-        x = 36
-        for col in columns:
-            c.drawString(x, y, col.header)
-            x += 150
-        y -= 18
-
-        c.setFont("Helvetica", 10)
+            raise ReportUnavailable("Para exportar a PDF instala reportlab: pip install reportlab")
+        if not PYPDF_OK:
+            raise ReportUnavailable("Para unir el PDF en paralelo instala pypdf: pip install pypdf")
+        self._title = title
+        self._columns = columns
+        # Sin fmt: lo que viaja al otro proceso tiene que poder serializarse
+        self._plain_columns = [replace(c, fmt=None) for c in columns]
+        self._buffer: List[tuple] = []
+        self._pending = deque()
+        self._writer = PdfWriter()
+        self._chunks = 0
+
+    def _chunk_rows(self) -> int:
+        per_page = self.rows_per_page(False)
+        if self._chunks == 0:
+            return self.rows_per_page(True) + (self.pages_per_chunk - 1) * per_page
+        return self.pages_per_chunk * per_page
+
+    def _submit(self):
+        title = self._title if self._chunks == 0 else None
+        self._pending.append(self._executor.submit(_render_pdf_chunk, title, self._plain_columns, self._buffer))
+        self._buffer = []
+        self._chunks += 1
+        while len(self._pending) > self.max_pending:
+            self._collect()
+
+    def _collect(self):
+        # En orden: el bloque más viejo primero
+        self._writer.append(PdfReader(io.BytesIO(self._pending.popleft().result())))
+
+    def write_rows(self, rows):
+        columns = self._columns
         for r in rows:
-            x = 36
-            if y < 36:
-                c.showPage()
-                y = height - 36
-            for col in columns:
-                txt = str(r.get(col.accessor, ""))
-                c.drawString(x, y, txt[:25])
-                x += 150
-            y -= 16
-
-        c.showPage()
-        c.save()
-        return buf.getvalue()
-
-
-class ExcelRenderer:
+            self._buffer.append(tuple(c.text(r) for c in columns))
+            self.rows_written += 1
+            if len(self._buffer) >= self._chunk_rows():
+                self._submit()
+
+    def finish(self):
+        if self._buffer or self._chunks == 0:
+            self._submit()
+        while self._pending:
+            self._collect()
+        out = _spool()
+        self._writer.write(out)
+        out.seek(0)
+        return out
+
+
+_pdf_executor: Optional[ProcessPoolExecutor] = None
+_pdf_executor_lock = threading.Lock()
+
+
+def get_pdf_executor(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido para ParallelPDFRenderer. Usa "spawn": se
+    crea desde hilos del servidor y de las exportaciones, donde fork no es
+    seguro. Este módulo no importa Django, así que los hijos arrancan rápido.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            _pdf_executor = ProcessPoolExecutor(
+                max_workers=processes or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_executor
+
+
+class ExcelRenderer(BaseRenderer):
     content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     extension = "xlsx"
 
-    def render(self, title, columns, rows) -> bytes:
+    def begin(self, title, columns):
         if not OPENPYXL_OK:
-            raise RuntimeError("openpyxl no está instalado para Excel.")
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Productos"
+            raise ReportUnavailable("openpyxl no está instalado para Excel.")
+        from openpyxl.cell import WriteOnlyCell
 
-        ws.append([c.header for c in columns])
-        for r in rows:
-            ws.append([r.get(c.accessor, "") for c in columns])
+        # write_only: las filas se vuelcan a un temporal, no quedan en memoria
+        self._wb = openpyxl.Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("Productos")
+        self._columns = columns
+        self._cell = WriteOnlyCell
 
-        # ancho de columnas
+        # ancho de columnas (antes de la primera fila)
         for i, col in enumerate(columns, start=1):
-            ws.column_dimensions[get_column_letter(i)].width = max(12, len(col.header) + 2)
+            self._ws.column_dimensions[get_column_letter(i)].width = max(12, len(col.header) + 2)
+        self._ws.append([c.header for c in columns])
 
-        buf = io.BytesIO()
-        wb.save(buf)
-        return buf.getvalue()
+    def _row(self, r):
+        cells = []
+        for col in self._columns:
+            value = r.get(col.accessor)
+            if value is None:
+                value = ""
+            if col.number_format and value != "":
+                cell = self._cell(self._ws, value=value)
+                cell.number_format = col.number_format
+                cells.append(cell)
+            else:
+                cells.append(value)
+        return cells
+
+    def write_rows(self, rows):
+        for r in rows:
+            self._ws.append(self._row(r))
+            self.rows_written += 1
+
+    def finish(self):
+        out = _spool()
+        self._wb.save(out)
+        out.seek(0)
+        return out
 
 
 class DefaultReportFactory:
-    @staticmethod
-    def for_format(fmt: str) -> ReportRenderer:
-        fmt = (fmt or "").lower()
-        if fmt == "pdf":
-            return PDFRenderer()
-        if fmt in ("xlsx", "excel"):
-            return ExcelRenderer()
+    FORMATS: Dict[str, Type[BaseRenderer]] = {
+        "pdf": PDFRenderer,
+        "xlsx": ExcelRenderer,
+        "excel": ExcelRenderer,
+        "csv": CSVRenderer,
+    }
+
+    @classmethod
+    def supports(cls, fmt: str) -> bool:
+        return (fmt or "").lower() in cls.FORMATS
+
+    @classmethod
+    def for_format(cls, fmt: str) -> ReportRenderer:
         # fallback
-        return CSVRenderer()
+        return cls.FORMATS.get((fmt or "").lower(), CSVRenderer)()
@@ -0,0 +1,196 @@
+# catalog/services/search.py
+"""Búsqueda de texto sobre Producto para el parámetro `q`.
+
+Backends según la base de datos:
+- SQLite: tabla virtual FTS5 `catalog_producto_fts` (creada en la migración
+  0009 y mantenida por triggers), con tokenizer unicode61 que ignora
+  mayúsculas y tildes. Ranking con bm25().
+- PostgreSQL: columna `search_vector` (tsvector generado y guardado, con
+  índice GIN; migración 0012) con la configuración "simple" y unaccent.
+  No está en el modelo: la mantiene la base y solo la leen estas consultas.
+- Otros (o SQLite sin FTS5): el LIKE '%q%' de siempre.
+
+Cada término se busca como prefijo ("lap" encuentra "Laptop") y todos los
+términos deben aparecer.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List, Sequence
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "catalog_producto_fts"
+# Columnas indexadas; el buscador público solo usa nombre y descripción
+FTS_COLUMNS = ("nombre", "descripcion", "categoria", "tienda")
+DEFAULT_SEARCH_FIELDS = ("nombre", "descripcion")
+# Peso de cada columna en bm25(), en el orden de FTS_COLUMNS
+FTS_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+_FTS_COLS = ", ".join(FTS_COLUMNS)
+_NEW = ", ".join(["new.id"] + [f"new.{c}" for c in FTS_COLUMNS])
+_OLD = ", ".join(["old.id"] + [f"old.{c}" for c in FTS_COLUMNS])
+
+# Índice de contenido externo: el texto vive en catalog_producto
+SQLITE_FTS_TABLE_SQL = f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    {_FTS_COLS},
+    content='catalog_producto', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)"""
+# Los triggers se pierden si una migración reconstruye catalog_producto
+# (AlterField en SQLite); `manage.py reconstruir_busqueda` los vuelve a crear.
+SQLITE_FTS_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON catalog_producto BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLS}) VALUES ({_NEW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON catalog_producto BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLS}) VALUES ('delete', {_OLD});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_FTS_COLS} ON catalog_producto BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLS}) VALUES ('delete', {_OLD});
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLS}) VALUES ({_NEW});
+    END""",
+]
+SQLITE_FTS_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def search_terms(q: str) -> List[str]:
+    """Palabras de la búsqueda, en minúsculas y sin tildes."""
+    sin_tildes = "".join(
+        c for c in unicodedata.normalize("NFKD", q or "") if not unicodedata.combining(c)
+    )
+    return [t.lower() for t in _TERM_RE.findall(sin_tildes)]
+
+
+class LikeSearchBackend:
+    """LIKE '%q%' sobre cada campo; sin ranking."""
+    name = "like"
+
+    def filter(self, qs, q, fields=DEFAULT_SEARCH_FIELDS):
+        cond = Q()
+        for f in fields:
+            cond |= Q(**{f"{f}__icontains": q})
+        return qs.filter(cond)
+
+    def annotate_rank(self, qs, q, fields=DEFAULT_SEARCH_FIELDS):
+        return self.filter(qs, q, fields).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class SQLiteFTSBackend(LikeSearchBackend):
+    name = "sqlite_fts5"
+
+    @staticmethod
+    def match_expression(terms: Sequence[str], fields=DEFAULT_SEARCH_FIELDS) -> str:
+        # Cada término entre comillas (sin sintaxis FTS del usuario) y como prefijo
+        query = " AND ".join(f'"{t}"*' for t in terms)
+        return f"{{{' '.join(fields)}}} : ({query})"
+
+    def filter(self, qs, q, fields=DEFAULT_SEARCH_FIELDS):
+        terms = search_terms(q)
+        if not terms:
+            return super().filter(qs, q, fields)
+        match = self.match_expression(terms, fields)
+        return qs.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match],
+        ))
+
+    def annotate_rank(self, qs, q, fields=DEFAULT_SEARCH_FIELDS):
+        terms = search_terms(q)
+        if not terms:
+            return super().annotate_rank(qs, q, fields)
+        match = self.match_expression(terms, fields)
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        table = qs.model._meta.db_table
+        # bm25 es menor cuanto más relevante: se invierte para ordenar desc
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id",
+            [match], output_field=FloatField(),
+        )
+        return self.filter(qs, q, fields).annotate(search_rank=rank)
+
+
+class PostgresSearchBackend(LikeSearchBackend):
+    name = "postgres"
+    # Peso de cada columna en search_vector (ver migración 0012)
+    WEIGHTS = {"nombre": "A", "categoria": "B", "tienda": "C", "descripcion": "D"}
+    # ts_rank recibe los pesos en orden {D, C, B, A}: mismos valores relativos que FTS_WEIGHTS
+    RANK_WEIGHTS = "{0.1, 0.2, 0.2, 1.0}"
+
+    def tsquery(self, terms: Sequence[str], fields=DEFAULT_SEARCH_FIELDS) -> str:
+        # Prefijo y solo en los pesos de `fields`: "lap:*AD & cam:*AD"
+        labels = "".join(sorted(self.WEIGHTS[f] for f in fields))
+        return " & ".join(f"{t}:*{labels}" for t in terms)
+
+    def _column(self, qs) -> str:
+        ops = connections[qs.db].ops
+        return f"{ops.quote_name(qs.model._meta.db_table)}.{ops.quote_name('search_vector')}"
+
+    def filter(self, qs, q, fields=DEFAULT_SEARCH_FIELDS):
+        terms = search_terms(q)
+        if not terms:
+            return super().filter(qs, q, fields)
+        return qs.filter(RawSQL(
+            f"{self._column(qs)} @@ to_tsquery('simple', %s)",
+            [self.tsquery(terms, fields)], output_field=BooleanField(),
+        ))
+
+    def annotate_rank(self, qs, q, fields=DEFAULT_SEARCH_FIELDS):
+        terms = search_terms(q)
+        if not terms:
+            return super().annotate_rank(qs, q, fields)
+        rank = RawSQL(
+            f"ts_rank('{self.RANK_WEIGHTS}', {self._column(qs)}, to_tsquery('simple', %s))",
+            [self.tsquery(terms, fields)], output_field=FloatField(),
+        )
+        return self.filter(qs, q, fields).annotate(search_rank=rank)
+
+
+@lru_cache(maxsize=None)
+def _fts_table_exists(alias: str) -> bool:
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def get_search_backend(alias: str = "default"):
+    vendor = connections[alias].vendor
+    if vendor == "sqlite" and _fts_table_exists(alias):
+        return SQLiteFTSBackend()
+    if vendor == "postgresql":
+        return PostgresSearchBackend()
+    return LikeSearchBackend()
+
+
+def search_products(qs, q: str, ranked: bool = False, fields=DEFAULT_SEARCH_FIELDS):
+    """
+    Filtra `qs` por la búsqueda `q`. Con `ranked=True` anota además
+    `search_rank` (mayor = más relevante) para ordenar por relevancia.
+    """
+    backend = get_search_backend(qs.db)
+    if ranked:
+        return backend.annotate_rank(qs, q, fields)
+    return backend.filter(qs, q, fields)
+
+
+def rebuild_search_index(alias: str = "default") -> bool:
+    """
+    Recrea los triggers que falten y reconstruye el índice FTS5 desde
+    catalog_producto. Devuelve False si el backend no usa índice.
+    """
+    if connections[alias].vendor != "sqlite" or not _fts_table_exists(alias):
+        return False
+    with connections[alias].cursor() as cursor:
+        for sql in SQLITE_FTS_TRIGGERS_SQL:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
@@ -0,0 +1,215 @@
+# catalog/services/synthetic.py
+"""Catálogo sintético reproducible para pruebas de carga (`manage.py generar_catalogo`).
+
+Con la misma semilla genera los mismos productos, ofertas, reseñas y
+propuestas. Todo entra con bulk_create dentro de una transacción, así que
+no corren las señales: los agregados de reseñas se calculan al armar cada
+producto y el precio vigente se recalcula al final con
+`recalcular_precios_vigentes`. El índice FTS5 se mantiene por triggers.
+
+Los productos sintéticos se reconocen por el prefijo de su enlace
+(`LINK_SINTETICO`) y los usuarios por `USUARIO_SINTETICO`. Categorías y
+tiendas se derivan de los productos; su popularidad sigue una ley de Zipf
+(unas pocas concentran la mayoría de los productos), como en un catálogo real.
+"""
+import random
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Callable, List, Optional, Sequence
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from catalog.models import CatalogoVersion, Oferta, Producto, Proposal, Review
+from catalog.services.pricing import recalcular_precios_vigentes
+
+CATEGORIAS = ("Hogar", "Tecnología", "Deportes", "Moda", "Juguetes", "Libros", "Mascotas", "Belleza")
+TIENDAS = ("Éxito", "Falabella", "Alkosto", "Ktronix", "Homecenter", "Olímpica")
+LINK_SINTETICO = "https://sintetico.ofertum.test/p/"
+USUARIO_SINTETICO = "sintetico-"
+DEFAULT_BATCH_SIZE = 2000
+# Puntuaciones 1..5: la mayoría de las reseñas son buenas
+PESOS_RATING = (5, 7, 15, 35, 38)
+# Textos de reseñas: se reutilizan (generar uno por reseña domina el tiempo)
+COMENTARIOS_DISTINTOS = 500
+
+try:
+    from faker import Faker
+    FAKER_OK = True
+except Exception:
+    FAKER_OK = False
+
+
+@dataclass
+class ResumenCatalogo:
+    productos: int = 0
+    ofertas: int = 0
+    reviews: int = 0
+    propuestas: int = 0
+    usuarios: int = 0
+    categorias: int = 0
+    tiendas: int = 0
+    segundos: float = 0.0
+
+
+def _nombres(base: Sequence[str], n: int, prefijo: str) -> List[str]:
+    return list(base[:n]) + [f"{prefijo} {i}" for i in range(len(base) + 1, n + 1)]
+
+
+def _zipf(n: int) -> List[float]:
+    return [1 / (i + 1) for i in range(n)]
+
+
+class _Textos:
+    """Nombres y descripciones con Faker (o genéricos si no está instalado)."""
+
+    def __init__(self, semilla: int):
+        self.fake = None
+        if FAKER_OK:
+            self.fake = Faker("es_ES")
+            self.fake.seed_instance(semilla)
+
+    def nombre(self, i: int) -> str:
+        return self.fake.catch_phrase() if self.fake else f"Producto sintético {i:06d}"
+
+    def descripcion(self) -> str:
+        return self.fake.sentence(nb_words=12) if self.fake else ""
+
+    def comentarios(self, n: int) -> List[str]:
+        if not self.fake:
+            return [""]
+        return [self.fake.paragraph(nb_sentences=2) for _ in range(n)]
+
+
+def _precio(rnd: random.Random) -> Decimal:
+    # Log-normal: muchos productos baratos y pocos muy caros (mediana ~100.000)
+    pesos = min(max(round(rnd.lognormvariate(11.5, 1.0), -2), 1000), 99_000_000)
+    return Decimal(int(pesos)).quantize(Decimal("0.01"))
+
+
+def _oferta(rnd: random.Random, producto: Producto, activo: bool = True) -> Oferta:
+    if rnd.random() < 0.25:
+        factor = Decimal(rnd.randint(60, 95)) / 100
+        return Oferta(producto=producto, descuento_porcentaje=Decimal("0.00"),
+                      precio_fijo=(producto.precio * factor).quantize(Decimal("0.01")), activo=activo)
+    return Oferta(producto=producto, descuento_porcentaje=Decimal(rnd.randint(500, 6000)) / 100, activo=activo)
+
+
+def _cantidad_reviews(rnd: random.Random, media: float, maximo: int) -> int:
+    # Exponencial: la mayoría con pocas reseñas y algunos con muchas
+    return min(int(rnd.expovariate(1 / media)), maximo) if media > 0 else 0
+
+
+def _usuarios(n: int, semilla: int) -> List[int]:
+    User = get_user_model()
+    nombres = [f"{USUARIO_SINTETICO}{semilla}-{i}" for i in range(n)]
+    # password "!" = no puede iniciar sesión (y no paga el hasher)
+    User.objects.bulk_create(
+        [User(username=u, email=f"{u}@example.com", password="!") for u in nombres],
+        ignore_conflicts=True,
+    )
+    ids = dict(User.objects.filter(username__in=nombres).values_list("username", "pk"))
+    return [ids[u] for u in nombres]
+
+
+def generar_catalogo(
+    productos: int,
+    *,
+    categorias: int = len(CATEGORIAS),
+    tiendas: int = len(TIENDAS),
+    usuarios: int = 200,
+    ofertas: float = 0.3,
+    reviews_por_producto: float = 3.0,
+    propuestas: float = 0.05,
+    semilla: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progreso: Optional[Callable[[int], None]] = None,
+) -> ResumenCatalogo:
+    """
+    Inserta `productos` productos sintéticos. `ofertas` es la fracción con
+    oferta activa, `reviews_por_producto` la media (exponencial, a lo sumo
+    `usuarios`) y `propuestas` cuántas propuestas por producto.
+    `progreso(n)` se llama tras cada lote con los productos insertados.
+    """
+    inicio = time.perf_counter()
+    rnd = random.Random(semilla)
+    textos = _Textos(semilla)
+    nombres_cat = _nombres(CATEGORIAS, categorias, "Categoría")
+    nombres_tienda = _nombres(TIENDAS, tiendas, "Tienda")
+    pesos_cat, pesos_tienda = _zipf(len(nombres_cat)), _zipf(len(nombres_tienda))
+    comentarios = textos.comentarios(COMENTARIOS_DISTINTOS)
+    resumen = ResumenCatalogo(categorias=len(nombres_cat), tiendas=len(nombres_tienda))
+    inicial = Producto.objects.filter(link__startswith=LINK_SINTETICO).count()
+
+    with transaction.atomic():
+        usuario_ids = _usuarios(usuarios, semilla)
+        resumen.usuarios = len(usuario_ids)
+
+        for desde in range(0, productos, batch_size):
+            lote, reviews_lote = [], []
+            for i in range(desde, min(desde + batch_size, productos)):
+                n = inicial + i
+                p = Producto(
+                    nombre=textos.nombre(n),
+                    descripcion=textos.descripcion(),
+                    categoria=rnd.choices(nombres_cat, pesos_cat)[0],
+                    tienda=rnd.choices(nombres_tienda, pesos_tienda)[0],
+                    link=f"{LINK_SINTETICO}{n}",
+                    precio=_precio(rnd),
+                    disponible=rnd.random() < 0.95,
+                )
+                p.precio_vigente = p.precio  # los que tienen oferta se recalculan al final
+                cantidad = _cantidad_reviews(rnd, reviews_por_producto, len(usuario_ids))
+                ratings = rnd.choices(range(1, 6), PESOS_RATING, k=cantidad)
+                p.rating_sum, p.rating_count = sum(ratings), cantidad
+                p.rating_avg = p.rating_sum / cantidad if cantidad else None
+                lote.append(p)
+                reviews_lote.append(list(zip(rnd.sample(usuario_ids, cantidad), ratings)))
+
+            Producto.objects.bulk_create(lote)
+            # Por el enlace: no todos los backends devuelven los pk de un bulk_create
+            pks = dict(
+                Producto.objects.filter(link__in=[p.link for p in lote]).values_list("link", "pk")
+            )
+            nuevas_ofertas, nuevas_reviews = [], []
+            for p, reviews in zip(lote, reviews_lote):
+                p.pk = pks[p.link]
+                if rnd.random() < ofertas:
+                    if rnd.random() < 0.1:  # una oferta vieja inactiva antes de la vigente
+                        nuevas_ofertas.append(_oferta(rnd, p, activo=False))
+                    nuevas_ofertas.append(_oferta(rnd, p))
+                nuevas_reviews.extend(
+                    Review(producto=p, usuario_id=u, rating=r, comentario=rnd.choice(comentarios))
+                    for u, r in reviews
+                )
+            Oferta.objects.bulk_create(nuevas_ofertas)
+            Review.objects.bulk_create(nuevas_reviews)
+            resumen.productos += len(lote)
+            resumen.ofertas += len(nuevas_ofertas)
+            resumen.reviews += len(nuevas_reviews)
+            if progreso:
+                progreso(resumen.productos)
+
+        estados = [Proposal.STATUS_PENDING, Proposal.STATUS_APPROVED, Proposal.STATUS_REJECTED]
+        nuevas_propuestas = [
+            Proposal(
+                usuario_id=rnd.choice(usuario_ids),
+                nombre=textos.nombre(i),
+                descripcion=textos.descripcion(),
+                categoria=rnd.choices(nombres_cat, pesos_cat)[0],
+                tienda=rnd.choices(nombres_tienda, pesos_tienda)[0],
+                precio=_precio(rnd),
+                status=rnd.choices(estados, (60, 25, 15))[0],
+            )
+            for i in range(int(productos * propuestas))
+        ] if usuario_ids else []
+        Proposal.objects.bulk_create(nuevas_propuestas, batch_size=batch_size)
+        resumen.propuestas = len(nuevas_propuestas)
+
+        # bulk_create no dispara señales: precios vigentes y versión del catálogo
+        recalcular_precios_vigentes(Producto.objects.filter(link__startswith=LINK_SINTETICO), batch_size)
+        CatalogoVersion.incrementar()
+
+    resumen.segundos = time.perf_counter() - inicio
+    return resumen
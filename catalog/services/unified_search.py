@@ -0,0 +1,303 @@
+# catalog/services/unified_search.py
+"""Búsqueda unificada sobre el catálogo propio y los aliados.
+
+Cada fuente (FuenteLocal, FuenteAliada, ...) se consulta en paralelo en un
+pool de hilos con su propio plazo (UNIFIED_SEARCH_DEADLINES). Cada una
+devuelve a lo sumo `limit` resultados ordenados por la clave pedida y se
+combinan con un merge de k listas (heapq.merge). Lo que no llegó a tiempo se
+omite y se informa en el estado de esa fuente, así que una fuente lenta no
+suma su latencia a las demás.
+
+El ORDER BY de cada fuente solo elige qué filas traer: Lower() de SQLite no
+pasa a minúsculas fuera de ASCII y casefold() sí, así que antes del merge
+cada lista se reordena en Python con la misma clave (ORDENES).
+
+Una consulta que venció su plazo sigue ocupando su hilo hasta terminar. Cada
+fuente tiene a lo sumo UNIFIED_SEARCH_MAX_IN_FLIGHT consultas en curso; si ya
+las tiene, esa búsqueda la omite (status "busy") en vez de encolarla, y una
+fuente colgada no deja al pool sin hilos para las demás.
+
+Los resultados de la fuente aliada se guardan en cache (familia "partner"
+de services/cache_tiers.py) por fecha de la última sincronización y
+parámetros: la copia local solo cambia al sincronizar.
+"""
+import hashlib
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.urls import reverse
+
+from catalog.models import Producto, ProductoAliado
+from catalog.services.cache_tiers import familia
+from catalog.services.partner_catalog import obtener_catalogo_aliado
+from catalog.services.search import search_products
+
+DEFAULT_DEADLINE = 2.0
+PARTNER_CACHE_TIMEOUT = 60 * 60
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_IN_FLIGHT = 3
+
+
+def _nombre(r):
+    return r["nombre"].casefold()
+
+
+# sort -> (clave de merge, reverse). Cada fuente entrega su lista en este orden.
+ORDENES: Dict[str, Tuple[Callable[[dict], Any], bool]] = {
+    "name": (lambda r: (_nombre(r), r["fuente"]), False),
+    "price_asc": (lambda r: (r["precio"], _nombre(r)), False),
+    "price_desc": (lambda r: (r["precio"], _nombre(r)), True),
+    # sin rating al final; más reseñas primero si empata
+    "rating": (lambda r: (r["rating_avg"] is None, -(r["rating_avg"] or 0), -r["rating_count"], _nombre(r)), False),
+}
+
+
+def _precio(raw: Optional[str]) -> Optional[Decimal]:
+    raw = (raw or "").strip()
+    if not raw:
+        return None
+    try:
+        return Decimal(raw.replace(",", "."))
+    except InvalidOperation:
+        return None
+
+
+@dataclass(frozen=True)
+class ParametrosBusqueda:
+    q: str = ""
+    categoria: str = ""
+    tienda: str = ""
+    precio_min: Optional[Decimal] = None
+    precio_max: Optional[Decimal] = None
+    sort: str = "name"
+    limit: int = 50
+
+    @classmethod
+    def desde_query(cls, params: Mapping[str, str], limit: int = 50) -> "ParametrosBusqueda":
+        """Lee los mismos parámetros que /products/ (q, category, store, min, max, sort)."""
+        sort = (params.get("sort") or "name").strip()
+        return cls(
+            q=(params.get("q") or "").strip(),
+            categoria=(params.get("category") or "").strip(),
+            tienda=(params.get("store") or "").strip(),
+            precio_min=_precio(params.get("min")),
+            precio_max=_precio(params.get("max")),
+            sort=sort if sort in ORDENES else "name",
+            limit=limit,
+        )
+
+
+def filtrar_productos_aliados(qs, params: ParametrosBusqueda):
+    """Filtros de /partner-products/ sobre ProductoAliado."""
+    if params.q:
+        qs = qs.filter(Q(nombre__icontains=params.q) | Q(descripcion__icontains=params.q))
+    if params.categoria:
+        qs = qs.filter(categoria__iexact=params.categoria)
+    if params.tienda:
+        qs = qs.filter(tienda__iexact=params.tienda)
+    if params.precio_min is not None:
+        qs = qs.filter(precio__gte=params.precio_min)
+    if params.precio_max is not None:
+        qs = qs.filter(precio__lte=params.precio_max)
+    return qs
+
+
+def _orden_sql(sort: str, precio: str, con_rating: bool) -> list:
+    """ORDER BY equivalente a ORDENES[sort] para el modelo de la fuente."""
+    nombre = Lower("nombre")
+    if sort == "price_asc":
+        return [F(precio).asc(nulls_last=True), nombre]
+    if sort == "price_desc":
+        return [F(precio).desc(nulls_last=True), nombre.desc()]
+    if sort == "rating" and con_rating:
+        return [F("rating_avg").desc(nulls_last=True), F("rating_count").desc(), nombre]
+    return [nombre, "pk"]
+
+
+class FuenteLocal:
+    nombre = "local"
+
+    def buscar(self, params: ParametrosBusqueda) -> List[dict]:
+        qs = Producto.objects.filter(disponible=True)
+        if params.q:
+            qs = search_products(qs, params.q)
+        if params.categoria:
+            qs = qs.filter(categoria__iexact=params.categoria)
+        if params.tienda:
+            qs = qs.filter(tienda__iexact=params.tienda)
+        if params.precio_min is not None:
+            qs = qs.filter(precio_vigente__gte=params.precio_min)
+        if params.precio_max is not None:
+            qs = qs.filter(precio_vigente__lte=params.precio_max)
+        qs = qs.order_by(*_orden_sql(params.sort, "precio_vigente", con_rating=True))
+        qs = qs.only("id", "nombre", "categoria", "tienda", "link", "imagen",
+                     "precio", "precio_vigente", "rating_avg", "rating_count")
+        return [
+            {
+                "fuente": self.nombre,
+                "id": str(p.pk),
+                "nombre": p.nombre,
+                "categoria": p.categoria,
+                "tienda": p.tienda,
+                "precio": p.precio_vigente if p.precio_vigente is not None else p.precio,
+                "rating_avg": p.rating_avg,
+                "rating_count": p.rating_count,
+                "imagen_url": p.imagen.url if p.imagen else None,
+                "link": p.link,
+                "detail_url": reverse("catalog:product_detail", args=[p.pk]),
+            }
+            for p in qs[:params.limit]
+        ]
+
+
+class FuenteAliada:
+    """Copia local del catálogo aliado (se renueva sola, ver partner_catalog)."""
+    nombre = "aliado"
+
+    def buscar(self, params: ParametrosBusqueda) -> List[dict]:
+        estado = obtener_catalogo_aliado()
+        if estado.completada is None:
+            return self._buscar(params)
+        clave = hashlib.md5(repr(params).encode("utf-8")).hexdigest()
+        return _cache_aliado.get_or_set(
+            f"{estado.completada.timestamp()}:{clave}", lambda: self._buscar(params),
+        )
+
+    def _buscar(self, params: ParametrosBusqueda) -> List[dict]:
+        qs = filtrar_productos_aliados(ProductoAliado.objects.all(), params)
+        qs = qs.order_by(*_orden_sql(params.sort, "precio", con_rating=False))
+        return [
+            {
+                "fuente": self.nombre,
+                "id": p.id_externo,
+                "nombre": p.nombre,
+                "categoria": p.categoria,
+                "tienda": p.tienda,
+                "precio": p.precio,
+                "rating_avg": None,
+                "rating_count": 0,
+                "imagen_url": p.imagen or None,
+                "link": p.link,
+                "detail_url": p.link or None,
+            }
+            for p in qs[:params.limit]
+        ]
+
+
+_cache_aliado = familia("partner", shared_timeout=PARTNER_CACHE_TIMEOUT)
+
+FUENTES = {f.nombre: f for f in (FuenteLocal(), FuenteAliada())}
+
+
+@dataclass
+class EstadoFuente:
+    status: str                 # "ok", "timeout", "busy" o "error"
+    count: int = 0
+    elapsed_ms: float = 0.0
+    error: str = ""
+
+    def as_dict(self) -> dict:
+        data = {"status": self.status, "count": self.count, "elapsed_ms": round(self.elapsed_ms, 1)}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+@dataclass
+class ResultadoUnificado:
+    resultados: List[dict]
+    fuentes: Dict[str, EstadoFuente]
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "UNIFIED_SEARCH_WORKERS", DEFAULT_WORKERS),
+                thread_name_prefix="busqueda-unificada",
+            )
+        return _executor
+
+
+_en_curso: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def _cupo(nombre: str) -> threading.BoundedSemaphore:
+    with _executor_lock:
+        if nombre not in _en_curso:
+            _en_curso[nombre] = threading.BoundedSemaphore(
+                getattr(settings, "UNIFIED_SEARCH_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)
+            )
+        return _en_curso[nombre]
+
+
+def _en_hilo(fuente, params, cupo):
+    inicio = time.monotonic()
+    try:
+        return fuente.buscar(params), (time.monotonic() - inicio) * 1000
+    finally:
+        # Los hilos del pool se reutilizan: no dejar conexiones abiertas
+        connections.close_all()
+        cupo.release()
+
+
+def _plazo(nombre: str) -> float:
+    plazos = getattr(settings, "UNIFIED_SEARCH_DEADLINES", {})
+    return plazos.get(nombre, getattr(settings, "UNIFIED_SEARCH_DEFAULT_DEADLINE", DEFAULT_DEADLINE))
+
+
+def buscar_unificado(params: ParametrosBusqueda, fuentes: Optional[Sequence] = None) -> ResultadoUnificado:
+    """
+    Consulta todas las fuentes a la vez y combina lo que llegó dentro del
+    plazo de cada una, ordenado por `params.sort` y cortado en `params.limit`.
+    """
+    fuentes = list(FUENTES.values()) if fuentes is None else list(fuentes)
+    inicio = time.monotonic()
+    executor = _get_executor()
+    futuros, listas, estados = [], [], {}
+    for fuente in fuentes:
+        cupo = _cupo(fuente.nombre)
+        if not cupo.acquire(blocking=False):
+            # Todavía corren consultas vencidas de esta fuente
+            estados[fuente.nombre] = EstadoFuente("busy")
+            continue
+        try:
+            futuros.append((fuente, executor.submit(_en_hilo, fuente, params, cupo)))
+        except BaseException:
+            cupo.release()
+            raise
+
+    clave, reverse = ORDENES.get(params.sort, ORDENES["name"])
+    for fuente, futuro in futuros:
+        restante = max(0.0, inicio + _plazo(fuente.nombre) - time.monotonic())
+        try:
+            items, elapsed_ms = futuro.result(timeout=restante)
+        except FuturesTimeout:
+            # Sigue corriendo en su hilo; el resultado se descarta
+            estados[fuente.nombre] = EstadoFuente("timeout", elapsed_ms=(time.monotonic() - inicio) * 1000)
+            continue
+        except Exception as exc:
+            estados[fuente.nombre] = EstadoFuente(
+                "error", elapsed_ms=(time.monotonic() - inicio) * 1000, error=str(exc),
+            )
+            continue
+        listas.append(sorted(items, key=clave, reverse=reverse))
+        estados[fuente.nombre] = EstadoFuente("ok", count=len(items), elapsed_ms=elapsed_ms)
+
+    resultados = list(islice(heapq.merge(*listas, key=clave, reverse=reverse), params.limit))
+    return ResultadoUnificado(resultados=resultados, fuentes=estados)
@@ -0,0 +1,109 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import CatalogoVersion, Oferta, Producto, Review
+from .services.page_cache import invalidar_productos
+
+
+def _refrescar_precio_vigente(producto_id):
+    producto = Producto.objects.filter(pk=producto_id).first()
+    if producto is not None:
+        producto.actualizar_precio_vigente()
+
+
+def _productos_de_oferta(oferta):
+    """Producto de la oferta y, si se pasó a otro, el que tenía al cargarla."""
+    return {oferta.producto_id, oferta._producto_original_id} - {None}
+
+
+@receiver(post_init, sender=Oferta)
+def oferta_cargada(sender, instance, **kwargs):
+    instance._producto_original_id = instance.__dict__.get('producto_id') if instance.pk else None
+
+
+@receiver(post_save, sender=Oferta)
+def oferta_guardada(sender, instance, raw=False, **kwargs):
+    """Crear, editar, activar, desactivar o mover una oferta cambia el precio vigente."""
+    if raw:
+        # loaddata: los fixtures ya traen precio_vigente
+        return
+    for producto_id in _productos_de_oferta(instance):
+        _refrescar_precio_vigente(producto_id)
+
+
+@receiver(post_delete, sender=Oferta)
+def oferta_eliminada(sender, instance, **kwargs):
+    for producto_id in _productos_de_oferta(instance):
+        _refrescar_precio_vigente(producto_id)
+
+
+def _refrescar_producto_en_memoria(review):
+    # Si la reseña trae el producto cargado, reflejar los agregados nuevos
+    if Review.producto.is_cached(review):
+        try:
+            review.producto.refresh_from_db(fields=Producto.RATING_FIELDS)
+        except Producto.DoesNotExist:
+            pass
+
+
+@receiver(post_init, sender=Review)
+def review_cargada(sender, instance, **kwargs):
+    # Valores originales para calcular el delta al editar
+    # (vía __dict__ para no disparar la carga de campos diferidos)
+    instance._rating_original = instance.__dict__.get('rating') if instance.pk else None
+    instance._producto_original_id = instance.__dict__.get('producto_id') if instance.pk else None
+
+
+@receiver(post_save, sender=Review)
+def review_guardada(sender, instance, created, raw=False, **kwargs):
+    """Actualiza rating_sum/rating_count/rating_avg del producto de forma incremental."""
+    if raw:
+        return
+    original_id = instance._producto_original_id
+    if created or original_id is None:
+        Producto.aplicar_delta_rating(instance.producto_id, instance.rating, 1)
+    elif original_id != instance.producto_id and instance._rating_original is not None:
+        Producto.aplicar_delta_rating(original_id, -instance._rating_original, -1)
+        Producto.aplicar_delta_rating(instance.producto_id, instance.rating, 1)
+    elif instance._rating_original is not None and instance.rating != instance._rating_original:
+        Producto.aplicar_delta_rating(instance.producto_id, instance.rating - instance._rating_original, 0)
+    invalidar_productos(instance.producto_id, original_id)
+    instance._rating_original = instance.rating
+    instance._producto_original_id = instance.producto_id
+    _refrescar_producto_en_memoria(instance)
+
+
+@receiver(post_delete, sender=Review)
+def review_eliminada(sender, instance, **kwargs):
+    # Con el valor cargado desde la base, no el editado en memoria
+    rating = instance._rating_original if instance._rating_original is not None else instance.rating
+    producto_id = instance._producto_original_id or instance.producto_id
+    Producto.aplicar_delta_rating(producto_id, -rating, -1)
+    _refrescar_producto_en_memoria(instance)
+    invalidar_productos(producto_id)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def catalogo_modificado(sender, **kwargs):
+    """Cualquier escritura del catálogo invalida los ETag de las vistas."""
+    CatalogoVersion.incrementar()
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_modificado(sender, instance, **kwargs):
+    """Las tarjetas en cache del producto dejan de valer."""
+    invalidar_productos(instance.pk)
+
+
+@receiver(post_save, sender=Oferta)
+@receiver(post_delete, sender=Oferta)
+def oferta_modificada(sender, instance, **kwargs):
+    invalidar_productos(*_productos_de_oferta(instance))
+    # Último receptor de Oferta: desde aquí el producto guardado es el original
+    instance._producto_original_id = instance.producto_id
@@ -0,0 +1,31 @@
+# catalog/test_runner.py
+"""Runner de pruebas: cache compartido en un directorio temporal por corrida.
+
+CACHES['default'] apunta a un directorio fijo (CACHE_DIR) que comparten los
+servidores de la máquina. Las pruebas escriben y vacían ese cache, así que
+aquí se usa el mismo backend en un directorio propio que se borra al final:
+nada pasa de una corrida a otra ni a un servidor en marcha.
+"""
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class CatalogTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix="ofertum-test-cache-")
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        for config in caches.values():
+            if config["BACKEND"].endswith("FileBasedCache"):
+                config["LOCATION"] = self._cache_dir
+        self._caches_override = override_settings(CACHES=caches)
+        self._caches_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,8 +1,48 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase, Client
+from io import BytesIO, StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import factory.random
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DataError, connection
+from django.test import TestCase, TransactionTestCase, AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from .models import Producto, Oferta, Review, Proposal
+from .cache_backends import FileBasedCache
+from .factories import OfertaFactory, ProductoFactory, ReviewFactory, UsuarioFactory
+from .models import Producto, Oferta, Review, Proposal, ProductoAliado, SincronizacionAliado, ExportJob
+from .models import calcular_precio_oferta
+from .services import partner_catalog
+from .services.partner_schema import ESQUEMA_POR_DEFECTO, esquema_desde_config
+from .services.unified_search import ParametrosBusqueda, buscar_unificado
+from .services.partner_client import CircuitBreaker, CircuitOpenError, PartnerAPIError, PartnerClient
+from .services import export_jobs, exports, instrumentation
+from .services.cache_tiers import _MISSING, CacheFamily, LocalLRU, limpiar_local
+from .services.columnar import ParquetExport
+from .services.exports import build_export
+from .services.instrumentation import estadisticas, medir
+from .services.page_cache import versiones_productos
+from .services.pagination import encode_cursor
+from .services.pricing import precios_vigentes
+from .services.synthetic import LINK_SINTETICO, USUARIO_SINTETICO, generar_catalogo
+from .services.reporting import (
+    BaseRenderer, CSVRenderer, DefaultReportFactory, ExcelRenderer, ParallelPDFRenderer, PDFRenderer, ReportColumn,
+)
+from .services.facets import get_facet_index
+from .services.search import get_search_backend, rebuild_search_index
 
 
 class ProductoModelTest(TestCase):
@@ -113,6 +153,224 @@ class OfertaModelTest(TestCase):
         self.assertFalse(oferta_inactiva.esta_activa())
 
 
+class PrecioVigenteTest(TestCase):
+    """Pruebas del precio vigente desnormalizado en Producto."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.producto = Producto.objects.create(
+            nombre='Producto vigente',
+            precio=Decimal('100.00')
+        )
+
+    def _precio_vigente(self):
+        return Producto.objects.get(pk=self.producto.pk).precio_vigente
+
+    def test_producto_nuevo_usa_precio_base(self):
+        """Un producto sin ofertas tiene como precio vigente su precio base."""
+        self.assertEqual(self._precio_vigente(), Decimal('100.00'))
+
+    def test_oferta_creada_actualiza_precio_vigente(self):
+        """Crear una oferta activa recalcula el precio vigente."""
+        Oferta.objects.create(producto=self.producto, descuento_porcentaje=Decimal('20.00'))
+        self.assertEqual(self._precio_vigente(), Decimal('80.00'))
+
+    def test_oferta_desactivada_y_eliminada(self):
+        """Desactivar o eliminar la oferta restaura el precio base."""
+        oferta = Oferta.objects.create(producto=self.producto, precio_fijo=Decimal('60.00'))
+        self.assertEqual(self._precio_vigente(), Decimal('60.00'))
+        oferta.activo = False
+        oferta.save()
+        self.assertEqual(self._precio_vigente(), Decimal('100.00'))
+        oferta.activo = True
+        oferta.save()
+        oferta.delete()
+        self.assertEqual(self._precio_vigente(), Decimal('100.00'))
+
+    def test_oferta_movida_a_otro_producto(self):
+        """Pasar una oferta a otro producto recalcula y invalida los dos."""
+        otro = Producto.objects.create(nombre='Otro producto', precio=Decimal('50.00'))
+        Oferta.objects.create(producto=self.producto, descuento_porcentaje=Decimal('20.00'))
+        oferta = Oferta.objects.get(producto=self.producto)  # cargada desde la base
+        antes = versiones_productos([self.producto.pk, otro.pk])
+        oferta.producto = otro
+        oferta.save()
+        self.assertEqual(self._precio_vigente(), Decimal('100.00'))
+        self.assertEqual(Producto.objects.get(pk=otro.pk).precio_vigente, Decimal('40.00'))
+        despues = versiones_productos([self.producto.pk, otro.pk])
+        self.assertNotEqual(despues[self.producto.pk], antes[self.producto.pk])
+        self.assertNotEqual(despues[otro.pk], antes[otro.pk])
+
+        oferta.producto = self.producto  # movida en memoria y eliminada
+        oferta.delete()
+        self.assertEqual(Producto.objects.get(pk=otro.pk).precio_vigente, Decimal('50.00'))
+
+    def test_cambio_de_precio_base(self):
+        """Guardar el producto con otro precio recalcula el descuento."""
+        Oferta.objects.create(producto=self.producto, descuento_porcentaje=Decimal('10.00'))
+        self.producto.precio = Decimal('200.00')
+        self.producto.save()
+        self.assertEqual(self._precio_vigente(), Decimal('180.00'))
+
+    def test_filtro_y_orden_por_precio_en_listado(self):
+        """El listado filtra y ordena por el precio con oferta aplicada."""
+        barato = Producto.objects.create(nombre='Caro con oferta', precio=Decimal('300.00'))
+        Oferta.objects.create(producto=barato, precio_fijo=Decimal('50.00'))
+        Producto.objects.create(nombre='Fuera de rango', precio=Decimal('500.00'))
+
+        response = self.client.get(reverse('catalog:product_list'), {'max': '150', 'sort': 'price_asc'})
+        nombres = [it['name'] for it in response.context['items']]
+        self.assertEqual(nombres, ['Caro con oferta', 'Producto vigente'])
+
+
+class PreciosPorLoteTest(TestCase):
+    """Cálculo vectorizado de precios (services/pricing.py)."""
+
+    def test_coincide_con_el_calculo_escalar(self):
+        """Propiedad: para casos aleatorios da lo mismo que calcular_precio_oferta."""
+
+        rnd = random.Random(20)
+        precios, descuentos, fijos = [], [], []
+        for _ in range(5000):
+            precios.append(Decimal(rnd.randint(0, 10 ** 10 - 1)).scaleb(-2))
+            tipo = rnd.random()
+            if tipo < 0.2:    # sin oferta
+                descuentos.append(None)
+                fijos.append(None)
+            elif tipo < 0.4:  # precio fijo
+                descuentos.append(Decimal(rnd.randint(0, 10000)).scaleb(-2))
+                fijos.append(Decimal(rnd.randint(0, 10 ** 6)).scaleb(-2))
+            else:
+                descuentos.append(Decimal(rnd.choice([0, 5000, 2500, 1250, 10000, rnd.randint(0, 10000)])).scaleb(-2))
+                fijos.append(None)
+        # Mitades exactas: 0.125 -> 0.12 y 0.375 -> 0.38 (al par, como quantize)
+        precios += [Decimal('0.25'), Decimal('0.75'), Decimal('0.01')]
+        descuentos += [Decimal('50.00'), Decimal('50.00'), Decimal('50.00')]
+        fijos += [None, None, None]
+
+        esperados = [calcular_precio_oferta(p, d, f) for p, d, f in zip(precios, descuentos, fijos)]
+        self.assertEqual(precios_vigentes(precios, descuentos, fijos), esperados)
+        self.assertEqual(esperados[-3:], [Decimal('0.12'), Decimal('0.38'), Decimal('0.00')])
+
+    def test_recalcular_precios_tras_carga_masiva(self):
+        """recalcular_precios corrige precio_vigente que bulk_update dejó desactualizado."""
+        a = Producto.objects.create(nombre='A', precio=Decimal('10.00'))
+        b = Producto.objects.create(nombre='B', precio=Decimal('33.33'))
+        c = Producto.objects.create(nombre='C', precio=Decimal('5.00'))
+        Oferta.objects.create(producto=a, descuento_porcentaje=Decimal('15.00'))
+        Oferta.objects.create(producto=b, descuento_porcentaje=Decimal('50.00'))
+        Oferta.objects.create(producto=c, precio_fijo=Decimal('1.99'))
+        Producto.objects.update(precio_vigente=Decimal('0.00'))  # sin señales
+
+        call_command('recalcular_precios', '--batch-size', '2', stdout=open(os.devnull, 'w'))
+        vigentes = dict(Producto.objects.values_list('nombre', 'precio_vigente'))
+        self.assertEqual(vigentes, {'A': Decimal('8.50'), 'B': Decimal('16.66'), 'C': Decimal('1.99')})
+        for p in Producto.objects.all():
+            self.assertEqual(p.precio_vigente, p.obtener_precio_actual())
+
+
+class ProductoWithPricingTest(TestCase):
+    """Pruebas de las anotaciones de Producto.objects.with_pricing()."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.sin_oferta = Producto.objects.create(nombre='A sin oferta', precio=Decimal('10.00'))
+        self.con_descuento = Producto.objects.create(nombre='B descuento', precio=Decimal('99.99'))
+        self.con_fijo = Producto.objects.create(nombre='C fijo', precio=Decimal('50.00'))
+        Oferta.objects.create(producto=self.con_descuento, descuento_porcentaje=Decimal('5.00'), activo=False)
+        self.oferta = Oferta.objects.create(producto=self.con_descuento, descuento_porcentaje=Decimal('15.00'))
+        Oferta.objects.create(producto=self.con_fijo, precio_fijo=Decimal('30.00'))
+
+    def test_anotaciones_coinciden_con_helpers(self):
+        """El precio anotado en SQL coincide con el calculado por el modelo."""
+        # Mitades exactas: se redondean al par, como quantize()
+        for precio, descuento in [('0.05', '50'), ('10.05', '50'), ('0.15', '50'), ('0.25', '50'),
+                                  ('1.01', '50'), ('99999999.99', '12.34')]:
+            p = Producto.objects.create(nombre=f'Mitad {precio}', precio=Decimal(precio))
+            Oferta.objects.create(producto=p, descuento_porcentaje=Decimal(descuento))
+        for p in Producto.objects.with_pricing():
+            fresco = Producto.objects.get(pk=p.pk)
+            self.assertEqual(p.db_precio_actual, fresco.obtener_precio_actual(), p.nombre)
+            self.assertEqual(p.obtener_precio_actual(), fresco.obtener_precio_actual())
+
+    def test_oferta_activa_desde_anotaciones(self):
+        """La oferta activa anotada es la más reciente con activo=True."""
+        p = Producto.objects.with_pricing().get(pk=self.con_descuento.pk)
+        oferta = p.obtener_oferta_activa()
+        self.assertEqual(oferta.pk, self.oferta.pk)
+        self.assertEqual(oferta.descuento_porcentaje, Decimal('15.00'))
+        self.assertIsNone(Producto.objects.with_pricing().get(pk=self.sin_oferta.pk).obtener_oferta_activa())
+
+    def test_consultas_constantes(self):
+        """Recorrer los productos y sus precios cuesta una sola consulta."""
+        with self.assertNumQueries(1):
+            for p in Producto.objects.with_pricing():
+                p.obtener_oferta_activa()
+                p.obtener_precio_actual()
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)  # revisan el contexto de cada respuesta
+class ProductListPaginationTest(TestCase):
+    """Pruebas de la paginación en base de datos del listado."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        User = get_user_model()
+        self.users = [User.objects.create_user(username=f'u{i}', password='x') for i in range(2)]
+        for i in range(20):
+            p = Producto.objects.create(nombre=f'Prod {i:02d}', precio=Decimal(100 - (i % 7)))
+            if i % 3 == 0:
+                Review.objects.create(producto=p, usuario=self.users[0], rating=1 + i % 5)
+
+    def _recorrer_por_cursor(self, sort):
+        nombres = []
+        params = {'sort': sort}
+        while True:
+            response = self.client.get(reverse('catalog:product_list'), params)
+            nombres += [it['name'] for it in response.context['items']]
+            cursor = response.context.get('next_cursor')
+            if not cursor:
+                return nombres
+            params = {'sort': sort, 'cursor': cursor}
+
+    def _recorrer_por_pagina(self, sort):
+        nombres = []
+        page = 1
+        while True:
+            response = self.client.get(reverse('catalog:product_list'), {'sort': sort, 'page': page})
+            nombres += [it['name'] for it in response.context['items']]
+            if not response.context['page_obj'].has_next():
+                return nombres
+            page += 1
+
+    def test_pagina_limitada(self):
+        """Solo se construyen las tarjetas de la página pedida."""
+        response = self.client.get(reverse('catalog:product_list'), {'page': 3})
+        self.assertEqual(len(response.context['items']), 2)
+        self.assertEqual(response.context['paginator'].count, 20)
+
+    def test_cursor_coincide_con_offset(self):
+        """Recorrer por cursor devuelve el mismo orden que por número de página."""
+        for sort in ('name', 'price_asc', 'price_desc', 'rating'):
+            por_pagina = self._recorrer_por_pagina(sort)
+            self.assertEqual(len(por_pagina), 20)
+            self.assertEqual(self._recorrer_por_cursor(sort), por_pagina, sort)
+
+    def test_cursor_invalido(self):
+        """Un cursor corrupto vuelve a la primera página."""
+        response = self.client.get(reverse('catalog:product_list'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_cursor_con_tipos_equivocados(self):
+        """Un cursor bien formado con valores del tipo equivocado también vuelve a la primera página."""
+        url = reverse('catalog:product_list')
+        for sort, valores in (('name', ['a', 'b']), ('price_asc', ['caro', 'x', 1]), ('rating', [[], 1, 'x', 2])):
+            response = self.client.get(url, {'sort': sort, 'cursor': encode_cursor(valores)})
+            self.assertEqual(response.status_code, 200, sort)
+            self.assertEqual(response.context['page_obj'].number, 1, sort)
+
+
 class ReviewModelTest(TestCase):
     """Pruebas unitarias para el modelo Review."""
 
@@ -178,6 +436,57 @@ class ReviewModelTest(TestCase):
         self.assertEqual(count, 2)
 
 
+class RatingAgregadosTest(TestCase):
+    """Pruebas de los agregados de reseñas desnormalizados en Producto."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        User = get_user_model()
+        self.u1 = User.objects.create_user(username='r1', password='x')
+        self.u2 = User.objects.create_user(username='r2', password='x')
+        self.producto = Producto.objects.create(nombre='Con reseñas', precio=Decimal('10.00'))
+
+    def _agregados(self):
+        p = Producto.objects.get(pk=self.producto.pk)
+        return p.rating_sum, p.rating_count, p.rating_avg
+
+    def test_crear_editar_eliminar(self):
+        """Los agregados siguen cada alta, edición y baja de reseñas."""
+        r1 = Review.objects.create(producto=self.producto, usuario=self.u1, rating=5)
+        Review.objects.create(producto=self.producto, usuario=self.u2, rating=2)
+        self.assertEqual(self._agregados(), (7, 2, 3.5))
+
+        r1 = Review.objects.get(pk=r1.pk)
+        r1.rating = 3
+        r1.save()
+        self.assertEqual(self._agregados(), (5, 2, 2.5))
+
+        r1.delete()
+        self.assertEqual(self._agregados(), (2, 1, 2.0))
+        Review.objects.all().delete()
+        self.assertEqual(self._agregados(), (0, 0, None))
+
+    def test_guardar_producto_no_pisa_agregados(self):
+        """Guardar una instancia vieja del producto conserva los agregados."""
+        viejo = Producto.objects.get(pk=self.producto.pk)
+        Review.objects.create(producto=Producto.objects.get(pk=self.producto.pk), usuario=self.u1, rating=4)
+        viejo.nombre = 'Renombrado'
+        viejo.save()
+        self.assertEqual(self._agregados(), (4, 1, 4.0))
+
+    def test_filtro_y_orden_por_rating(self):
+        """El listado filtra y ordena por la media almacenada."""
+        otro = Producto.objects.create(nombre='Otro', precio=Decimal('10.00'))
+        Review.objects.create(producto=self.producto, usuario=self.u1, rating=3)
+        Review.objects.create(producto=otro, usuario=self.u1, rating=5)
+        Producto.objects.create(nombre='Sin reseñas', precio=Decimal('10.00'))
+
+        response = self.client.get(reverse('catalog:product_list'), {'sort': 'rating'})
+        self.assertEqual([it['name'] for it in response.context['items']], ['Otro', 'Con reseñas', 'Sin reseñas'])
+        response = self.client.get(reverse('catalog:product_list'), {'rating': '4'})
+        self.assertEqual([it['name'] for it in response.context['items']], ['Otro'])
+
+
 class ProposalModelTest(TestCase):
     """Pruebas unitarias para el modelo Proposal."""
 
@@ -251,6 +560,62 @@ class ProductAPITest(TestCase):
         self.assertEqual(data['total'], 1)
         self.assertEqual(data['productos'][0]['nombre'], 'Producto API 1')
 
+    def test_api_products_cursor(self):
+        """La API pagina por cursor y reporta el total con COUNT."""
+        for i in range(5):
+            Producto.objects.create(nombre=f'Extra {i}', precio=Decimal('10.00'))
+        url = reverse('catalog:api_products')
+        vistos = []
+        params = {'limit': 2}
+        while True:
+            data = self.client.get(url, params).json()
+            self.assertEqual(data['total'], 6)
+            self.assertLessEqual(data['count'], 2)
+            vistos += [p['id'] for p in data['productos']]
+            if not data['next_cursor']:
+                break
+            params = {'limit': 2, 'cursor': data['next_cursor']}
+        self.assertEqual(len(vistos), 6)
+        self.assertEqual(len(set(vistos)), 6)
+
+    def test_api_products_cursor_invalido(self):
+        """Un cursor corrupto devuelve 400."""
+        response = self.client.get(reverse('catalog:api_products'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_products_cursor_con_tipos_equivocados(self):
+        """Un cursor decodificable pero con tipos que no son los del orden devuelve 400."""
+        response = self.client.get(reverse('catalog:api_products'), {'cursor': encode_cursor(['a', 'b'])})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Cursor inválido')
+
+    def test_api_products_fields(self):
+        """?fields= limita las claves de cada producto."""
+        response = self.client.get(reverse('catalog:api_products'), {'fields': 'id,precio_actual'})
+        self.assertEqual(list(response.json()['productos'][0]), ['id', 'precio_actual'])
+        response = self.client.get(reverse('catalog:api_products'), {'fields': 'id,inexistente'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_products_stream_json(self):
+        """?stream=1 devuelve el mismo documento JSON por partes."""
+        response = self.client.get(reverse('catalog:api_products'), {'stream': '1'})
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['productos'][0]['nombre'], 'Producto API 1')
+
+    def test_api_products_stream_ndjson(self):
+        """Accept: application/x-ndjson devuelve un producto por línea."""
+        Producto.objects.create(nombre='Producto API 3', precio=Decimal('5.00'))
+        response = self.client.get(
+            reverse('catalog:api_products'), {'fields': 'nombre'},
+            HTTP_ACCEPT='application/x-ndjson',
+        )
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(l) for l in lines],
+                         [{'nombre': 'Producto API 1'}, {'nombre': 'Producto API 3'}])
+
     def test_api_product_detail(self):
         """Verifica que la API devuelva el detalle de un producto específico."""
         response = self.client.get(reverse('catalog:api_product_detail', args=[self.producto1.pk]))
@@ -266,6 +631,1272 @@ class ProductAPITest(TestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class ConditionalGetTest(TestCase):
+    """Pruebas de ETag/Last-Modified sobre las vistas del catálogo."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.producto = Producto.objects.create(nombre='Producto ETag', precio=Decimal('10.00'))
+
+    def test_304_si_el_catalogo_no_cambia(self):
+        """Repetir la petición con If-None-Match devuelve 304."""
+        for name in ('catalog:api_products', 'catalog:product_list', 'catalog:categories', 'catalog:stores'):
+            url = reverse(name)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, name)
+            self.assertIn('Last-Modified', response)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304, name)
+
+    def test_escrituras_cambian_el_etag(self):
+        """Crear una oferta o una reseña invalida el ETag."""
+        url = reverse('catalog:api_product_detail', args=[self.producto.pk])
+        etag = self.client.get(url)['ETag']
+
+        Oferta.objects.create(producto=self.producto, descuento_porcentaje=Decimal('10.00'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['precio_actual'], 9.0)
+
+        etag = response['ETag']
+        User = get_user_model()
+        user = User.objects.create_user(username='etaguser', password='x')
+        Review.objects.create(producto=self.producto, usuario=user, rating=4)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depende_de_la_url(self):
+        """Filtros distintos producen ETag distintos."""
+        url = reverse('catalog:api_products')
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url, {'q': 'x'})['ETag'])
+
+    def test_etag_depende_del_formato_negociado(self):
+        """JSON y NDJSON (por Accept) en la misma URL no comparten ETag."""
+        url = reverse('catalog:api_products')
+        json_response = self.client.get(url)
+        self.assertIn('Accept', json_response['Vary'])
+        ndjson = self.client.get(url, HTTP_ACCEPT='application/x-ndjson', HTTP_IF_NONE_MATCH=json_response['ETag'])
+        self.assertEqual(ndjson.status_code, 200)
+        self.assertNotEqual(ndjson['ETag'], json_response['ETag'])
+        response = self.client.get(url, HTTP_ACCEPT='application/x-ndjson', HTTP_IF_NONE_MATCH=ndjson['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+
+class ListadoCacheTest(TestCase):
+    """Cache de páginas del listado (anónimos) y de tarjetas por producto."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.a = Producto.objects.create(nombre='Alfa', precio=Decimal('10.00'))
+        self.b = Producto.objects.create(nombre='Beta', precio=Decimal('20.00'))
+        self.url = reverse('catalog:product_list')
+
+    def test_pagina_anonima_desde_cache(self):
+        """La segunda visita (mismo querystring normalizado) no consulta productos."""
+        primera = self.client.get(self.url, {'sort': 'name', 'q': ''})
+        self.assertEqual(primera.status_code, 200)
+        self.assertIsNotNone(primera.context)
+        with self.assertNumQueries(1):  # solo la versión del catálogo
+            segunda = Client().get(self.url, {'page': '1'})
+        self.assertIsNone(segunda.context)
+        self.assertContains(segunda, 'Alfa')
+        # Cada visitante recibe su propio token CSRF
+        self.assertNotIn(b'__csrf_token__', segunda.content)
+        self.assertIn('csrftoken', segunda.cookies)
+
+    def test_escritura_cambia_la_pagina(self):
+        """Una oferta nueva cambia la versión del catálogo y la página."""
+        self.assertNotContains(self.client.get(self.url), 'Oferta activa')
+        Oferta.objects.create(producto=self.a, precio_fijo=Decimal('7.50'))
+        self.assertContains(self.client.get(self.url), 'Oferta activa')
+
+    def test_usuario_autenticado_sin_cache_de_pagina(self):
+        User = get_user_model()
+        User.objects.create_user(username='cacheuser', password='x')
+        self.client.login(username='cacheuser', password='x')
+        self.client.get(self.url)
+        self.assertIsNotNone(self.client.get(self.url).context)
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+    def test_tarjetas_invalidadas_por_producto(self):
+        """Una reseña solo cambia la versión de su producto; la tarjeta se vuelve a dibujar."""
+        antes = versiones_productos([self.a.pk, self.b.pk])
+        self.assertEqual(versiones_productos([self.a.pk, self.b.pk]), antes)
+        self.client.get(self.url)
+
+        User = get_user_model()
+        Review.objects.create(producto=self.a, usuario=User.objects.create_user(username='r', password='x'), rating=4)
+        despues = versiones_productos([self.a.pk, self.b.pk])
+        self.assertNotEqual(despues[self.a.pk], antes[self.a.pk])
+        self.assertEqual(despues[self.b.pk], antes[self.b.pk])
+        self.assertContains(self.client.get(self.url), '1 reseñas')
+
+    @override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)
+    def test_tarjeta_sigue_al_precio_sin_senales(self):
+        """Un UPDATE masivo (sin señales) cambia el precio: la clave de la tarjeta también."""
+        self.assertContains(self.client.get(self.url), '20,00')
+        Producto.objects.filter(pk=self.b.pk).update(precio_vigente=Decimal('15.00'))
+        response = self.client.get(self.url)
+        self.assertContains(response, '15,00')
+        self.assertNotContains(response, '20,00')
+
+
+class FacetIndexTest(TestCase):
+    """Pruebas del índice de facetas de categorías y tiendas."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        Producto.objects.create(nombre='A', precio=Decimal('1.00'), categoria='Electrónica', tienda='Tienda Uno')
+        Producto.objects.create(nombre='B', precio=Decimal('1.00'), categoria='Electrónica', tienda='Tienda Uno')
+        Producto.objects.create(nombre='C', precio=Decimal('1.00'), categoria='Hogar', disponible=False)
+
+    def test_conteos_y_slugs(self):
+        """Las facetas cuentan solo disponibles pero resuelven todos los slugs."""
+        index = get_facet_index()
+        self.assertEqual([(c.name, c.slug, c.count) for c in index.categorias], [('Electrónica', 'electronica', 2)])
+        self.assertEqual(index.categoria_por_slug, {'electronica': 'Electrónica', 'hogar': 'Hogar'})
+        self.assertEqual(index.tienda_por_slug, {'tienda-uno': 'Tienda Uno'})
+
+    def test_index_en_cache_hasta_que_cambia_el_catalogo(self):
+        """El índice se reutiliza y se reconstruye al escribir productos."""
+        get_facet_index()
+        with self.assertNumQueries(1):  # solo la lectura de la versión
+            get_facet_index()
+        Producto.objects.create(nombre='D', precio=Decimal('1.00'), categoria='Hogar')
+        self.assertEqual(get_facet_index().categorias[1].count, 1)
+
+    def test_detalle_por_slug(self):
+        """category_detail y store_detail resuelven el slug con el índice."""
+        response = self.client.get(reverse('catalog:category_detail', args=['electronica']))
+        self.assertEqual(response.context['category'], 'Electrónica')
+        self.assertEqual(len(response.context['items']), 2)
+        response = self.client.get(reverse('catalog:store_detail', args=['tienda-uno']))
+        self.assertEqual(response.context['store'], 'Tienda Uno')
+        self.assertEqual(self.client.get(reverse('catalog:store_detail', args=['nada'])).status_code, 404)
+
+
+class CacheEnNivelesTest(TestCase):
+    """LRU local + cache compartido con single-flight (services/cache_tiers.py)."""
+
+    def _familia(self, **kwargs):
+        return CacheFamily(f"test-{uuid.uuid4().hex}", **kwargs)
+
+    def test_lru_vence_y_desaloja(self):
+        lru = LocalLRU(maxsize=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')          # 'b' pasa a ser el menos usado
+        lru.set('c', 3)
+        self.assertIs(lru.get('b'), _MISSING)
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+        vencido = LocalLRU(maxsize=2, ttl=0)
+        vencido.set('a', 1)
+        self.assertIs(vencido.get('a'), _MISSING)
+
+    def test_niveles_y_contadores(self):
+        familia = self._familia()
+        calls = []
+        compute = lambda: calls.append(1) or {'valor': len(calls)}
+        self.assertEqual(familia.get_or_set('k', compute), {'valor': 1})
+        self.assertEqual(familia.get_or_set('k', compute), {'valor': 1})
+        familia.local.clear()  # como otro proceso: solo ve el compartido
+        self.assertEqual(familia.get_or_set('k', compute), {'valor': 1})
+        stats = familia.stats.snapshot()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((stats['misses'], stats['local_hits'], stats['shared_hits']), (1, 1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.667)
+
+    def test_single_flight_entre_hilos(self):
+        """Muchos hilos con la misma clave fría calculan el valor una sola vez."""
+        familia = self._familia()
+        calls = []
+
+        def lento():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(familia.get_or_set('k', lento)))
+                 for _ in range(8)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        self.assertEqual(resultados, [42] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_espera_el_calculo_de_otro_proceso(self):
+        """Si otro proceso tiene la marca, se espera su resultado en vez de recalcular."""
+        familia = self._familia(lock_timeout=2)
+        full = familia._key('k')
+        cache.add(f"{full}:calculando", 1, 2)
+        threading.Timer(0.1, lambda: cache.set(full, 'de otro proceso')).start()
+        self.assertEqual(familia.get_or_set('k', lambda: 'propio'), 'de otro proceso')
+        self.assertEqual(familia.stats.snapshot()['waits'], 1)
+        cache.delete(f"{full}:calculando")
+
+    def test_estadisticas_solo_para_staff(self):
+        url = reverse('catalog:api_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+        self.client.get(reverse('catalog:categories'))
+        families = self.client.get(url).json()['families']
+        self.assertIn('facets', families)
+        self.assertIn('pricing', families)
+
+    def test_backend_de_archivos_recuenta_cada_n_escrituras(self):
+        """El directorio se lista (y se poda) una vez cada CULL_EVERY escrituras."""
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = FileBasedCache(tmp, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2, 'CULL_EVERY': 5}})
+            with mock.patch.object(backend, '_list_cache_files', wraps=backend._list_cache_files) as listar:
+                for i in range(10):
+                    backend.set(f'k{i}', i)
+            self.assertEqual(listar.call_count, 2)
+            self.assertLess(len(os.listdir(tmp)), 10)
+
+    def test_categorias_con_precio_desde(self):
+        """La página de categorías muestra el precio mínimo del resumen en cache."""
+        p = Producto.objects.create(nombre='A', precio=Decimal('30.00'), categoria='Hogar')
+        Producto.objects.create(nombre='B', precio=Decimal('50.00'), categoria='Hogar')
+        Oferta.objects.create(producto=p, descuento_porcentaje=Decimal('50.00'))
+        response = self.client.get(reverse('catalog:categories'))
+        self.assertContains(response, '15,00')
+        self.assertContains(response, '1 en oferta')
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=1, INSTRUMENTATION_SERVER_TIMING=True)
+class InstrumentacionTest(TestCase):
+    """Conteo de consultas, tiempos y Server-Timing por vista."""
+
+    def setUp(self):
+        instrumentation.reiniciar()
+        for i in range(3):
+            Producto.objects.create(nombre=f'Medido {i}', precio=Decimal('10.00'), categoria='Hogar')
+
+    def _server_timing(self, response):
+        partes = dict(p.strip().split(';', 1) for p in response['Server-Timing'].split(','))
+        return partes
+
+    def test_server_timing_y_estadisticas(self):
+        response = self.client.get(reverse('catalog:store_detail', args=['x']))  # 404, igual se mide
+        self.assertIn('Server-Timing', response)
+        response = self.client.get(reverse('catalog:category_detail', args=['hogar']))
+        timing = self._server_timing(response)
+        self.assertIn('queries', timing['db'])
+        self.assertEqual(set(timing), {'db', 'tpl', 'total'})
+
+        get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+        views = self.client.get(reverse('catalog:api_view_stats')).json()['views']
+        stats = views['catalog:category_detail']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries_max'], 0)
+        self.assertGreater(stats['template_ms_avg'], 0)
+        self.assertGreaterEqual(stats['total_ms_p95'], stats['total_ms_p50'])
+
+    async def test_vista_async(self):
+        """Las consultas que corren en hilos de sync_to_async también se cuentan."""
+        response = await AsyncClient().get(reverse('catalog:api_products'))
+        self.assertEqual(response.status_code, 200)
+        consultas = int(self._server_timing(response)['db'].split('"')[1].split()[0])
+        self.assertGreaterEqual(consultas, 2)  # versión del catálogo, COUNT y página
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_sin_muestreo(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('catalog:categories')))
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=False)
+    def test_server_timing_solo_para_staff(self):
+        url = reverse('catalog:categories')
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        self.assertEqual(estadisticas()['catalog:categories']['requests'], 1)  # igual se mide
+        get_user_model().objects.create_user('staff', password='x', is_staff=True)
+        self.client.login(username='staff', password='x')
+        self.assertIn('Server-Timing', self.client.get(url))
+
+    @override_settings(INSTRUMENTATION_SERVER_TIMING=False)
+    async def test_server_timing_solo_para_staff_async(self):
+        response = await AsyncClient().get(reverse('catalog:api_products'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_context_manager(self):
+        with medir('bloque') as m:
+            list(Producto.objects.all())
+            Producto.objects.count()
+        self.assertEqual(m.queries, 2)
+        self.assertEqual(estadisticas()['bloque']['requests'], 1)
+
+
+class BusquedaTest(TestCase):
+    """Pruebas de la búsqueda de texto del parámetro q."""
+
+    def setUp(self):
+        """Configuración inicial para las pruebas."""
+        self.camara = Producto.objects.create(nombre='Cámara réflex', descripcion='Fotografía profesional', precio=Decimal('500.00'))
+        self.funda = Producto.objects.create(nombre='Funda', descripcion='Funda para cámara réflex', precio=Decimal('20.00'))
+        Producto.objects.create(nombre='Laptop', descripcion='Portátil', precio=Decimal('900.00'))
+
+    def _nombres(self, **params):
+        response = self.client.get(reverse('catalog:product_list'), params)
+        return [it['name'] for it in response.context['items']]
+
+    def test_backend_fts(self):
+        """En SQLite se usa el índice FTS5 creado por la migración."""
+        self.assertEqual(get_search_backend().name, 'sqlite_fts5')
+
+    def test_ignora_tildes_y_mayusculas(self):
+        """'CAMARA' encuentra 'Cámara' y 'cámara'."""
+        self.assertEqual(self._nombres(q='CAMARA'), ['Cámara réflex', 'Funda'])
+        self.assertEqual(self._nombres(q='lapt'), ['Laptop'])
+
+    def test_orden_por_relevancia(self):
+        """sort=relevance prioriza coincidencias en el nombre."""
+        self.assertEqual(self._nombres(q='reflex', sort='relevance'), ['Cámara réflex', 'Funda'])
+
+    def test_indice_sigue_las_escrituras(self):
+        """Los triggers mantienen el índice al editar y eliminar."""
+        self.funda.nombre = 'Estuche'
+        self.funda.save()
+        self.assertEqual(self._nombres(q='estuche'), ['Estuche'])
+        self.funda.delete()
+        self.assertEqual(self._nombres(q='estuche'), [])
+
+    def test_api_y_export_usan_busqueda(self):
+        """La API y la exportación aplican la misma búsqueda."""
+        data = self.client.get(reverse('catalog:api_products'), {'q': 'camara'}).json()
+        self.assertEqual(data['total'], 2)
+        response = self.client.get(reverse('catalog:products_export'), {'q': 'camara', 'sort': 'relevance', 'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([l.split(',')[0] for l in lines[1:]], ['Cámara réflex', 'Funda'])
+
+    def test_reconstruir_indice(self):
+        """El comando reconstruye el índice."""
+        self.assertTrue(rebuild_search_index())
+        self.assertEqual(self._nombres(q='fotografia'), ['Cámara réflex'])
+
+
+class _StubPartnerHandler(BaseHTTPRequestHandler):
+    """API aliada falsa: responde server.payload con server.status."""
+
+    def do_GET(self):
+        self.server.hits += 1
+        # server.statuses: respuestas puntuales antes de volver a server.status
+        status = self.server.statuses.pop(0) if self.server.statuses else self.server.status
+        body = json.dumps(self.server.payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubPartnerServerMixin:
+    """Levanta la API aliada falsa en un puerto local para toda la clase."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubPartnerHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/api/productos/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.hits = 0
+        self.server.status = 200
+        self.server.statuses = []
+        self.server.payload = []
+
+
+class AsyncApiTest(TestCase):
+    """Vistas async de la API bajo ASGI (AsyncClient)"""
+
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f"Async {i}", precio=Decimal(10 + i), categoria="Hogar")
+            for i in range(3)
+        ]
+        self.client = AsyncClient()
+
+    async def test_detalle_y_404(self):
+        p = self.productos[0]
+        response = await self.client.get(reverse("catalog:api_product_detail", args=[p.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["nombre"], "Async 0")
+        response = await self.client.get(reverse("catalog:api_product_detail", args=[9999]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_listado_paginado_y_304(self):
+        url = reverse("catalog:api_products")
+        response = await self.client.get(url, {"limit": 2, "q": "async"})
+        data = response.json()
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(len(data["productos"]), 2)
+
+        response = await self.client.get(url, {"limit": 2, "cursor": data["next_cursor"], "q": "async"})
+        self.assertEqual([p["nombre"] for p in response.json()["productos"]], ["Async 2"])
+
+        etag = response["ETag"]
+        response = await self.client.get(url, {"limit": 2, "cursor": data["next_cursor"], "q": "async"},
+                                         headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_export_csv_por_partes(self):
+        """Bajo ASGI el CSV se envía lote por lote, sin leer antes todo el iterador."""
+        leidos = []
+        columnas, lotes = exports.export_plan({})
+
+        def lotes_contados():
+            for lote in lotes:
+                leidos.append(len(lote))
+                yield lote[:1]
+                leidos.append(0)
+                yield lote[1:]
+
+        with mock.patch("catalog.views.export_plan", return_value=(columnas, lotes_contados())):
+            response = await self.client.get(reverse("catalog:products_export"), {"format": "csv"})
+        self.assertTrue(response.is_async)
+        partes = aiter(response.streaming_content)
+        self.assertTrue((await anext(partes)).startswith(b"Nombre"))
+        self.assertEqual(leidos, [])
+        self.assertIn(b"Async 0", await anext(partes))
+        self.assertEqual(leidos, [3])
+        resto = b"".join([parte async for parte in partes]).decode().splitlines()
+        self.assertEqual(len(resto), 2)
+
+    async def test_stream_con_iterador_async(self):
+        response = await self.client.get(reverse("catalog:api_products"), {"format": "ndjson"})
+        self.assertTrue(response.is_async)
+        lineas = b"".join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lineas), 3)
+        self.assertEqual(json.loads(lineas[0])["nombre"], "Async 0")
+
+
+class PartnerCatalogTest(_StubPartnerServerMixin, TestCase):
+    """Copia local del catálogo aliado servida con stale-while-revalidate"""
+
+    def setUp(self):
+        super().setUp()
+        self.server.payload = [
+            {"idProducto": 1, "nombreProducto": "Buzo Azul", "tipoProducto": "buzo",
+             "marcaProducto": "Hans", "precioDeProducto": 80000.0,
+             "imagenProducto": "/media/productos/buzo.webp"},
+            {"idProducto": 2, "nombreProducto": "Camiseta Roja", "tipoProducto": "camiseta",
+             "marcaProducto": "Hans", "precioDeProducto": 30000.0, "imagenProducto": ""},
+            {"idProducto": 3, "nombreProducto": "Buzo Gris", "tipoProducto": "buzo",
+             "marcaProducto": "Otra", "precioDeProducto": 95000.0, "imagenProducto": ""},
+        ]
+        settings_override = override_settings(
+            PARTNER_API_URL=self.url, PARTNER_API_TIMEOUT=2, PARTNER_API_BACKOFF=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+
+    def _names(self, response):
+        return [p["name"] for p in response.context["items"]]
+
+    def test_primer_uso_descarga_y_luego_sirve_local(self):
+        """Sin copia local se descarga una vez; las visitas siguientes no llaman a la API"""
+        response = self.client.get(reverse("catalog:partner_products"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._names(response), ["Buzo Azul", "Buzo Gris", "Camiseta Roja"])
+        self.assertIsNone(response.context["error_message"])
+        self.assertEqual(
+            response.context["items"][0]["image"],
+            f"http://127.0.0.1:{self.server.server_address[1]}/media/productos/buzo.webp",
+        )
+
+        self.client.get(reverse("catalog:partner_products"), {"q": "buzo"})
+        self.assertEqual(self.server.hits, 1)
+
+    async def test_primer_uso_bajo_asgi_descarga_con_cliente_async(self):
+        """Bajo ASGI la descarga inicial usa el cliente async y la vista se renderiza igual"""
+        response = await AsyncClient().get(reverse("catalog:partner_products"), {"sort": "price_asc"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._names(response), ["Camiseta Roja", "Buzo Azul", "Buzo Gris"])
+        self.assertEqual(await ProductoAliado.objects.acount(), 3)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_filtros_orden_y_paginacion_sobre_copia_local(self):
+        partner_catalog.refrescar_catalogo_aliado()
+        url = reverse("catalog:partner_products")
+
+        response = self.client.get(url, {"category": "BUZO", "sort": "price_desc"})
+        self.assertEqual(self._names(response), ["Buzo Gris", "Buzo Azul"])
+        self.assertEqual(response.context["items"][0]["price"], Decimal("95000.00"))
+
+        response = self.client.get(url, {"store": "hans", "max": "50000"})
+        self.assertEqual(self._names(response), ["Camiseta Roja"])
+
+        self.server.payload = [
+            {"idProducto": i, "nombreProducto": f"Producto {i:02d}", "precioDeProducto": i}
+            for i in range(1, 13)
+        ]
+        partner_catalog.refrescar_catalogo_aliado()
+        response = self.client.get(url, {"page": 2})
+        self.assertEqual(len(response.context["items"]), 3)
+        self.assertEqual(ProductoAliado.objects.count(), 12)
+
+    def test_copia_vencida_se_sirve_y_se_renueva_en_segundo_plano(self):
+        partner_catalog.refrescar_catalogo_aliado()
+        SincronizacionAliado.objects.filter(pk=1).update(
+            completada=timezone.now() - timedelta(hours=1), intentada=None,
+        )
+        self.server.payload = [{"idProducto": 9, "nombreProducto": "Nuevo", "precioDeProducto": 1}]
+        hits = self.server.hits
+
+        with mock.patch.object(partner_catalog, "_en_segundo_plano") as en_segundo_plano:
+            response = self.client.get(reverse("catalog:partner_products"))
+            # La respuesta no espera a la API: datos anteriores
+            self.assertEqual(len(response.context["items"]), 3)
+            self.assertEqual(self.server.hits, hits)
+            en_segundo_plano.assert_called_once_with(partner_catalog._refrescar_en_hilo)
+
+            # Mientras dura el turno nadie más lanza otra descarga
+            self.client.get(reverse("catalog:partner_products"))
+            self.assertEqual(en_segundo_plano.call_count, 1)
+
+        partner_catalog.refrescar_catalogo_aliado()
+        response = self.client.get(reverse("catalog:partner_products"))
+        self.assertEqual(self._names(response), ["Nuevo"])
+
+    def test_api_caida_conserva_la_copia_anterior(self):
+        partner_catalog.refrescar_catalogo_aliado()
+        self.server.status = 500
+
+        with self.assertRaises(partner_catalog.PartnerCatalogError):
+            partner_catalog.refrescar_catalogo_aliado()
+        self.assertEqual(ProductoAliado.objects.count(), 3)
+        self.assertIn("Error al conectar", SincronizacionAliado.actual().error)
+
+        response = self.client.get(reverse("catalog:partner_products"))
+        self.assertEqual(len(response.context["items"]), 3)
+        self.assertIsNone(response.context["error_message"])
+
+    def test_feed_vacio_o_irreconocible_conserva_la_copia(self):
+        """Un feed vacío, con otra clave o con casi todas las filas inválidas no borra la copia local."""
+        partner_catalog.refrescar_catalogo_aliado()
+        for payload in ({}, {"productos": self.server.payload}, [], {"results": []},
+                        [{"idProducto": 1, "nombreProducto": "Ok", "precioDeProducto": 1},
+                         {"nombreProducto": "Sin id"}, {"nombreProducto": "Sin id 2"}]):
+            self.server.payload = payload
+            with self.assertRaises(partner_catalog.PartnerCatalogError, msg=payload):
+                partner_catalog.refrescar_catalogo_aliado()
+            self.assertEqual(ProductoAliado.objects.count(), 3, payload)
+        sync = SincronizacionAliado.actual()
+        self.assertEqual(sync.total, 3)
+        self.assertIn("no son válidas", sync.error)
+
+    def test_error_de_la_base_al_guardar_se_informa(self):
+        """Un DatabaseError al guardar se registra y no llega como 500."""
+        with mock.patch.object(ProductoAliado.objects, "bulk_create", side_effect=DataError("valor muy largo")):
+            response = self.client.get(reverse("catalog:partner_products"))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("No se pudo guardar", response.context["error_message"])
+            self.assertIn("valor muy largo", SincronizacionAliado.actual().error)
+            with self.assertRaises(partner_catalog.PartnerCatalogError):
+                partner_catalog.refrescar_catalogo_aliado()
+        self.assertEqual(ProductoAliado.objects.count(), 0)
+
+    def test_api_caida_sin_copia_muestra_error(self):
+        self.server.status = 500
+        response = self.client.get(reverse("catalog:partner_products"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["items"], [])
+        self.assertIn("Error al conectar", response.context["error_message"])
+
+    def test_esquema_configurable(self):
+        self.server.payload = {"results": [{"sku": "X1", "title": "Lámpara", "cost": "15"}]}
+        schema = {
+            "id_externo": {"origenes": ["sku"], "tipo": "id", "requerido": True},
+            "nombre": {"origenes": ["title"]},
+            "precio": {"origenes": ["cost"], "tipo": "decimal"},
+        }
+        with override_settings(PARTNER_API_SCHEMA=schema):
+            partner_catalog.refrescar_catalogo_aliado()
+        producto = ProductoAliado.objects.get()
+        self.assertEqual((producto.id_externo, producto.nombre, producto.precio), ("X1", "Lámpara", Decimal("15.00")))
+
+    def test_comando_sincronizar_aliados(self):
+        call_command("sincronizar_aliados", stdout=open(os.devnull, "w"))
+        self.assertEqual(ProductoAliado.objects.count(), 3)
+        self.assertIsNotNone(SincronizacionAliado.actual().completada)
+
+
+class PartnerSchemaTest(TestCase):
+    """Mapeo declarativo de feeds aliados"""
+
+    def test_detecta_las_claves_del_feed(self):
+        filas = [
+            {"id": 1, "name": "Mouse", "price": "10.5", "image": "/m.png"},
+            {"id": 2, "name": "Teclado", "price": 20},
+        ]
+        extractor = ESQUEMA_POR_DEFECTO.compilar(set().union(*filas), "http://aliado.test/api/")
+        self.assertEqual(extractor.claves["nombre"], "name")
+        self.assertEqual(extractor.claves["precio"], "price")
+        self.assertIsNone(extractor.claves["tienda"])
+
+        resultado = extractor.normalizar(filas)
+        self.assertEqual(resultado.errores, [])
+        self.assertEqual(resultado.filas[0]["id_externo"], "1")
+        self.assertEqual(resultado.filas[0]["precio"], Decimal("10.50"))
+        self.assertEqual(resultado.filas[0]["imagen"], "http://aliado.test/m.png")
+        self.assertEqual(resultado.filas[1]["imagen"], "")
+
+    def test_fila_con_otro_formato_usa_las_alternativas(self):
+        resultado = ESQUEMA_POR_DEFECTO.normalizar([
+            {"idProducto": 1, "nombreProducto": "Buzo", "precioDeProducto": 80000.0},
+            {"id": 2, "nombre": "Gorra", "precio": 0.1},
+        ])
+        self.assertEqual([f["nombre"] for f in resultado.filas], ["Buzo", "Gorra"])
+        self.assertEqual(resultado.filas[1]["precio"], Decimal("0.10"))
+
+    def test_errores_por_fila(self):
+        resultado = ESQUEMA_POR_DEFECTO.normalizar([
+            {"id": 1, "name": "Bien", "price": 5},
+            {"name": "Sin id", "price": 5},
+            {"id": 3, "name": "Precio malo", "price": "abc"},
+            "no soy un objeto",
+        ])
+        self.assertEqual([f["nombre"] for f in resultado.filas], ["Bien", "Precio malo"])
+        self.assertEqual(resultado.filas[1]["precio"], Decimal("0.00"))
+        self.assertEqual(
+            [(e.indice, e.campo) for e in resultado.errores],
+            [(1, "id_externo"), (2, "precio"), (3, "*")],
+        )
+
+    def test_limites_de_las_columnas(self):
+        """Valores que no entran en ProductoAliado se informan por fila, sin romper el feed."""
+        resultado = ESQUEMA_POR_DEFECTO.normalizar([
+            {"id": "x" * 65, "name": "Id largo"},
+            {"id": 2, "name": "N" * 250, "price": "10000000000", "image": "http://a.test/" + "i" * 500},
+            {"id": 3, "name": "Bien", "price": "9999999999.99"},
+        ])
+        self.assertEqual([f["id_externo"] for f in resultado.filas], ["2", "3"])
+        recortado = resultado.filas[0]
+        self.assertEqual((len(recortado["nombre"]), recortado["precio"], recortado["imagen"]),
+                         (200, Decimal("0.00"), ""))
+        self.assertEqual(resultado.filas[1]["precio"], Decimal("9999999999.99"))
+        self.assertEqual(
+            [(e.indice, e.campo) for e in resultado.errores],
+            [(0, "id_externo"), (1, "nombre"), (1, "precio"), (1, "imagen")],
+        )
+
+    def test_esquema_desde_config(self):
+        esquema = esquema_desde_config({
+            "id_externo": {"origenes": ["sku"], "tipo": "id", "requerido": True},
+            "nombre": {"origenes": ["title"]},
+            "precio": {"origenes": ["amount"], "tipo": "decimal", "defecto": Decimal("0")},
+        })
+        resultado = esquema.normalizar([{"sku": "A-1", "title": "Silla", "amount": "99.999"}])
+        self.assertEqual(resultado.filas, [{"id_externo": "A-1", "nombre": "Silla", "precio": Decimal("100.00")}])
+        with self.assertRaises(ValueError):
+            esquema_desde_config({"nombre": {"origenes": ["x"], "tipo": "fecha"}})
+
+
+class PartnerClientTest(_StubPartnerServerMixin, TestCase):
+    """Cliente de la API aliada: reintentos, circuit breaker y contadores"""
+
+    def setUp(self):
+        super().setUp()
+        self.server.payload = [{"idProducto": 1}]
+        self.now = 1000.0
+        self.sleeps = []
+        self.client_api = PartnerClient(
+            timeout=2, max_retries=2, backoff=0.5, backoff_max=1.0,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=lambda: self.now),
+            sleep=self.sleeps.append, asleep=self._asleep,
+        )
+        self.addCleanup(self.client_api.close)
+
+    async def _asleep(self, segundos):
+        self.sleeps.append(segundos)
+
+    def test_reintenta_errores_transitorios_con_backoff(self):
+        self.server.statuses = [503, 502]
+        response = self.client_api.get_json(self.url)
+        self.assertEqual(response.data, [{"idProducto": 1}])
+        self.assertEqual(self.server.hits, 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(all(0 <= s <= 1.0 for s in self.sleeps))
+
+        stats = self.client_api.stats.snapshot()
+        self.assertEqual((stats["requests"], stats["retries"], stats["successes"]), (3, 2, 1))
+        self.assertIsNotNone(stats["latency_avg_ms"])
+
+    async def test_aget_json_reintenta_y_comparte_el_circuito(self):
+        self.server.statuses = [503]
+        response = await self.client_api.aget_json(self.url)
+        self.assertEqual(response.data, [{"idProducto": 1}])
+        self.assertEqual((self.server.hits, len(self.sleeps)), (2, 1))
+
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(PartnerAPIError):
+                await self.client_api.aget_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.OPEN)
+        # Circuito abierto: la versión sync también falla sin llamar
+        hits = self.server.hits
+        with self.assertRaises(CircuitOpenError):
+            self.client_api.get_json(self.url)
+        self.assertEqual(self.server.hits, hits)
+
+    async def test_aget_json_reutiliza_el_cliente_del_loop(self):
+        await self.client_api.aget_json(self.url)
+        aclient = self.client_api._aclient()
+        await self.client_api.aget_json(self.url)
+        self.assertIs(self.client_api._aclient(), aclient)
+        self.assertEqual(self.server.hits, 2)
+        self.client_api.close()  # desde este loop: agenda el aclose()
+        for _ in range(50):
+            if aclient.is_closed:
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(aclient.is_closed)
+
+    def test_no_reintenta_errores_del_cliente(self):
+        self.server.status = 404
+        with self.assertRaises(PartnerAPIError):
+            self.client_api.get_json(self.url)
+        self.assertEqual(self.server.hits, 1)
+
+    def test_cierra_el_cliente_async_al_apagar_el_loop(self):
+        """asyncio.run cierra el AsyncClient de su loop antes de cerrarlo."""
+        async def pedir():
+            await self.client_api.aget_json(self.url)
+            return self.client_api._aclient()
+
+        aclient = asyncio.run(pedir())
+        self.assertTrue(aclient.is_closed)
+        self.assertEqual(self.client_api._aclients, {})
+
+    async def test_errores_del_cliente_no_abren_el_circuito(self):
+        """Un 4xx es del pedido: no cuenta para el circuito y cierra el semiabierto."""
+        self.server.status = 404
+        for _ in range(3):
+            with self.assertRaises(PartnerAPIError):
+                self.client_api.get_json(self.url)
+            with self.assertRaises(PartnerAPIError):
+                await self.client_api.aget_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.CLOSED)
+        stats = self.client_api.stats.snapshot()
+        self.assertEqual(stats["failures"], 6)
+        self.assertIn("404", stats["last_error"])
+
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(PartnerAPIError):
+                self.client_api.get_json(self.url)
+        self.now += 31
+        self.server.status = 404
+        with self.assertRaises(PartnerAPIError):
+            self.client_api.get_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_circuito_abierto_falla_rapido(self):
+        self.client_api.get_json(self.url)
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(PartnerAPIError):
+                self.client_api.get_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.OPEN)
+
+        hits = self.server.hits
+        for _ in range(2):
+            with self.assertRaises(CircuitOpenError):
+                self.client_api.get_json(self.url)
+        self.assertEqual(self.server.hits, hits)
+
+        stats = self.client_api.stats.snapshot()
+        self.assertEqual((stats["failures"], stats["short_circuited"]), (2, 2))
+
+    def test_circuito_semiabierto_se_cierra_con_una_prueba_exitosa(self):
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(PartnerAPIError):
+                self.client_api.get_json(self.url)
+
+        self.now += 31
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.server.status = 200
+        self.client_api.get_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_prueba_fallida_en_semiabierto_reabre_el_circuito(self):
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(PartnerAPIError):
+                self.client_api.get_json(self.url)
+        self.now += 31
+        with self.assertRaises(PartnerAPIError):
+            self.client_api.get_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.OPEN)
+
+    def test_prueba_interrumpida_en_semiabierto_reabre_el_circuito(self):
+        self.server.status = 500
+        for _ in range(2):
+            with self.assertRaises(PartnerAPIError):
+                self.client_api.get_json(self.url)
+        self.now += 31
+        with mock.patch.object(self.client_api, "_fetch", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.client_api.get_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.OPEN)
+        self.now += 31
+        self.server.status = 200
+        self.client_api.get_json(self.url)
+        self.assertEqual(self.client_api.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_catalogo_aliado_informa_circuito_abierto(self):
+        with override_settings(PARTNER_API_URL=self.url, PARTNER_API_BACKOFF=0, PARTNER_CIRCUIT_THRESHOLD=1):
+            self.server.status = 500
+            with self.assertRaises(partner_catalog.PartnerCatalogError):
+                partner_catalog.refrescar_catalogo_aliado()
+            with self.assertRaises(partner_catalog.PartnerCatalogError):
+                partner_catalog.refrescar_catalogo_aliado()
+            self.assertIn("no está disponible", SincronizacionAliado.actual().error)
+            self.assertEqual(self.server.hits, 3)
+
+    def test_estado_solo_para_staff(self):
+        url = reverse("catalog:api_partner_status")
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        get_user_model().objects.create_user("staff", password="x", is_staff=True)
+        self.client.login(username="staff", password="x")
+        data = self.client.get(url).json()
+        self.assertEqual(data["circuit"], "closed")
+        self.assertIn("latency_avg_ms", data["stats"])
+        self.assertIsNone(data["sync"]["completed_at"])
+
+
+class _FuenteFalsa:
+    def __init__(self, nombre, items, demora=0, error=None):
+        self.nombre, self.items, self.demora, self.error = nombre, items, demora, error
+
+    def buscar(self, params):
+        time.sleep(self.demora)
+        if self.error:
+            raise self.error
+        return [dict(item, fuente=self.nombre) for item in self.items][:params.limit]
+
+
+def _item(nombre, precio, rating=None, count=0):
+    return {"id": nombre, "nombre": nombre, "precio": Decimal(precio), "rating_avg": rating, "rating_count": count}
+
+
+@override_settings(UNIFIED_SEARCH_DEADLINES={"lenta": 0.2}, UNIFIED_SEARCH_DEFAULT_DEADLINE=2.0)
+class BusquedaUnificadaTest(TestCase):
+    """Merge de fuentes concurrentes con plazo por fuente"""
+
+    def test_merge_por_precio_de_fuentes_ordenadas(self):
+        a = _FuenteFalsa("a", [_item("A1", "5"), _item("A2", "20"), _item("A3", "30")])
+        b = _FuenteFalsa("b", [_item("B1", "10"), _item("B2", "25")])
+        resultado = buscar_unificado(ParametrosBusqueda(sort="price_asc", limit=4), [a, b])
+        self.assertEqual([r["nombre"] for r in resultado.resultados], ["A1", "B1", "A2", "B2"])
+        self.assertEqual(resultado.fuentes["a"].count, 3)
+
+        resultado = buscar_unificado(ParametrosBusqueda(sort="price_desc"), [
+            _FuenteFalsa("a", [_item("A3", "30"), _item("A1", "5")]),
+            _FuenteFalsa("b", [_item("B2", "25"), _item("B1", "10")]),
+        ])
+        self.assertEqual([r["nombre"] for r in resultado.resultados], ["A3", "B2", "B1", "A1"])
+
+    def test_rating_sin_puntuar_al_final(self):
+        resultado = buscar_unificado(ParametrosBusqueda(sort="rating"), [
+            _FuenteFalsa("a", [_item("Top", "1", 4.5, 3), _item("Medio", "1", 3.0, 1)]),
+            _FuenteFalsa("b", [_item("Aliado", "1")]),
+        ])
+        self.assertEqual([r["nombre"] for r in resultado.resultados], ["Top", "Medio", "Aliado"])
+
+    def test_fuente_lenta_no_retrasa_la_respuesta(self):
+        rapida = _FuenteFalsa("rapida", [_item("R", "1")])
+        lenta = _FuenteFalsa("lenta", [_item("L", "2")], demora=1.0)
+        inicio = time.monotonic()
+        resultado = buscar_unificado(ParametrosBusqueda(), [rapida, lenta])
+        self.assertLess(time.monotonic() - inicio, 0.9)
+        self.assertEqual([r["nombre"] for r in resultado.resultados], ["R"])
+        self.assertEqual(resultado.fuentes["lenta"].status, "timeout")
+        self.assertEqual(resultado.fuentes["rapida"].status, "ok")
+
+    def test_merge_por_nombre_con_la_misma_clave_que_casefold(self):
+        # Orden de Lower() en SQLite: no baja las mayúsculas acentuadas
+        resultado = buscar_unificado(ParametrosBusqueda(sort="name"), [
+            _FuenteFalsa("a", [_item("Ésimo", "1"), _item("éclair", "1")]),
+            _FuenteFalsa("b", [_item("élite", "1"), _item("Zeta", "1")]),
+        ])
+        self.assertEqual([r["nombre"] for r in resultado.resultados], ["Zeta", "éclair", "élite", "Ésimo"])
+
+    @override_settings(UNIFIED_SEARCH_DEADLINES={"colgada": 0.1}, UNIFIED_SEARCH_MAX_IN_FLIGHT=1)
+    def test_fuente_colgada_no_acumula_hilos(self):
+        colgada = _FuenteFalsa("colgada", [_item("C", "1")], demora=0.5)
+        rapida = _FuenteFalsa("rapida", [_item("R", "1")])
+        self.assertEqual(buscar_unificado(ParametrosBusqueda(), [colgada, rapida]).fuentes["colgada"].status, "timeout")
+        resultado = buscar_unificado(ParametrosBusqueda(), [colgada, rapida])
+        self.assertEqual(resultado.fuentes["colgada"].status, "busy")
+        self.assertEqual([r["nombre"] for r in resultado.resultados], ["R"])
+        time.sleep(0.6)  # terminó la consulta vencida: se libera su lugar
+        resultado = buscar_unificado(ParametrosBusqueda(), [_FuenteFalsa("colgada", [_item("C", "1")]), rapida])
+        self.assertEqual(resultado.fuentes["colgada"].status, "ok")
+
+    def test_error_de_una_fuente_se_informa(self):
+        resultado = buscar_unificado(ParametrosBusqueda(), [
+            _FuenteFalsa("a", [_item("A", "1")]),
+            _FuenteFalsa("b", [], error=RuntimeError("caída")),
+        ])
+        self.assertEqual(len(resultado.resultados), 1)
+        self.assertEqual((resultado.fuentes["b"].status, resultado.fuentes["b"].error), ("error", "caída"))
+
+
+class ApiSearchTest(TransactionTestCase):
+    """/api/search/ combina productos propios y aliados (las fuentes corren en otros hilos)"""
+
+    def setUp(self):
+        Producto.objects.create(nombre="Buzo local", precio=Decimal("50.00"), categoria="Ropa")
+        Producto.objects.create(nombre="Gorra local", precio=Decimal("15.00"), categoria="Ropa")
+        ProductoAliado.objects.create(id_externo="7", nombre="Buzo aliado", precio=Decimal("30.00"), categoria="ropa")
+        SincronizacionAliado.objects.create(pk=1, completada=timezone.now())
+
+    def test_resultados_combinados_y_estado_por_fuente(self):
+        response = self.client.get(reverse("catalog:api_search"), {"q": "buzo", "sort": "price_asc"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [(p["fuente"], p["nombre"], p["precio"]) for p in data["productos"]],
+            [("aliado", "Buzo aliado", 30.0), ("local", "Buzo local", 50.0)],
+        )
+        self.assertEqual(data["fuentes"]["local"]["status"], "ok")
+        self.assertEqual(data["fuentes"]["aliado"]["count"], 1)
+        self.assertTrue(data["productos"][1]["detail_url"].startswith("http://testserver/"))
+
+    def test_filtra_fuentes(self):
+        data = self.client.get(reverse("catalog:api_search"), {"category": "ropa", "sources": "local"}).json()
+        self.assertEqual(list(data["fuentes"]), ["local"])
+        self.assertEqual([p["nombre"] for p in data["productos"]], ["Buzo local", "Gorra local"])
+
+        response = self.client.get(reverse("catalog:api_search"), {"sources": "local,otra"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ReportRendererTest(TestCase):
+    """Interfaz incremental de los renderers (begin / write_rows / finish)"""
+
+    columns = [
+        ReportColumn("Nombre", "nombre"),
+        ReportColumn("Precio", "precio", fmt=lambda v: f"{v:.2f}", number_format="0.00", align="right"),
+    ]
+
+    def _lotes(self, n, size=100):
+        filas = [{"nombre": f"P{i}", "precio": Decimal(i) / 4} for i in range(n)]
+        return [filas[i:i + size] for i in range(0, n, size)]
+
+    def test_renderer_incompleto_falla_al_crearlo(self):
+        class SinFinish(BaseRenderer):
+            def begin(self, title, columns):
+                pass
+
+            def write_rows(self, rows):
+                pass
+
+        with self.assertRaises(TypeError):
+            SinFinish()
+
+    def test_csv_por_lotes_y_stream_coinciden(self):
+        renderer = CSVRenderer()
+        renderer.begin("t", self.columns)
+        for lote in self._lotes(250):
+            renderer.write_rows(lote)
+        with renderer.finish() as out:
+            contenido = out.read().decode("utf-8")
+        self.assertEqual(renderer.rows_written, 250)
+        self.assertEqual(contenido, "".join(CSVRenderer().stream("t", self.columns, self._lotes(250))))
+        self.assertEqual(contenido.splitlines()[:2], ["Nombre,Precio", "P0,0.00"])
+
+    def test_excel_write_only(self):
+        import openpyxl
+        renderer = DefaultReportFactory.for_format("xlsx")
+        self.assertIsInstance(renderer, ExcelRenderer)
+        renderer.begin("t", self.columns)
+        for lote in self._lotes(250):
+            renderer.write_rows(lote)
+        rows = list(openpyxl.load_workbook(renderer.finish(), read_only=True)["Productos"].values)
+        self.assertEqual(len(rows), 251)
+        self.assertEqual(rows[2], ("P1", 0.25))
+
+    def test_pdf_y_render_compatible(self):
+        contenido = PDFRenderer().render("Título", self.columns, self._lotes(120, size=120)[0])
+        self.assertTrue(contenido.startswith(b"%PDF"))
+        self.assertIsInstance(DefaultReportFactory.for_format("otro"), CSVRenderer)
+
+
+class ParallelPDFTest(TestCase):
+    """PDF dibujado por bloques de páginas en un pool de procesos"""
+
+    def test_mismo_documento_que_el_secuencial(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+        from pypdf import PdfReader
+
+        columns = [
+            ReportColumn("Nombre", "nombre", width=200),
+            ReportColumn("Precio", "precio", fmt=lambda v: f"{v:.2f}", align="right"),
+        ]
+        filas = [{"nombre": f"Producto {i:04d}", "precio": i / 3} for i in range(300)]
+
+        secuencial = PDFRenderer().render("Título", columns, filas)
+        with ProcessPoolExecutor(max_workers=2, mp_context=get_context("spawn")) as pool:
+            renderer = ParallelPDFRenderer(pool, pages_per_chunk=2, max_pending=1)
+            renderer.begin("Título", columns)
+            for i in range(0, len(filas), 70):
+                renderer.write_rows(filas[i:i + 70])
+            paralelo = renderer.finish().read()
+        self.assertEqual(renderer.rows_written, 300)
+
+        paginas_sec = [p.extract_text() for p in PdfReader(BytesIO(secuencial)).pages]
+        paginas_par = [p.extract_text() for p in PdfReader(BytesIO(paralelo)).pages]
+        self.assertGreater(len(paginas_sec), 4)
+        self.assertEqual(paginas_par, paginas_sec)
+
+    def test_se_usa_desde_el_umbral(self):
+        for i in range(3):
+            Producto.objects.create(nombre=f"P{i}", precio=Decimal("1.00"))
+        with override_settings(REPORT_PDF_PROCESSES=2, REPORT_PDF_PARALLEL_MIN_ROWS=3):
+            self.assertIsInstance(exports._renderer_for_export("pdf", {}), ParallelPDFRenderer)
+            self.assertNotIsInstance(exports._renderer_for_export("pdf", {"q": "P1"}), ParallelPDFRenderer)
+            self.assertNotIsInstance(exports._renderer_for_export("pdf", {"mode": "summary"}), ParallelPDFRenderer)
+        with override_settings(REPORT_PDF_PROCESSES=1, REPORT_PDF_PARALLEL_MIN_ROWS=3):
+            self.assertNotIsInstance(exports._renderer_for_export("pdf", {}), ParallelPDFRenderer)
+
+
+class ColumnarExportTest(TestCase):
+    """Exportación Parquet / Arrow con columnas tipadas"""
+
+    def setUp(self):
+        self.producto = Producto.objects.create(
+            nombre='Camisa', precio=Decimal('80.00'), categoria='Ropa', tienda='Uno',
+        )
+        Oferta.objects.create(producto=self.producto, descuento_porcentaje=Decimal('25.00'))
+        Producto.objects.create(nombre='Gratis', precio=Decimal('0.00'), categoria='Hogar', tienda='Dos')
+
+    def test_parquet_tipado(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        export = ParquetExport(batch_size=1)  # un row group por producto
+        tabla = pq.read_table(export.build({}, "Reporte"))
+        self.assertEqual(export.rows_written, 2)
+        self.assertEqual(tabla.schema.field('precio').type, pa.decimal128(12, 2))
+        self.assertEqual(tabla.schema.field('rating_count').type, pa.int64())
+        self.assertEqual(tabla.schema.field('creado').type, pa.timestamp('us', tz='UTC'))
+        self.assertEqual(tabla.schema.metadata[b'title'], b'Reporte')
+        filas = tabla.to_pylist()
+        self.assertEqual([f['nombre'] for f in filas], ['Camisa', 'Gratis'])
+        self.assertEqual(filas[0]['precio_vigente'], Decimal('60.00'))
+        self.assertEqual(filas[0]['descuento'], Decimal('20.00'))
+        self.assertEqual(filas[0]['descuento_pct'], 25.0)
+        self.assertIsNone(filas[1]['descuento_pct'])  # precio base 0
+        self.assertEqual(filas[0]['creado'], self.producto.creado)
+
+    def test_arrow_con_filtros(self):
+        import pyarrow as pa
+
+        out, filas = build_export('arrow', {'store': 'dos'}, 't')
+        tabla = pa.ipc.open_file(out).read_all()
+        self.assertEqual(filas, 1)
+        self.assertEqual(tabla.column('categoria').to_pylist(), ['Hogar'])
+
+
+class _MediaTemporalMixin:
+    """MEDIA_ROOT en un directorio temporal y sin workers en segundo plano."""
+    workers = 0
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name, EXPORT_WORKERS=self.workers)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ExportJobTest(_MediaTemporalMixin, TestCase):
+    """Exportaciones en segundo plano: cola, reutilización, límites y descarga"""
+
+    def setUp(self):
+        super().setUp()
+        Producto.objects.create(nombre="Lámpara", precio=Decimal("30.00"), categoria="Hogar")
+        Producto.objects.create(nombre="Balón", precio=Decimal("20.00"), categoria="Deportes")
+        self.url = reverse("catalog:products_export_jobs")
+
+    def test_encolar_procesar_y_descargar(self):
+        response = self.client.post(self.url, {"format": "csv", "category": "hogar", "page": "3"})
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual((data["status"], data["reused"]), ("pending", False))
+        self.assertEqual(data["filters"], {"category": "hogar"})
+        self.assertIsNone(data["download_url"])
+
+        download = reverse("catalog:products_export_job_download", args=[data["id"]])
+        self.assertEqual(self.client.get(download).status_code, 409)
+
+        self.assertEqual(export_jobs.process_pending(), 1)
+        data = self.client.get(data["status_url"]).json()
+        self.assertEqual((data["status"], data["rows"]), ("done", 1))
+
+        response = self.client.get(data["download_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("attachment", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(lines[1:], ["Lámpara,Hogar,,30.00,,0"])
+
+    def test_pdf(self):
+        job, _ = export_jobs.submit_export("pdf", {})
+        export_jobs.process_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.filas), (ExportJob.STATUS_DONE, 2))
+        with job.archivo.open("rb") as f:
+            self.assertTrue(f.read().startswith(b"%PDF"))
+
+    def test_reutiliza_exportaciones_iguales_y_recientes(self):
+        job, reused = export_jobs.submit_export("csv", {"category": "Hogar", "sort": "name"})
+        self.assertFalse(reused)
+        # En curso: el mismo trabajo, sin importar el orden de los parámetros
+        again, reused = export_jobs.submit_export("csv", {"sort": "name", "category": "Hogar", "q": " "})
+        self.assertEqual((again.pk, reused), (job.pk, True))
+        export_jobs.process_pending()
+        self.assertEqual(export_jobs.submit_export("csv", {"sort": "name", "category": "Hogar"})[0].pk, job.pk)
+
+        # Otro formato, otros filtros o un catálogo que cambió: trabajo nuevo
+        self.assertNotEqual(export_jobs.submit_export("pdf", {"category": "Hogar", "sort": "name"})[0].pk, job.pk)
+        self.assertNotEqual(export_jobs.submit_export("csv", {"category": "Deportes"})[0].pk, job.pk)
+        resumen, _ = export_jobs.submit_export("csv", {"category": "Hogar", "sort": "name", "mode": "summary"})
+        self.assertEqual((resumen.filtros["mode"], resumen.filtros["group"]), ("summary", "category"))
+        self.assertNotEqual(resumen.pk, job.pk)
+        Producto.objects.create(nombre="Silla", precio=Decimal("50.00"), categoria="Hogar")
+        self.assertNotEqual(export_jobs.submit_export("csv", {"category": "Hogar", "sort": "name"})[0].pk, job.pk)
+
+        # Pasado EXPORT_REUSE_SECONDS tampoco se reutiliza
+        with override_settings(EXPORT_REUSE_SECONDS=0):
+            export_jobs.process_pending()
+            self.assertFalse(export_jobs.submit_export("csv", {"category": "Deportes"})[1])
+
+    def test_limite_de_exportaciones_simultaneas(self):
+        ExportJob.objects.create(formato="csv", clave="x", status=ExportJob.STATUS_RUNNING, iniciado=timezone.now())
+        export_jobs.submit_export("csv", {})
+        with override_settings(EXPORT_MAX_RUNNING=1):
+            self.assertEqual(export_jobs.process_pending(), 0)
+        self.assertEqual(export_jobs.process_pending(), 1)
+
+    @override_settings(EXPORT_MAX_PENDING_ANONYMOUS=1, EXPORT_MAX_PENDING_PER_USER=1)
+    def test_limite_de_pendientes(self):
+        """Con demasiados pendientes la API responde 429; un reutilizable sigue saliendo."""
+        self.assertEqual(self.client.post(self.url, {"format": "csv"}).status_code, 202)
+        response = self.client.post(self.url, {"format": "pdf"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.assertTrue(self.client.post(self.url, {"format": "csv"}).json()["reused"])
+
+        # Los anónimos no ocupan el cupo de cada usuario
+        user = get_user_model().objects.create_user(username="exporta", password="x")
+        job, _ = export_jobs.submit_export("pdf", {}, user)
+        self.assertEqual(job.usuario, user)
+        with self.assertRaises(export_jobs.ExportQueueFull):
+            export_jobs.submit_export("xlsx", {}, user)
+
+        export_jobs.process_pending()
+        self.assertEqual(self.client.post(self.url, {"format": "pdf"}).status_code, 202)
+
+    def test_colgadas_y_limpieza(self):
+        hace_un_dia = timezone.now() - timedelta(days=1)
+        colgada = ExportJob.objects.create(formato="csv", clave="x", status=ExportJob.STATUS_RUNNING, iniciado=hace_un_dia)
+        job, _ = export_jobs.submit_export("csv", {})
+        export_jobs.process_pending()
+        ExportJob.objects.filter(pk=job.pk).update(creado=hace_un_dia - timedelta(days=1))
+        job.refresh_from_db()
+        path = job.archivo.path
+        self.assertTrue(os.path.exists(path))
+
+        call_command("procesar_exportaciones", stdout=open(os.devnull, "w"))
+        colgada.refresh_from_db()
+        self.assertEqual(colgada.status, ExportJob.STATUS_FAILED)
+        self.assertFalse(ExportJob.objects.filter(pk=job.pk).exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_colgada_no_ocupa_lugar_ni_se_reutiliza(self):
+        """Un trabajo en curso de un worker caído se marca fallido al tomar o pedir trabajos."""
+        hace_un_dia = timezone.now() - timedelta(days=1)
+        job, _ = export_jobs.submit_export("csv", {})
+        ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.STATUS_RUNNING, iniciado=hace_un_dia)
+        nuevo, reused = export_jobs.submit_export("csv", {})
+        self.assertFalse(reused)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ExportJob.STATUS_FAILED)
+
+        ExportJob.objects.filter(pk=job.pk).update(status=ExportJob.STATUS_RUNNING, iniciado=hace_un_dia)
+        with override_settings(EXPORT_MAX_RUNNING=1):
+            self.assertEqual(export_jobs.process_pending(), 1)
+        nuevo.refresh_from_db()
+        self.assertEqual(nuevo.status, ExportJob.STATUS_DONE)
+
+    def test_tomar_trabajos_borra_los_viejos(self):
+        viejo = ExportJob.objects.create(formato="csv", clave="x", status=ExportJob.STATUS_DONE)
+        ExportJob.objects.filter(pk=viejo.pk).update(creado=timezone.now() - timedelta(days=2))
+        with mock.patch.object(export_jobs, "_last_purge", None):
+            export_jobs.process_pending()
+            self.assertFalse(ExportJob.objects.filter(pk=viejo.pk).exists())
+
+    def test_clientes_sin_token_csrf(self):
+        """Un cliente de la API (sin cookie CSRF) puede encolar; la sesión sin token no se asocia."""
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(self.url, {"format": "csv"})
+        self.assertEqual(response.status_code, 202)
+
+        get_user_model().objects.create_user("exportador", password="x")
+        client.login(username="exportador", password="x")
+        response = client.post(self.url, {"format": "csv", "category": "hogar"})
+        self.assertEqual(response.status_code, 202)
+        self.assertIsNone(ExportJob.objects.get(pk=response.json()["id"]).usuario)
+
+        client.get(reverse("catalog:product_list"))  # deja la cookie csrftoken
+        token = client.cookies["csrftoken"].value
+        response = client.post(self.url, {"format": "csv", "category": "deportes"}, headers={"X-CSRFToken": token})
+        self.assertEqual(ExportJob.objects.get(pk=response.json()["id"]).usuario.username, "exportador")
+
+    def test_errores_de_la_api(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(self.client.post(self.url, {"format": "docx"}).status_code, 400)
+
+
+class ExportJobWorkerTest(_MediaTemporalMixin, TransactionTestCase):
+    """El pool local procesa la cola sin que nadie llame a process_pending"""
+    workers = 1
+
+    def test_worker_en_segundo_plano(self):
+        Producto.objects.create(nombre="Lámpara", precio=Decimal("30.00"))
+        data = self.client.post(reverse("catalog:products_export_jobs"), {"format": "csv"}).json()
+        for _ in range(100):
+            data = self.client.get(data["status_url"]).json()
+            if data["status"] == "done":
+                break
+            time.sleep(0.05)
+        self.assertEqual((data["status"], data["rows"]), ("done", 1))
+        # Que el worker termine antes de que el test vacíe las tablas
+        while export_jobs._active:
+            time.sleep(0.01)
+
+
 class ViewsTest(TestCase):
     """Pruebas para las vistas principales."""
 
@@ -315,6 +1946,61 @@ class ViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'catalog/stores.html')
 
+    def test_export_csv_streaming(self):
+        """La exportación CSV se envía por partes con los filtros aplicados."""
+        Producto.objects.create(nombre='Otro', precio=Decimal('5.00'), categoria='Otra')
+        response = self.client.get(reverse('catalog:products_export'), {'category': 'TestCategoria', 'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'Nombre,Categoría,Tienda,Precio vigente,Rating prom.,N° reseñas')
+        self.assertEqual(lines[1:], ['Producto Vista,TestCategoria,,100.00,,0'])
+
+    def test_export_pdf(self):
+        """La exportación PDF genera un documento."""
+        response = self.client.get(reverse('catalog:products_export'), {'format': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_export_xlsx_real(self):
+        """xlsx (el formato por defecto) es un libro de Excel con valores numéricos."""
+        import openpyxl
+        response = self.client.get(reverse('catalog:products_export'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('spreadsheetml', response['Content-Type'])
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        wb = openpyxl.load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(wb['Productos'].values)
+        self.assertEqual(rows[0][:4], ('Nombre', 'Categoría', 'Tienda', 'Precio vigente'))
+        self.assertEqual(rows[1][0], 'Producto Vista')
+        self.assertEqual(rows[1][3], 100)
+
+    def test_export_resumen_por_tienda(self):
+        """mode=summary agrega por tienda en lugar de listar productos."""
+        Producto.objects.create(nombre='A', precio=Decimal('10.00'), tienda='Uno')
+        Producto.objects.create(nombre='B', precio=Decimal('30.00'), tienda='Uno')
+        response = self.client.get(reverse('catalog:products_export'),
+                                   {'format': 'csv', 'mode': 'summary', 'group': 'store'})
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'Tienda,Productos,Precio mín.,Precio prom.,Precio máx.,Rating prom.,Reseñas')
+        self.assertIn('Uno,2,10.00,20.00,30.00,,0', lines)
+        response = self.client.get(reverse('catalog:products_export'), {'format': 'pdf', 'mode': 'summary'})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_export_parquet(self):
+        """format=parquet descarga el listado filtrado en Parquet."""
+        import pyarrow.parquet as pq
+        response = self.client.get(reverse('catalog:products_export'), {'format': 'parquet'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.parquet')
+        self.assertIn('.parquet', response['Content-Disposition'])
+        tabla = pq.read_table(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(tabla.column('nombre').to_pylist(), ['Producto Vista'])
+
+    def test_export_formato_desconocido(self):
+        response = self.client.get(reverse('catalog:products_export'), {'format': 'docx'})
+        self.assertEqual(response.status_code, 400)
+
     def test_login_required_for_proposal(self):
         """Verifica que se requiera login para enviar propuestas."""
         response = self.client.get(reverse('catalog:submit_proposal'))
@@ -327,3 +2013,149 @@ class ViewsTest(TestCase):
         response = self.client.get(reverse('catalog:submit_proposal'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'catalog/submit_proposal.html')
+
+
+@override_settings(CATALOG_PAGE_CACHE_TIMEOUT=0)  # se mide la vista, no la página guardada
+class PresupuestoConsultasTest(TestCase):
+    """
+    Número máximo de consultas por vista con un catálogo sembrado con
+    factory_boy. El presupuesto se mide con los caches vacíos y no debe
+    depender del tamaño del catálogo: cada prueba agrega más productos y
+    vuelve a medir.
+    """
+    PRODUCTOS = 200
+    PRESUPUESTOS = {
+        'product_list': 3,        # versión del catálogo, facetas, página
+        'category_detail': 4,
+        'store_detail': 4,
+        'product_detail': 2,      # producto con su oferta, reseñas con usuario
+        'api_products': 3,
+        'api_product_detail': 2,
+        'products_export': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        factory.random.reseed_random('ofertum-presupuesto')
+        productos = ProductoFactory.create_batch(cls.PRODUCTOS, categoria='Hogar', tienda='Éxito')
+        for p in productos[::3]:
+            OfertaFactory(producto=p)
+        for p in productos[1::7]:
+            OfertaFactory(producto=p, fija=True)
+        usuarios = UsuarioFactory.create_batch(5)
+        for i, p in enumerate(productos[::2]):
+            for usuario in usuarios[:1 + i % len(usuarios)]:
+                ReviewFactory(producto=p, usuario=usuario)
+        cls.producto = productos[0]  # con oferta y reseñas
+
+    def setUp(self):
+        # La cache compartida es la del directorio temporal de esta corrida
+        cache.clear()
+        limpiar_local()
+
+    def _sembrar_mas(self, n=100):
+        """Más productos (con ofertas y reseñas) en la misma categoría y tienda."""
+        usuario = UsuarioFactory()
+        for p in ProductoFactory.create_batch(n, categoria='Hogar', tienda='Éxito'):
+            OfertaFactory(producto=p)
+            ReviewFactory(producto=p, usuario=usuario)
+        ReviewFactory(producto=self.producto, usuario=usuario)
+        self.setUp()
+
+    def _consultas(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx)
+
+    def _verificar(self, name, url, params=None):
+        presupuesto = self.PRESUPUESTOS[name]
+        antes = self._consultas(url, params)
+        self.assertLessEqual(antes, presupuesto, f'{name}: {antes} consultas')
+        self._sembrar_mas()
+        despues = self._consultas(url, params)
+        self.assertEqual(despues, antes, f'{name} depende del tamaño del catálogo')
+
+    def test_listado(self):
+        self._verificar('product_list', reverse('catalog:product_list'), {'sort': 'price_asc'})
+
+    def test_categoria(self):
+        self._verificar('category_detail', reverse('catalog:category_detail', args=['hogar']))
+
+    def test_tienda(self):
+        self._verificar('store_detail', reverse('catalog:store_detail', args=['exito']))
+
+    def test_detalle(self):
+        self._verificar('product_detail', reverse('catalog:product_detail', args=[self.producto.pk]))
+
+    def test_api_listado(self):
+        self._verificar('api_products', reverse('catalog:api_products'), {'limit': '200'})
+
+    def test_api_detalle(self):
+        self._verificar('api_product_detail', reverse('catalog:api_product_detail', args=[self.producto.pk]))
+
+    def test_exportacion(self):
+        self._verificar('products_export', reverse('catalog:products_export'), {'format': 'csv'})
+        self.assertEqual(self._consultas(reverse('catalog:products_export'), {'format': 'parquet'}), 1)
+
+
+class CatalogoSinteticoTest(TestCase):
+    """Generador de catálogo sintético y benchmark de las vistas principales."""
+
+    def _generar(self, **kwargs):
+        return generar_catalogo(60, usuarios=10, batch_size=25, semilla=3, **kwargs)
+
+    def test_genera_con_agregados_consistentes(self):
+        resumen = self._generar()
+        self.assertEqual(Producto.objects.count(), 60)
+        self.assertEqual((resumen.ofertas, resumen.reviews, resumen.propuestas),
+                         (Oferta.objects.count(), Review.objects.count(), Proposal.objects.count()))
+        self.assertGreater(resumen.reviews, 0)
+        self.assertEqual(Proposal.objects.count(), 3)
+        # bulk_create no dispara señales: precios y agregados se completan igual
+        for p in Producto.objects.all():
+            self.assertEqual(p.precio_vigente, p.obtener_precio_actual(), p.nombre)
+            ratings = list(p.reviews.values_list('rating', flat=True))
+            self.assertEqual((p.rating_sum, p.rating_count), (sum(ratings), len(ratings)))
+        self.assertTrue(any(p.precio_vigente < p.precio for p in Producto.objects.all()))
+
+    def test_reproducible_con_la_semilla(self):
+        self._generar()
+        antes = list(Producto.objects.order_by('link').values_list('nombre', 'precio', 'precio_vigente', 'rating_count'))
+        Producto.objects.filter(link__startswith=LINK_SINTETICO).delete()
+        Proposal.objects.all().delete()
+        get_user_model().objects.filter(username__startswith=USUARIO_SINTETICO).delete()
+        self._generar()
+        self.assertEqual(
+            list(Producto.objects.order_by('link').values_list('nombre', 'precio', 'precio_vigente', 'rating_count')),
+            antes,
+        )
+
+    def test_comando_no_pisa_un_catalogo_existente(self):
+        Producto.objects.create(nombre='Real', precio=Decimal('10.00'))
+        with self.assertRaises(CommandError):
+            call_command('generar_catalogo', productos=5, stdout=StringIO())
+        call_command('generar_catalogo', productos=5, usuarios=3, agregar=True, stdout=StringIO())
+        self.assertEqual(Producto.objects.count(), 6)
+
+    def test_benchmark_guarda_json(self):
+        self._generar()
+        with tempfile.TemporaryDirectory() as tmp:
+            salida = os.path.join(tmp, 'resultado.json')
+            out = StringIO()
+            call_command('benchmark_catalogo', total=24, concurrencia=1, calentamiento=0,
+                         salida=salida, stdout=out)
+            with open(salida, encoding='utf-8') as f:
+                resultado = json.load(f)
+            call_command('benchmark_catalogo', total=12, concurrencia=1, calentamiento=0,
+                         solo=['product_detail'], salida=salida, comparar=salida, stdout=out)
+        self.assertEqual(resultado['total'], 24)
+        self.assertEqual(resultado['errores'], 0)
+        self.assertEqual(resultado['catalogo']['productos'], 60)
+        self.assertTrue({'p50', 'p95', 'p99'} <= set(resultado['latencia_ms']))
+        for nombre in ('product_list', 'product_detail', 'api_products', 'category_detail', 'store_detail'):
+            self.assertGreater(resultado['endpoints'][nombre]['requests'], 0, nombre)
+            self.assertIsNotNone(resultado['endpoints'][nombre]['queries_media'])
+        self.assertIn('req/s:', out.getvalue())
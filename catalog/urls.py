@@ -10,6 +10,9 @@ urlpatterns = [
     path("products/<int:pk>/", views.detalle_producto, name="product_detail"),
      # --- NUEVA RUTA DE REPORTE ---
     path("products/export/", views.export_products_report, name="products_export"),
+    path("products/export/jobs/", views.export_job_create, name="products_export_jobs"),
+    path("products/export/jobs/<uuid:pk>/", views.export_job_status, name="products_export_job"),
+    path("products/export/jobs/<uuid:pk>/download/", views.export_job_download, name="products_export_job_download"),
     path("proposals/submit/", views.submit_proposal, name="submit_proposal"),
     path("proposals/admin/", views.admin_proposals, name="admin_proposals"),
     path("proposals/<int:pk>/<str:action>/", views.admin_proposal_action, name="admin_proposal_action"),
@@ -30,7 +33,11 @@ urlpatterns = [
     # API JSON
     path("api/products/", views.api_products, name="api_products"),
     path("api/products/<int:pk>/", views.api_product_detail, name="api_product_detail"),
+    path("api/search/", views.api_search, name="api_search"),
     
     # Páginas aliadas
     path("partner-products/", views.partner_products, name="partner_products"),
+    path("api/partner/status/", views.api_partner_status, name="api_partner_status"),
+    path("api/cache/stats/", views.api_cache_stats, name="api_cache_stats"),
+    path("api/stats/views/", views.api_view_stats, name="api_view_stats"),
 ]
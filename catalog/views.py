@@ -1,28 +1,59 @@
 from decimal import Decimal, InvalidOperation
-from django.db.models import Q, Count, Avg
 from django.http import JsonResponse, Http404
-from django.shortcuts import render, get_object_or_404
-from django.utils.text import slugify
+from django import shortcuts
+from django.shortcuts import get_object_or_404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.urls import reverse
 from .models import Producto
-from .models import Proposal, Review
+from .models import Proposal, Review, CatalogoVersion, ProductoAliado, SincronizacionAliado, ExportJob
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.shortcuts import redirect
 from django import forms
 from django.contrib import messages
 from django.db import IntegrityError
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.contrib.auth import login, logout
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import AuthenticationForm
 from urllib.parse import urlencode
-from .services.reporting import ReportColumn, DefaultReportFactory
-from io import BytesIO
-from django.http import FileResponse, HttpResponse
+from .services.reporting import ReportUnavailable
+from .services.facets import get_facet_index
+from .services.pricing import resumen_precios
+from .services.search import search_products
+from .services.partner_catalog import aobtener_catalogo_aliado
+from .services.partner_client import get_partner_client
+from .services.unified_search import ParametrosBusqueda, buscar_unificado, filtrar_productos_aliados, FUENTES
+from .services.pagination import InvalidCursor, KeysetField, akeyset_page, cursor_for, keyset_ordering, keyset_page
+from .services.listing import filter_price_range, filter_products, order_products, product_sort_keys
+from .services.exports import ExportError, build_export, export_plan, export_title, renderer_for
+from .services.export_jobs import ExportQueueFull, submit_export, wake_workers
+from .services.cache_tiers import cache_stats
+from .services.instrumentation import estadisticas, medir_plantilla
+from .services.page_cache import (
+    card_timeout, clave_pagina, page_timeout, quitar_csrf, restaurar_csrf, versiones_productos,
+)
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
-import csv
-import requests
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+from django.views.decorators.vary import vary_on_headers
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.translation import get_language
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+import hashlib
+import json
+import os
+
+
+def render(request, template_name, context=None, *args, **kwargs):
+    """django.shortcuts.render que suma su duración al tiempo de plantillas medido."""
+    with medir_plantilla():
+        return shortcuts.render(request, template_name, context, *args, **kwargs)
+
 
 class RegisterForm(forms.Form):
     username = forms.CharField(max_length=150)
@@ -174,16 +205,144 @@ def add_or_edit_review(request, pk):
     return render(request, 'catalog/review_form.html', {'form': form, 'producto': producto, 'review': review})
 
 
+# --- GET condicional (ETag / Last-Modified) ---
+def _catalogo_version(request):
+    # una sola lectura por request, compartida por ETag y Last-Modified
+    if not hasattr(request, "_catalogo_version"):
+        request._catalogo_version = CatalogoVersion.actual()
+    return request._catalogo_version
+
+
+def _tiene_mensajes_pendientes(request):
+    # Un 304 ocultaría los mensajes flash que aún no se mostraron
+    return len(messages.get_messages(request)) > 0
+
+
+def _catalogo_etag(request, *args, **kwargs):
+    """
+    ETag = versión del catálogo + usuario + idioma + URL completa, porque
+    las páginas HTML muestran datos del usuario y textos traducidos, + el
+    formato negociado por Accept (JSON o NDJSON en la API), que no está en la URL.
+    """
+    if _tiene_mensajes_pendientes(request):
+        return None
+    version = _catalogo_version(request)
+    user_key = request.user.pk if request.user.is_authenticated else 0
+    formato = _api_stream_mode(request) or ""
+    raw = f"{version.token}:{user_key}:{get_language()}:{request.get_full_path()}:{formato}"
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def _catalogo_last_modified(request, *args, **kwargs):
+    if _tiene_mensajes_pendientes(request):
+        return None
+    return _catalogo_version(request).actualizado
+
+
+_condicion_catalogo = condition(etag_func=_catalogo_etag, last_modified_func=_catalogo_last_modified)
+
+
+def _catalogo_validadores(request, *args, **kwargs):
+    return _catalogo_etag(request, *args, **kwargs), _catalogo_last_modified(request, *args, **kwargs)
+
+
+def catalogo_condicional(view):
+    """
+    Responde 304 si el cliente ya tiene la versión vigente del catálogo.
+
+    En vistas async el decorador de Django llamaría a los validadores dentro
+    del event loop, y estos leen BD, sesión y usuario: se calculan antes en
+    un hilo y se le pasan ya resueltos.
+    """
+    if not iscoroutinefunction(view):
+        return _condicion_catalogo(view)
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        etag, last_modified = await sync_to_async(_catalogo_validadores)(request, *args, **kwargs)
+        condicional = condition(
+            etag_func=lambda *a, **kw: etag,
+            last_modified_func=lambda *a, **kw: last_modified,
+        )
+        return await condicional(view)(request, *args, **kwargs)
+
+    return inner
+
+
+def cache_pagina_anonima(view):
+    """
+    Guarda el HTML de la vista para visitantes anónimos (clave: versión del
+    catálogo, idioma, ruta y querystring normalizado) y lo sirve desde cache
+    sin consultar productos ni dibujar la plantilla. Ver services/page_cache.py.
+    """
+    @wraps(view)
+    def inner(request, *args, **kwargs):
+        timeout = page_timeout()
+        if (
+            not timeout
+            or request.method != "GET"
+            or request.user.is_authenticated
+            or _tiene_mensajes_pendientes(request)
+        ):
+            return view(request, *args, **kwargs)
+
+        key = clave_pagina(
+            view.__name__, _catalogo_version(request).token, get_language(), request.path, request.GET,
+        )
+        cached = cache.get(key)
+        if cached is not None:
+            content_type, content = cached
+            return HttpResponse(restaurar_csrf(content, request), content_type=content_type)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            cache.set(key, (response["Content-Type"], quitar_csrf(response.content)), timeout)
+        return response
+
+    return inner
+
+
+def _es_asgi(request):
+    # Bajo ASGI conviene streaming con iteradores async; bajo WSGI, sync
+    return isinstance(request, ASGIRequest)
+
+
+PRODUCTS_PER_PAGE = 9  # tarjetas por página
+
+
 def home(request):
     return render(request, "catalog/home.html")
 
 
+def _product_card(p, cache_version=None):
+    """Diccionario que consume product_list.html para cada tarjeta."""
+    return {
+        "name": p.nombre,
+        "price": p.precio_vigente,
+        "store": p.tienda,
+        "category": p.categoria,
+        "producto_obj": p,
+        "avg_rating": p.rating_avg,
+        "rating_count": p.rating_count,
+        "cache_version": cache_version,  # clave del fragmento {% cache %} de la tarjeta
+    }
+
+
+def _product_cards(productos):
+    """Tarjetas de product_list.html con la versión de cache de cada producto."""
+    productos = list(productos)
+    versiones = versiones_productos(p.pk for p in productos)
+    return [_product_card(p, versiones.get(p.pk)) for p in productos]
+
+
+@catalogo_condicional
+@cache_pagina_anonima
 def product_list(request):
     """
     Lista de productos con filtros + ordenamiento + paginación.
     Filtros: q, category, store, min, max, rating
-    Orden:   sort = name | price_asc | price_desc | rating
-    Página:  page = 1..N
+    Orden:   sort = name | price_asc | price_desc | rating | relevance (con q)
+    Página:  page = 1..N, o cursor = token opaco (keyset, sin OFFSET)
     """
     # --- Leer parámetros ---
     q = (request.GET.get("q") or "").strip()
@@ -194,92 +353,20 @@ def product_list(request):
     min_rating = (request.GET.get("rating") or "").strip()
     sort = (request.GET.get("sort") or "name").strip()   # default: name
     page = request.GET.get("page", 1)
+    cursor = (request.GET.get("cursor") or "").strip()
 
-    # --- Base queryset + anotaciones de rating ---
-    qs = (
-        Producto.objects.filter(disponible=True)
-        .annotate(
-            db_avg_rating=Avg('reviews__rating'),
-            db_rating_count=Count('reviews')
-        )
-    )
-
-    # --- Filtros de texto/categoría/tienda ---
-    if q:
-        qs = qs.filter(Q(nombre__icontains=q) | Q(descripcion__icontains=q))
-    if category:
-        qs = qs.filter(categoria__iexact=category)
-    if store:
-        qs = qs.filter(tienda__iexact=store)
-
-    # --- Filtro por rating mínimo (DB) ---
-    try:
-        if min_rating:
-            min_r = float(min_rating)
-            qs = qs.filter(db_avg_rating__isnull=False, db_avg_rating__gte=min_r)
-    except ValueError:
-        pass
-
-    # Orden base estable antes de construir lista
-    qs = qs.order_by("nombre")
-
-    # --- Rango de precios (sobre precio vigente) ---
-    min_dec = max_dec = None
-    try:
-        if price_min:
-            min_dec = Decimal(price_min.replace(",", "."))
-        if price_max:
-            max_dec = Decimal(price_max.replace(",", "."))
-    except InvalidOperation:
-        min_dec = max_dec = None
-
-    # --- Materializar items con precio vigente y aplicar rango ---
-    items = []
-    for p in qs:
-        vigente = p.obtener_precio_actual()  # Decimal
-        if min_dec is not None and vigente < min_dec:
-            continue
-        if max_dec is not None and vigente > max_dec:
-            continue
-        items.append({
-            "name": p.nombre,
-            "price": vigente,
-            "store": p.tienda,
-            "category": p.categoria,
-            "producto_obj": p,
-            "avg_rating": getattr(p, 'db_avg_rating', None),
-            "rating_count": getattr(p, 'db_rating_count', 0),
-        })
-
-    # --- Ordenamiento en memoria (ya tenemos 'price' y 'avg_rating') ---
-    if sort == "price_asc":
-        items.sort(key=lambda x: (x["price"], x["name"]))
-    elif sort == "price_desc":
-        items.sort(key=lambda x: (x["price"], x["name"]), reverse=True)
-    elif sort == "rating":
-        # rating None al final; más reseñas primero si empata
-        def rate_key(it):
-            ar = it["avg_rating"]
-            # invertimos para que mayor rating quede antes
-            return (-(ar if ar is not None else -1), -it["rating_count"], it["name"])
-        items.sort(key=rate_key)
-    else:
-        # name (default)
-        items.sort(key=lambda x: x["name"])
+    # --- Base queryset (rating ya viene desnormalizado en Producto) ---
+    qs = Producto.objects.with_pricing().filter(disponible=True)
 
-    # --- Paginación ---
-    paginator = Paginator(items, 9)  # 9 tarjetas por página
-    try:
-        page_obj = paginator.page(page)
-    except (PageNotAnInteger, EmptyPage):
-        page_obj = paginator.page(1)
+    # --- Filtros (texto, categoría, tienda, rating mínimo, rango de precio vigente) ---
+    qs, sort = filter_products(qs, request.GET)
 
-    # --- Querystring sin 'page' para reutilizar en links de paginación ---
+    # --- Querystring sin 'page'/'cursor' para reutilizar en links de paginación ---
     qs_params = request.GET.copy()
     qs_params.pop('page', None)
+    qs_params.pop('cursor', None)
     querystring = urlencode([(k, v) for k, v in qs_params.items() if v not in (None, "")])
 
-    # --- Contexto ---
     ctx = {
         "q": q,
         "category": category,
@@ -288,38 +375,58 @@ def product_list(request):
         "price_max": price_max,
         "min_rating": min_rating,
         "sort": sort,
+        "querystring": querystring,            # para conservar filtros en los links
+        "card_cache_timeout": card_timeout(),
+    }
+
+    # --- Paginación por cursor (opcional, para páginas profundas sin OFFSET) ---
+    if cursor:
+        try:
+            keyset = keyset_page(qs, product_sort_keys(sort), cursor, PRODUCTS_PER_PAGE)
+        except InvalidCursor:
+            keyset = None
+        if keyset is not None:
+            ctx.update({
+                "items": _product_cards(keyset.object_list),
+                "is_paginated": False,
+                "next_cursor": keyset.next_cursor,
+            })
+            return render(request, "catalog/product_list.html", ctx)
+
+    # --- Paginación LIMIT/OFFSET en la base: solo se materializa la página ---
+    paginator = Paginator(order_products(qs, sort), PRODUCTS_PER_PAGE)
+    try:
+        page_obj = paginator.page(page)
+    except (PageNotAnInteger, EmptyPage):
+        page_obj = paginator.page(1)
+
+    rows = list(page_obj.object_list)
+    ctx.update({
         "page_obj": page_obj,                  # usar en template
-        "items": page_obj.object_list,         # tu HTML ya lo usa
+        "items": _product_cards(rows),
         "paginator": paginator,
         "is_paginated": page_obj.has_other_pages(),
-        "querystring": querystring,            # para conservar filtros en los links
-    }
+        # permite continuar por cursor desde esta página
+        "next_cursor": cursor_for(rows[-1], product_sort_keys(sort)) if page_obj.has_next() else None,
+    })
     return render(request, "catalog/product_list.html", ctx)
 
 
 
 
 #  CATEGORÍAS 
+@catalogo_condicional
 def categories(request):
     """
     Lista de categorías existentes (derivadas de Producto.categoria),
-    con total de productos por categoría.
-    """
-    cats_qs = (
-        Producto.objects.filter(disponible=True)
-        .exclude(categoria__isnull=True)
-        .exclude(categoria__exact="")
-        .values("categoria")
-        .annotate(total=Count("id"))
-        .order_by("categoria")
-    )
+    con total de productos y precio desde por categoría. Sale del índice de
+    facetas y del resumen de precios en cache.
+    """
+    version = _catalogo_version(request)
+    precios = resumen_precios(version)
     cats = [
-        {
-            "name": c["categoria"],
-            "slug": slugify(c["categoria"]),
-            "count": c["total"],
-        }
-        for c in cats_qs
+        {"name": c.name, "slug": c.slug, "count": c.count, "precios": precios.get(c.name)}
+        for c in get_facet_index(version).categorias
     ]
     return render(request, "catalog/categories.html", {"cats": cats})
 
@@ -328,93 +435,59 @@ def category_detail(request, slug):
     """
     Muestra productos de una categoría, resolviendo el nombre por slug.
     """
-    all_cats = list(
-        Producto.objects.exclude(categoria__isnull=True)
-        .exclude(categoria__exact="")
-        .values_list("categoria", flat=True)
-        .distinct()
-    )
-    cat_name = next((c for c in all_cats if slugify(c) == slug), None)
+    cat_name = get_facet_index().categoria_por_slug.get(slug)
     if not cat_name:
         raise Http404("Categoría no encontrada")
 
     qs = (
-        Producto.objects.filter(disponible=True, categoria__iexact=cat_name)
+        Producto.objects.with_pricing()
+        .filter(disponible=True, categoria__iexact=cat_name)
         .order_by("nombre")
     )
 
-    items = [{
-        "name": p.nombre,
-        "price": p.obtener_precio_actual(),
-        "store": p.tienda,
-        "category": p.categoria,
-        "producto_obj": p,
-    } for p in qs]
+    items = _product_cards(qs)
 
     ctx = {
         "items": items,
         "q": "", "category": cat_name, "store": "",
         "price_min": "", "price_max": "",
+        "card_cache_timeout": card_timeout(),
     }
     return render(request, "catalog/product_list.html", ctx)
 
 
 # TIENDAS 
+@catalogo_condicional
 def stores(request):
     """
     Lista de tiendas existentes (derivadas de Producto.tienda),
-    con total de productos por tienda.
-    """
-    stores_qs = (
-        Producto.objects.filter(disponible=True)
-        .exclude(tienda__isnull=True)
-        .exclude(tienda__exact="")
-        .values("tienda")
-        .annotate(total=Count("id"))
-        .order_by("tienda")
-    )
-    stores = [
-        {
-            "name": s["tienda"],
-            "slug": slugify(s["tienda"]),
-            "count": s["total"],
-        }
-        for s in stores_qs
-    ]
-    return render(request, "catalog/stores.html", {"stores": stores})
+    con total de productos por tienda. Sale del índice de facetas en cache.
+    """
+    index = get_facet_index(_catalogo_version(request))
+    return render(request, "catalog/stores.html", {"stores": index.tiendas})
 
 
 def store_detail(request, slug):
     """
     Muestra productos de una tienda, resolviendo el nombre por slug.
     """
-    all_stores = list(
-        Producto.objects.exclude(tienda__isnull=True)
-        .exclude(tienda__exact="")
-        .values_list("tienda", flat=True)
-        .distinct()
-    )
-    store_name = next((s for s in all_stores if slugify(s) == slug), None)
+    store_name = get_facet_index().tienda_por_slug.get(slug)
     if not store_name:
         raise Http404("Tienda no encontrada")
 
     qs = (
-        Producto.objects.filter(disponible=True, tienda__iexact=store_name)
+        Producto.objects.with_pricing()
+        .filter(disponible=True, tienda__iexact=store_name)
         .order_by("nombre")
     )
 
-    items = [{
-        "name": p.nombre,
-        "price": p.obtener_precio_actual(),
-        "store": p.tienda,
-        "category": p.categoria,
-        "producto_obj": p,
-    } for p in qs]
+    items = _product_cards(qs)
 
     ctx = {
         "items": items,
         "q": "", "category": "", "store": store_name,
         "price_min": "", "price_max": "",
+        "card_cache_timeout": card_timeout(),
     }
     return render(request, "catalog/product_list.html", ctx)
 
@@ -422,7 +495,9 @@ def store_detail(request, slug):
 
 def detalle_producto(request, pk):
     """Vista de detalle para un producto."""
-    producto = get_object_or_404(Producto, pk=pk)
+    # Reseñas con su usuario en una sola consulta (la plantilla muestra el username)
+    con_usuario = Prefetch("reviews", queryset=Review.objects.select_related("usuario"))
+    producto = get_object_or_404(Producto.objects.with_pricing().prefetch_related(con_usuario), pk=pk)
     oferta = producto.obtener_oferta_activa()
     return render(request, "catalog/product_detail.html", {
         "producto": producto,
@@ -430,7 +505,101 @@ def detalle_producto(request, pk):
     })
 
 # API JSON PROPIA
-def _product_to_dict(p: Producto, request=None):
+API_PRODUCT_FIELDS = (
+    "id", "nombre", "descripcion", "categoria", "tienda", "link",
+    "precio_base", "precio_actual", "oferta", "imagen_url",
+    "disponible", "creado", "detail_url",
+)
+API_DEFAULT_LIMIT = 50
+API_MAX_LIMIT = 200
+# Orden estable de la API: por nombre y luego id (requerido por el cursor)
+API_SORT_KEYS = (KeysetField("nombre"), KeysetField("id"))
+API_STREAM_CHUNK_SIZE = 500
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def _api_error(error, detail, status):
+    return JsonResponse({"error": error, "detail": detail}, status=status,
+                        json_dumps_params={"ensure_ascii": False})
+
+
+def _api_requested_fields(request):
+    """
+    Lee ?fields=id,nombre,... y devuelve (campos, desconocidos).
+    Sin el parámetro devuelve (None, []) = todos los campos.
+    """
+    raw = (request.GET.get("fields") or "").strip()
+    if not raw:
+        return None, []
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in API_PRODUCT_FIELDS]
+    return fields, unknown
+
+
+def _api_unknown_fields_error(unknown):
+    return _api_error(
+        "Campos desconocidos",
+        f"Campos no soportados: {', '.join(unknown)}. Disponibles: {', '.join(API_PRODUCT_FIELDS)}",
+        status=400,
+    )
+
+
+def _api_limit(raw):
+    try:
+        limit = int(raw)
+    except (TypeError, ValueError):
+        return API_DEFAULT_LIMIT
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def _api_stream_mode(request):
+    """
+    Devuelve "ndjson", "json" o None según ?format=ndjson, el header Accept
+    o ?stream=1.
+    """
+    if (request.GET.get("format") or "").lower() == "ndjson":
+        return "ndjson"
+    if NDJSON_CONTENT_TYPE in request.headers.get("Accept", ""):
+        return "ndjson"
+    if (request.GET.get("stream") or "").lower() in ("1", "true"):
+        return "json"
+    return None
+
+
+def _iter_products_ndjson(qs, request, fields):
+    # Una línea JSON por producto; el cursor del servidor trae filas por lotes
+    for p in qs.iterator(chunk_size=API_STREAM_CHUNK_SIZE):
+        yield json.dumps(_product_to_dict(p, request, fields), ensure_ascii=False) + "\n"
+
+
+async def _aiter_products_ndjson(qs, request, fields):
+    async for p in qs.aiterator(chunk_size=API_STREAM_CHUNK_SIZE):
+        yield json.dumps(_product_to_dict(p, request, fields), ensure_ascii=False) + "\n"
+
+
+async def _aiter_products_json(qs, request, fields):
+    yield '{"productos": ['
+    total = 0
+    async for p in qs.aiterator(chunk_size=API_STREAM_CHUNK_SIZE):
+        prefix = "," if total else ""
+        yield prefix + json.dumps(_product_to_dict(p, request, fields), ensure_ascii=False)
+        total += 1
+    yield f'], "total": {total}}}'
+
+
+def _iter_products_json(qs, request, fields):
+    # Mismo formato que la respuesta normal; el total se conoce al terminar,
+    # así que va después de la lista y no cuesta un COUNT extra.
+    yield '{"productos": ['
+    total = 0
+    for p in qs.iterator(chunk_size=API_STREAM_CHUNK_SIZE):
+        prefix = "," if total else ""
+        yield prefix + json.dumps(_product_to_dict(p, request, fields), ensure_ascii=False)
+        total += 1
+    yield f'], "total": {total}}}'
+
+
+def _product_to_dict(p: Producto, request=None, fields=None):
     """Convierte un producto a diccionario para JSON API.
     
     Incluye:
@@ -438,6 +607,9 @@ def _product_to_dict(p: Producto, request=None):
     - Precio base y precio actual (con oferta si aplica)
     - URL de imagen
     - Enlace directo al detalle del producto (URL completa)
+
+    Con productos de `Producto.objects.with_pricing()` no hace consultas extra.
+    Si se pasa `fields`, solo se devuelven esas claves.
     """
     oferta = p.obtener_oferta_activa()
     
@@ -456,7 +628,7 @@ def _product_to_dict(p: Producto, request=None):
         else:
             imagen_url = p.imagen.url
     
-    return {
+    data = {
         "id": p.id,
         "nombre": p.nombre,
         "descripcion": p.descripcion,
@@ -477,8 +649,13 @@ def _product_to_dict(p: Producto, request=None):
         "creado": p.creado.isoformat(),
         "detail_url": detail_url,  # URL completa para acceder al producto
     }
+    if fields:
+        return {k: data[k] for k in fields}
+    return data
 
-def api_products(request):
+@vary_on_headers("Accept")  # también en los 304: el formato depende de Accept
+@catalogo_condicional
+async def api_products(request):
     """
     Servicio web JSON que provee información de productos disponibles.
     
@@ -489,26 +666,43 @@ def api_products(request):
     - ?min=precio : Precio mínimo (sobre precio actual con oferta)
     - ?max=precio : Precio máximo (sobre precio actual con oferta)
     - ?disponibles=true : Solo productos disponibles (por defecto true)
-    
+
+    Paginación y campos:
+    - ?limit=N : Productos por página (por defecto 50, máximo 200)
+    - ?cursor=token : Continúa desde `next_cursor` de la respuesta anterior
+    - ?fields=id,nombre,precio_actual : Solo devuelve esas claves
+
+    Streaming (memoria constante, ignora limit/cursor y devuelve todo):
+    - ?stream=1 : mismo JSON {"productos": [...], "total": N} enviado por partes
+    - ?format=ndjson o Accept: application/x-ndjson : un producto por línea
+
     Retorna JSON con:
-    - total: cantidad de productos
+    - total: cantidad de productos que cumplen los filtros (COUNT en SQL)
+    - count: cantidad de productos en esta página
+    - next_cursor / next: cursor y URL de la siguiente página (null si no hay)
     - productos: lista de productos con toda la información
       - Cada producto incluye detail_url para acceso directo
-    
+
     Ejemplo de consumo por otros equipos:
-    GET /api/products/?category=Electrónica&min=50&max=500
+    GET /api/products/?category=Electrónica&min=50&max=500&limit=100
+
+    Vista async (ORM async): bajo ASGI no ocupa un worker mientras espera a la BD.
     """
+    fields, unknown = _api_requested_fields(request)
+    if unknown:
+        return _api_unknown_fields_error(unknown)
+
     # Filtro base - por defecto solo disponibles
     disponibles = request.GET.get("disponibles", "true").lower() == "true"
+    qs = Producto.objects.with_pricing()
     if disponibles:
-        qs = Producto.objects.filter(disponible=True)
-    else:
-        qs = Producto.objects.all()
+        qs = qs.filter(disponible=True)
 
     # Búsqueda de texto
     q = (request.GET.get("q") or "").strip()
     if q:
-        qs = qs.filter(Q(nombre__icontains=q) | Q(descripcion__icontains=q))
+        # Elegir backend puede consultar la BD (una vez por proceso): en un hilo
+        qs = await sync_to_async(search_products)(qs, q)
 
     # Filtro por categoría
     category = (request.GET.get("category") or "").strip()
@@ -532,22 +726,49 @@ def api_products(request):
     except (InvalidOperation, TypeError):
         pmax = None
 
-    # Aplicar filtros de precio en Python (porque obtener_precio_actual no es campo DB)
-    productos = list(qs)
-    if pmin is not None:
-        productos = [p for p in productos if p.obtener_precio_actual() >= pmin]
-    if pmax is not None:
-        productos = [p for p in productos if p.obtener_precio_actual() <= pmax]
+    # Filtros de precio en SQL sobre el precio vigente desnormalizado
+    qs = filter_price_range(qs, pmin, pmax)
+
+    stream_mode = _api_stream_mode(request)
+    if stream_mode:
+        ordered = qs.order_by(*keyset_ordering(API_SORT_KEYS))
+        asgi = _es_asgi(request)
+        if stream_mode == "ndjson":
+            iterator = _aiter_products_ndjson if asgi else _iter_products_ndjson
+            return StreamingHttpResponse(
+                iterator(ordered, request, fields),
+                content_type=f"{NDJSON_CONTENT_TYPE}; charset=utf-8",
+            )
+        iterator = _aiter_products_json if asgi else _iter_products_json
+        return StreamingHttpResponse(iterator(ordered, request, fields), content_type="application/json")
+
+    # Página por cursor (keyset): el costo no depende de la profundidad
+    limit = _api_limit(request.GET.get("limit"))
+    cursor = (request.GET.get("cursor") or "").strip()
+    try:
+        page = await akeyset_page(qs, API_SORT_KEYS, cursor, limit)
+    except InvalidCursor:
+        return _api_error("Cursor inválido", "El parámetro cursor no es válido para esta consulta", status=400)
+
+    next_url = None
+    if page.next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = page.next_cursor
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
 
     # Convertir a diccionarios con URLs absolutas
-    data = [_product_to_dict(p, request) for p in productos]
-    
+    data = [_product_to_dict(p, request, fields) for p in page.object_list]
+
     return JsonResponse({
-        "total": len(data),
+        "total": await qs.acount(),
+        "count": len(data),
+        "next_cursor": page.next_cursor,
+        "next": next_url,
         "productos": data  # Cambio de "results" a "productos" para mayor claridad
     }, json_dumps_params={"ensure_ascii": False})
 
-def api_product_detail(request, pk: int):
+@catalogo_condicional
+async def api_product_detail(request, pk: int):
     """
     Detalle de un producto específico en formato JSON.
     
@@ -558,183 +779,164 @@ def api_product_detail(request, pk: int):
     - URL de imagen
     - Enlace directo al detalle del producto
     - Información de la oferta activa si existe
+
+    Acepta ?fields=... igual que la lista.
     """
+    fields, unknown = _api_requested_fields(request)
+    if unknown:
+        return _api_unknown_fields_error(unknown)
     try:
-        p = Producto.objects.get(pk=pk, disponible=True)
+        p = await Producto.objects.with_pricing().aget(pk=pk, disponible=True)
     except Producto.DoesNotExist:
-        return JsonResponse({
-            "error": "Producto no encontrado",
-            "detail": f"No existe un producto disponible con id {pk}"
-        }, status=404, json_dumps_params={"ensure_ascii": False})
-    
-    return JsonResponse(_product_to_dict(p, request), json_dumps_params={"ensure_ascii": False})
+        return _api_error("Producto no encontrado", f"No existe un producto disponible con id {pk}", status=404)
 
+    return JsonResponse(_product_to_dict(p, request, fields), json_dumps_params={"ensure_ascii": False})
 
 
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    REPORTLAB_OK = True
-except Exception:
-    REPORTLAB_OK = False
-# --- NUEVA VISTA: exportación de productos ---
-def _filtered_items_for_export(request):
-    """
-    Repite la misma lógica de filtros/orden que product_list(),
-    pero devolviendo la lista 'items' ya armada para exportar.
-    """
-    q = (request.GET.get("q") or "").strip()
-    category = (request.GET.get("category") or "").strip()
-    store = (request.GET.get("store") or "").strip()
-    price_min = (request.GET.get("min") or "").strip()
-    price_max = (request.GET.get("max") or "").strip()
-    min_rating = (request.GET.get("rating") or "").strip()
-    sort = (request.GET.get("sort") or "name").strip()
 
-    qs = Producto.objects.filter(disponible=True).annotate(
-        db_avg_rating=Avg('reviews__rating'),
-        db_rating_count=Count('reviews')
-    )
+# --- Exportación de productos ---
 
-    if q:
-        qs = qs.filter(Q(nombre__icontains=q) | Q(descripcion__icontains=q))
-    if category:
-        qs = qs.filter(categoria__iexact=category)
-    if store:
-        qs = qs.filter(tienda__iexact=store)
+async def _aiter_en_hilo(iterable):
+    """Recorre un iterador sync (que lee la BD) de a un elemento por vez en el hilo de sync_to_async."""
+    iterator = iter(iterable)
+    siguiente = sync_to_async(next)
+    fin = object()
+    while (parte := await siguiente(iterator, fin)) is not fin:
+        yield parte
 
+
+def export_products_report(request):
+    """
+    /products/export/?format=pdf|xlsx|csv|parquet|arrow[&mode=summary&group=category|store]
+    Conserva los mismos filtros del listado. PDF, Excel y CSV pasan por
+    DefaultReportFactory (Parquet y Arrow por services/columnar.py); CSV se
+    envía por partes y los demás se generan en un temporal. Para catálogos grandes usar /products/export/jobs/.
+    """
+    fmt = (request.GET.get("format") or "xlsx").lower()
     try:
-        if min_rating:
-            min_r = float(min_rating)
-            qs = qs.filter(db_avg_rating__isnull=False, db_avg_rating__gte=min_r)
-    except ValueError:
-        pass
+        renderer = renderer_for(fmt)
+    except ExportError as exc:
+        return HttpResponse(str(exc), content_type="text/plain", status=400)
 
-    productos = qs.order_by("nombre")
+    timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+    title = export_title(request.GET, timestamp)
+    filename = f"productos_{timestamp}.{renderer.extension}"
+
+    if hasattr(renderer, "stream"):
+        # Memoria constante: cada lote se escribe y se envía
+        columns, batches = export_plan(request.GET)
+        partes = renderer.stream(title, columns, batches)
+        if _es_asgi(request):
+            # Bajo ASGI un iterador sync se lee entero antes de enviar nada
+            partes = _aiter_en_hilo(partes)
+        response = StreamingHttpResponse(partes, content_type=renderer.content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
-    # Rango de precio vigente
-    min_dec = max_dec = None
     try:
-        if price_min:
-            min_dec = Decimal(price_min.replace(",", "."))
-        if price_max:
-            max_dec = Decimal(price_max.replace(",", "."))
-    except InvalidOperation:
-        min_dec = max_dec = None
-
-    items = []
-    for p in productos:
-        vigente = p.obtener_precio_actual()
-        if min_dec is not None and vigente < min_dec:
-            continue
-        if max_dec is not None and vigente > max_dec:
-            continue
-        items.append({
-            "name": p.nombre,
-            "price": vigente,
-            "store": p.tienda,
-            "category": p.categoria,
-            "producto_obj": p,
-            "avg_rating": getattr(p, 'db_avg_rating', None),
-            "rating_count": getattr(p, 'db_rating_count', 0),
-        })
-
-    # Orden
-    if sort == "price_asc":
-        items.sort(key=lambda x: (x["price"], x["name"]))
-    elif sort == "price_desc":
-        items.sort(key=lambda x: (x["price"], x["name"]), reverse=True)
-    elif sort == "rating":
-        items.sort(key=lambda x: (-(x["avg_rating"] or -1), -x["rating_count"], x["name"]))
-    else:
-        items.sort(key=lambda x: x["name"])
+        out, _rows = build_export(fmt, request.GET, title)
+    except ReportUnavailable as exc:
+        return HttpResponse(str(exc), content_type="text/plain", status=500)
+    return FileResponse(out, as_attachment=True, filename=filename, content_type=renderer.content_type)
+
+
+def _export_job_dict(job, request, reused=None):
+    data = {
+        "id": str(job.pk),
+        "status": job.status,
+        "format": job.formato,
+        "filters": job.filtros,
+        "rows": job.filas,
+        "error": job.error or None,
+        "created_at": job.creado.isoformat(),
+        "finished_at": job.terminado.isoformat() if job.terminado else None,
+        "status_url": request.build_absolute_uri(reverse("catalog:products_export_job", args=[job.pk])),
+        "download_url": (
+            request.build_absolute_uri(reverse("catalog:products_export_job_download", args=[job.pk]))
+            if job.status == ExportJob.STATUS_DONE else None
+        ),
+    }
+    if reused is not None:
+        data["reused"] = reused
+    return data
 
-    return items
 
+def _csrf_valido(request) -> bool:
+    """El request trae un token CSRF válido (cookie + campo o header X-CSRFToken)."""
+    # process_view devuelve None si acepta el request y una respuesta 403 si no
+    return CsrfViewMiddleware(lambda r: None).process_view(request, None, (), {}) is None
 
-def export_products_report(request):
+
+@csrf_exempt
+@require_POST
+def export_job_create(request):
     """
-    /products/export/?format=pdf|xlsx  (xlsx = CSV con mime de Excel)
-    Conserva los mismos filtros del listado.
+    POST /products/export/jobs/ con format y los filtros de /products/ (en el
+    cuerpo o en el querystring). Responde 202 con el id del trabajo y la URL
+    para consultar su estado; si hay uno igual reciente, devuelve ese.
+
+    Es una API pública como /products/export/ (el id del trabajo es la
+    credencial), así que no exige token CSRF. El trabajo solo queda asociado
+    al usuario con sesión si además trae el token: un POST desde otro sitio
+    no puede actuar en su nombre. Con demasiados pendientes (anónimos, o del
+    usuario) responde 429.
     """
-    fmt = (request.GET.get("format") or "xlsx").lower()
-    items = _filtered_items_for_export(request)
-
-    timestamp = timezone.now().strftime("%Y%m%d_%H%M%S")
+    params = request.POST if request.POST else request.GET
+    user = request.user if request.user.is_authenticated and _csrf_valido(request) else None
+    try:
+        job, reused = submit_export(params.get("format") or "xlsx", params, user)
+    except ExportError as exc:
+        return _api_error("Formato no soportado", str(exc), status=400)
+    except ExportQueueFull as exc:
+        response = _api_error("Demasiadas exportaciones pendientes", str(exc), status=429)
+        response["Retry-After"] = "60"
+        return response
+    return JsonResponse(_export_job_dict(job, request, reused), status=202,
+                        json_dumps_params={"ensure_ascii": False})
+
+
+def export_job_status(request, pk):
+    """GET /products/export/jobs/<id>/: estado del trabajo (el id es la credencial)."""
+    job = get_object_or_404(ExportJob, pk=pk)
+    if job.status == ExportJob.STATUS_PENDING:
+        # Por si el aviso al pool se perdió (reinicio, otro proceso)
+        wake_workers()
+    return JsonResponse(_export_job_dict(job, request), json_dumps_params={"ensure_ascii": False})
+
+
+def export_job_download(request, pk):
+    """GET /products/export/jobs/<id>/download/: el archivo generado."""
+    job = get_object_or_404(ExportJob, pk=pk)
+    if job.status != ExportJob.STATUS_DONE:
+        return _api_error("Exportación no disponible", f"El trabajo está en estado {job.status}", status=409)
+    return FileResponse(job.archivo.open("rb"), as_attachment=True, filename=job.nombre_archivo,
+                        content_type=renderer_for(job.formato).content_type)
+
+
+def _partner_card(p):
+    return {
+        "id": p.id_externo,
+        "name": p.nombre,
+        "description": p.descripcion,
+        "price": p.precio,
+        "store": p.tienda,
+        "category": p.categoria,
+        "image": p.imagen,
+        "link": p.link,
+        "avg_rating": None,
+        "rating_count": 0,
+    }
 
-    if fmt == "pdf":
-        if not REPORTLAB_OK:
-            return HttpResponse(
-                "Para exportar a PDF instala reportlab: pip install reportlab",
-                content_type="text/plain",
-                status=500
-            )
 
-        buffer = BytesIO()
-        c = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-
-        title = f"Reporte de productos ({timestamp})"
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, height - 50, title)
-
-        c.setFont("Helvetica", 10)
-        y = height - 80
-        line_height = 14
-
-        # Encabezados
-        c.drawString(40, y, "Nombre")
-        c.drawString(280, y, "Categoría")
-        c.drawString(380, y, "Tienda")
-        c.drawRightString(560, y, "Precio vigente")
-        y -= line_height
-
-        for it in items:
-            if y < 60:  # salto de página simple
-                c.showPage()
-                c.setFont("Helvetica", 10)
-                y = height - 50
-
-            nombre = (it["name"] or "")[:45]
-            c.drawString(40, y, nombre)
-            c.drawString(280, y, (it["category"] or "")[:18])
-            c.drawString(380, y, (it["store"] or "")[:18])
-            c.drawRightString(560, y, f"${float(it['price']):,.2f}")
-            y -= line_height
-
-        c.showPage()
-        c.save()
-        buffer.seek(0)
-
-        filename = f"productos_{timestamp}.pdf"
-        return FileResponse(buffer, as_attachment=True, filename=filename)
-
-    # --- XLSX “rápido” vía CSV (abre en Excel sin problema) ---
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
-    filename = f"productos_{timestamp}.csv"
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-
-    writer = csv.writer(response)
-    writer.writerow(["Nombre", "Categoría", "Tienda", "Precio vigente", "Rating prom.", "N° reseñas"])
-    for it in items:
-        writer.writerow([
-            it["name"],
-            it["category"] or "",
-            it["store"] or "",
-            f"{float(it['price']):.2f}",
-            (f"{float(it['avg_rating']):.1f}" if it["avg_rating"] is not None else ""),
-            it["rating_count"] or 0,
-        ])
-    return response
-
-
-def partner_products(request):
+async def partner_products(request):
     """
     Vista que muestra productos de API externa de equipo aliado.
-    Endpoint: http://13.218.169.6/api/productos/
+    Endpoint: settings.PARTNER_API_URL (http://13.218.169.6/api/productos/)
+
+    Se sirve desde la copia local (ProductoAliado); la API solo se consulta
+    para renovarla, en segundo plano (ver services/partner_catalog.py). Es
+    async: el primer uso, que sí espera a la API, no bloquea un worker ASGI.
     """
-    partner_api_url = "http://13.218.169.6/api/productos/"
-    
     # Parámetros de filtro
     q = (request.GET.get("q") or "").strip()
     category = (request.GET.get("category") or "").strip()
@@ -743,101 +945,37 @@ def partner_products(request):
     price_max = (request.GET.get("max") or "").strip()
     sort = (request.GET.get("sort") or "name").strip()
     page = request.GET.get("page", 1)
-    
-    items = []
-    error_message = None
-    
-    try:
-        # Hacer petición a la API externa con timeout
-        response = requests.get(partner_api_url, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Extraer productos de la respuesta (ajustar según estructura de la API)
-        if isinstance(data, dict) and 'results' in data:
-            productos = data['results']
-        elif isinstance(data, list):
-            productos = data
-        else:
-            productos = []
-        
-        # Procesar y filtrar productos
-        for p in productos:
-            # Mapeo de campos según la estructura real de la API
-            nombre = p.get('nombreProducto', p.get('nombre', p.get('name', 'Sin nombre')))
-            descripcion = p.get('descripcion', p.get('description', ''))
-            categoria = p.get('tipoProducto', p.get('categoria', p.get('category', '')))
-            tienda = p.get('marcaProducto', p.get('tienda', p.get('store', '')))
-            precio = float(p.get('precioDeProducto', p.get('precio', p.get('price', p.get('precio_base', p.get('precio_actual', 0))))))
-            imagen_path = p.get('imagenProducto', p.get('imagen', p.get('image', p.get('imagen_url', ''))))
-            # Construir URL completa de imagen si es ruta relativa
-            if imagen_path and not imagen_path.startswith('http'):
-                imagen = f"http://13.218.169.6{imagen_path}"
-            else:
-                imagen = imagen_path
-            link = p.get('link', p.get('url', ''))
-            product_id = p.get('idProducto', p.get('id', 0))
-            
-            # Aplicar filtros
-            if q and q.lower() not in nombre.lower() and q.lower() not in descripcion.lower():
-                continue
-            if category and category.lower() != categoria.lower():
-                continue
-            if store and store.lower() != tienda.lower():
-                continue
-            
-            # Filtro de precio
-            try:
-                if price_min and precio < float(price_min.replace(",", ".")):
-                    continue
-                if price_max and precio > float(price_max.replace(",", ".")):
-                    continue
-            except (ValueError, InvalidOperation):
-                pass
-            
-            items.append({
-                "id": product_id,
-                "name": nombre,
-                "description": descripcion,
-                "price": Decimal(str(precio)),
-                "store": tienda,
-                "category": categoria,
-                "image": imagen,
-                "link": link,
-                "avg_rating": None,
-                "rating_count": 0,
-            })
-    
-    except requests.exceptions.Timeout:
-        error_message = "La API externa tardó demasiado en responder. Por favor, intenta más tarde."
-    except requests.exceptions.ConnectionError:
-        error_message = "No se pudo conectar con la API externa. Verifica tu conexión a internet."
-    except requests.exceptions.RequestException as e:
-        error_message = f"Error al conectar con la API externa: {str(e)}"
-    except Exception as e:
-        error_message = f"Error al procesar los datos: {str(e)}"
-    
+
+    estado = await aobtener_catalogo_aliado()
+    # Sin copia local no hay nada que mostrar: se informa el último error
+    error_message = None if estado.disponible else (estado.error or None)
+
+    productos = filtrar_productos_aliados(
+        ProductoAliado.objects.all(), ParametrosBusqueda.desde_query(request.GET),
+    )
+
     # Ordenamiento
     if sort == "price_asc":
-        items.sort(key=lambda x: (x["price"], x["name"]))
+        productos = productos.order_by("precio", "nombre", "pk")
     elif sort == "price_desc":
-        items.sort(key=lambda x: (x["price"], x["name"]), reverse=True)
+        productos = productos.order_by("-precio", "-nombre", "-pk")
     else:
-        items.sort(key=lambda x: x["name"])
-    
-    # Paginación
-    paginator = Paginator(items, 9)
+        productos = productos.order_by("nombre", "pk")
+
+    # Paginación: el COUNT con el ORM async; Paginator solo calcula rangos
+    paginator = Paginator(productos, 9)
+    paginator.count = await productos.acount()
     try:
         page_obj = paginator.page(page)
     except (PageNotAnInteger, EmptyPage):
         page_obj = paginator.page(1)
-    
+    page_obj.object_list = [_partner_card(p) async for p in page_obj.object_list]
+
     # Querystring para paginación
     qs_params = request.GET.copy()
     qs_params.pop('page', None)
     querystring = urlencode([(k, v) for k, v in qs_params.items() if v not in (None, "")])
-    
+
     ctx = {
         "q": q,
         "category": category,
@@ -853,4 +991,73 @@ def partner_products(request):
         "error_message": error_message,
         "is_partner_page": True,
     }
-    return render(request, "catalog/partner_products.html", ctx)
\ No newline at end of file
+    # Los context processors leen sesión y usuario (BD): renderizar en un hilo
+    return await sync_to_async(render)(request, "catalog/partner_products.html", ctx)
+
+@user_passes_test(is_admin)
+def api_partner_status(request):
+    """Estado de la integración aliada: circuito, contadores y última sincronización."""
+    client = get_partner_client()
+    sync = SincronizacionAliado.actual()
+    return JsonResponse({
+        "circuit": client.breaker.state,
+        "stats": client.stats.snapshot(),
+        "sync": {
+            "completed_at": sync.completada.isoformat() if sync.completada else None,
+            "attempted_at": sync.intentada.isoformat() if sync.intentada else None,
+            "total": sync.total,
+            "error": sync.error,
+        },
+    })
+
+
+@user_passes_test(is_admin)
+def api_cache_stats(request):
+    """Aciertos y fallos por familia del cache en dos niveles (de este proceso)."""
+    return JsonResponse({"pid": os.getpid(), "families": cache_stats()})
+
+
+@user_passes_test(is_admin)
+def api_view_stats(request):
+    """Consultas, tiempos de BD/plantillas y latencia por vista (requests muestreados, este proceso)."""
+    return JsonResponse({"pid": os.getpid(), "views": estadisticas()})
+
+
+def api_search(request):
+    """
+    Búsqueda unificada: catálogo propio + catálogo aliado en una sola lista.
+
+    GET /api/search/?q=buzo&sort=price_asc&limit=20
+
+    Acepta los filtros de /api/products/ (q, category, store, min, max), además de:
+    - ?sort=name|price_asc|price_desc|rating
+    - ?limit=N (por defecto 50, máximo 200)
+    - ?sources=local,aliado : fuentes a consultar (por defecto todas)
+
+    Las fuentes se consultan en paralelo, cada una con su plazo; las que no
+    responden a tiempo se omiten y aparecen en "fuentes" con status "timeout".
+    """
+    nombres = [n.strip() for n in (request.GET.get("sources") or "").split(",") if n.strip()]
+    desconocidas = [n for n in nombres if n not in FUENTES]
+    if desconocidas:
+        return _api_error(
+            "Fuentes desconocidas",
+            f"Fuentes no soportadas: {', '.join(desconocidas)}. Disponibles: {', '.join(FUENTES)}",
+            status=400,
+        )
+    params = ParametrosBusqueda.desde_query(request.GET, limit=_api_limit(request.GET.get("limit")))
+    resultado = buscar_unificado(params, [FUENTES[n] for n in nombres] if nombres else None)
+
+    productos = []
+    for r in resultado.resultados:
+        item = dict(r, precio=float(r["precio"]))
+        for key in ("imagen_url", "detail_url"):
+            if item[key] and item[key].startswith("/"):
+                item[key] = request.build_absolute_uri(item[key])
+        productos.append(item)
+    return JsonResponse({
+        "count": len(productos),
+        "sort": params.sort,
+        "fuentes": {nombre: estado.as_dict() for nombre, estado in resultado.fuentes.items()},
+        "productos": productos,
+    }, json_dumps_params={"ensure_ascii": False})